@@ -0,0 +1,25 @@
+"""
+Benchmarks of the data layer and of the GUI hot paths, see README.md (Benchmarks).
+
+Importing this package prepares the environment: Qt runs offscreen, and sprites are only
+read from an empty temporary cache in offline mode, so nothing is ever downloaded.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT_PATH: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH: str = os.path.join(ROOT_PATH, 'ifc')
+
+# The modules of the app import each other as top-level packages (e.g. 'from data import ...')
+for _path in (APP_PATH, ROOT_PATH):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+# Network stub: offline mode with an empty cache never touches the network
+os.environ['IFC_OFFLINE'] = '1'
+os.environ['IFC_CACHE_PATH'] = tempfile.mkdtemp(prefix='ifc-benchmarks-')
+atexit.register(shutil.rmtree, os.environ['IFC_CACHE_PATH'], ignore_errors=True)
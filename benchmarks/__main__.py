@@ -0,0 +1,47 @@
+"""
+Runs the benchmarks: python -m benchmarks --help
+"""
+import argparse
+import os
+import sys
+import time
+
+from benchmarks import ROOT_PATH, harness
+# Importing the modules registers their benchmarks
+from benchmarks import data_benchmarks, gui_benchmarks  # noqa: F401
+
+""" Folder where results are saved by default """
+RESULTS_PATH: str = os.path.join(ROOT_PATH, 'benchmarks', 'results')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Runs the benchmarks of the app")
+    parser.add_argument('-k', '--filter', help="only run the benchmarks whose name contains FILTER")
+    parser.add_argument('--group', choices=('data', 'gui'), help="only run the benchmarks of this group")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per benchmark (default: 5)")
+    parser.add_argument('-o', '--output', help="where to save the results (default: benchmarks/results/<time>.json)")
+    parser.add_argument('--baseline', help="results to compare with, the exit code is 1 if something got slower")
+    parser.add_argument('--threshold', type=float, default=harness.DEFAULT_THRESHOLD,
+                        help=f"slowdown (current / baseline) reported as a regression "
+                             f"(default: {harness.DEFAULT_THRESHOLD})")
+    args = parser.parse_args()
+
+    benchmarks = [b for b in harness.get_benchmarks(args.filter) if args.group in (None, b.group)]
+    results = harness.run(benchmarks, repeat=args.repeat)
+
+    output = args.output or os.path.join(RESULTS_PATH, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    harness.save(results, output)
+    print(f"Results saved to '{output}'")
+
+    if args.baseline:
+        print(f"\nCompared with '{args.baseline}':")
+        regressions = harness.compare(results, harness.load(args.baseline), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
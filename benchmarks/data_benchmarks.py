@@ -0,0 +1,58 @@
+"""
+Benchmarks of the data layer (no Qt involved)
+"""
+from random import Random
+
+from benchmarks.harness import benchmark
+from data import pokedex, utils
+from data.enums import Type
+
+""" Seed of the random samples, so that every run measures the same work """
+SEED: int = 0
+""" Number of random pairs fused by the get_fusions benchmark """
+FUSION_PAIRS: int = 200
+
+
+@benchmark('pokedex.get_pokemon (all names)', group='data')
+def get_pokemon():
+    names = pokedex.get_names()
+
+    def run():
+        for name in names:
+            pokedex.get_pokemon(name=name)
+    return run
+
+
+@benchmark('pokedex.get_id_by_name (all names)', group='data')
+def get_id_by_name():
+    names = pokedex.get_names()
+
+    def run():
+        for name in names:
+            pokedex.get_id_by_name(name)
+    return run
+
+
+@benchmark('pokedex.get_evolines_by_type (all typings)', group='data')
+def get_evolines_by_type():
+    types = [t for t in Type if not Type.is_any(t)]
+
+    def run():
+        for first_type in types:
+            pokedex.get_evolines_by_type(first_type=first_type)
+            pokedex.get_evolines_by_type(second_type=first_type)
+            for second_type in types:
+                pokedex.get_evolines_by_type(first_type, second_type)
+    return run
+
+
+@benchmark(f'utils.get_fusions ({FUSION_PAIRS} random pairs)', group='data')
+def get_fusions():
+    names = pokedex.get_names()
+    random = Random(SEED)
+    pairs = [(random.choice(names), random.choice(names)) for _ in range(FUSION_PAIRS)]
+
+    def run():
+        for name1, name2 in pairs:
+            utils.get_fusions(name1, name2)
+    return run
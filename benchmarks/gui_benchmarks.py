@@ -0,0 +1,128 @@
+"""
+Benchmarks of the GUI hot paths, under the offscreen Qt platform (see benchmarks/__init__.py)
+"""
+from random import Random
+from typing import List, Optional
+
+from PyQt6.QtCore import QEventLoop, QThreadPool
+from PyQt6.QtWidgets import QApplication
+
+from benchmarks.data_benchmarks import SEED
+from benchmarks.harness import benchmark
+from data import pokedex, utils
+from data.pokemon import FusedPokemon
+
+""" (type A, type B, number of results shown, 0 for all of them) searched by the Type benchmarks """
+TYPE_SEARCHES = [('FIRE', 'WATER', 0), ('GRASS', 'ANY', 50), ('DRAGON', 'FLYING', 0), ('ANY', 'ANY', 50)]
+""" Sizes of the species lists fused by the Batch benchmarks """
+BATCH_SIZES = [10, 50, 100]
+""" Number of EvolineWidgets built by the widget benchmark """
+WIDGETS: int = 100
+
+
+_application: Optional[QApplication] = None
+
+
+def _app() -> QApplication:
+    global _application
+    if QApplication.instance() is None:
+        # Keep a reference, or the application is garbage collected
+        _application = QApplication([])
+    return QApplication.instance()
+
+
+def _wait(tab) -> None:
+    """
+    Processes events until the background search of tab is finished (and displayed)
+    """
+    app = _app()
+    while tab._search_worker is not None:
+        app.processEvents(QEventLoop.ProcessEventsFlag.AllEvents, 10)
+    QThreadPool.globalInstance().waitForDone()
+    app.processEvents()
+
+
+def _species(count: int) -> List[str]:
+    """
+    Returns count base forms of different evolines, spread over the pokedex
+    """
+    bases = [pokedex.get_pokemon(evoline_id).name for evoline_id in sorted(pokedex.get_evoline_ids_by_type())]
+    step = len(bases) / count
+    return [bases[int(i * step)] for i in range(count)]
+
+
+def _type_search(type_a: str, type_b: str, show_top: int):
+    def setup():
+        _app()
+        from gui.tabs.type import TypeTab
+        tab = TypeTab()
+        tab.type_a_cbox.setCurrentText(type_a)
+        tab.type_b_cbox.setCurrentText(type_b)
+        tab.show_top_spinbox.setValue(show_top)
+
+        def run():
+            tab.search()
+            _wait(tab)
+        return run
+    return setup
+
+
+for _type_a, _type_b, _show_top in TYPE_SEARCHES:
+    benchmark(f'TypeTab.search ({_type_a}/{_type_b}, top {_show_top or "all"})', group='gui')(
+        _type_search(_type_a, _type_b, _show_top))
+
+
+def _batch_mix(size: int):
+    def setup():
+        _app()
+        from gui.tabs.batch import BatchTab
+        tab = BatchTab()
+        for name in _species(size):
+            tab.plist.addItem(name)
+
+        def run():
+            # Clear first: mix only computes the pairs that are not shown yet
+            tab.clear_output()
+            tab.mix()
+            _wait(tab)
+        return run
+    return setup
+
+
+for _size in BATCH_SIZES:
+    benchmark(f'BatchTab.mix ({_size} species)', group='gui')(_batch_mix(_size))
+
+
+@benchmark(f'EvolineWidget build ({WIDGETS} evolines)', group='gui')
+def build_evoline_widgets():
+    _app()
+    from gui.tabs.widgets import EvolineWidget
+    names = pokedex.get_names()
+    random = Random(SEED)
+    evolines: List[List[FusedPokemon]] = []
+    while len(evolines) < WIDGETS:
+        evolines += utils.get_evolines(random.choice(names), random.choice(names))
+    evolines = evolines[:WIDGETS]
+
+    def run():
+        for widget in [EvolineWidget(evoline) for evoline in evolines]:
+            widget.deleteLater()
+        _app().processEvents()
+    return run
+
+
+@benchmark('EvolineListView paint (FIRE/WATER results)', group='gui')
+def paint_result_view():
+    _app()
+    from gui.tabs.type import TypeTab
+    tab = TypeTab()
+    tab.type_a_cbox.setCurrentText('FIRE')
+    tab.type_b_cbox.setCurrentText('WATER')
+    tab.show_top_spinbox.setValue(0)
+    tab.resize(1200, 700)
+    tab.search()
+    _wait(tab)
+
+    def run():
+        tab.result_view.viewport().grab()
+    return run
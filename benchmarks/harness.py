@@ -0,0 +1,148 @@
+"""
+Minimal benchmark harness: a registry of benchmarks, timing, JSON results and baseline comparison.
+"""
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+""" Minimum duration (seconds) of a single timed run, fast benchmarks are looped to reach it """
+MIN_RUN_TIME: float = 0.05
+""" Default ratio (current / baseline) above which a benchmark is reported as a regression """
+DEFAULT_THRESHOLD: float = 1.2
+
+
+class Benchmark(NamedTuple):
+    """
+    setup is called once and returns the function to time (setup time is not measured)
+    """
+    name: str
+    group: str
+    setup: Callable[[], Callable[[], object]]
+
+
+_benchmarks: List[Benchmark] = []
+
+
+def benchmark(name: str, group: str):
+    """
+    Registers the decorated function as the setup of a benchmark (see Benchmark)
+    """
+    def register(setup: Callable[[], Callable[[], object]]):
+        _benchmarks.append(Benchmark(name, group, setup))
+        return setup
+    return register
+
+
+def get_benchmarks(name_filter: str = None) -> List[Benchmark]:
+    """
+    Returns the registered benchmarks whose name contains name_filter (all of them if None)
+    """
+    return [b for b in _benchmarks if name_filter is None or name_filter in b.name]
+
+
+def measure(function: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """
+    Times function: it is called in runs of 'number' calls (so that a run lasts at least MIN_RUN_TIME),
+    the best, median and mean time of a single call over 'repeat' runs are returned (seconds).
+    """
+    # Calibrate the number of calls per run (the first call also warms up caches)
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_RUN_TIME:
+            break
+        number *= 10 if elapsed < MIN_RUN_TIME / 10 else 2
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) / number)
+    return {
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'repeat': repeat,
+        'number': number,
+    }
+
+
+def run(benchmarks: List[Benchmark], repeat: int, log: Callable[[str], None] = print) -> Dict[str, Dict]:
+    results = dict()
+    for b in benchmarks:
+        function = b.setup()
+        results[b.name] = {'group': b.group, **measure(function, repeat)}
+        log(f"{b.name:<50} {format_time(results[b.name]['min']):>10}")
+    return results
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def environment() -> Dict[str, str]:
+    """
+    Describes where the benchmarks ran, saved with the results
+    """
+    info = {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    try:
+        import numpy
+        info['numpy'] = numpy.__version__
+    except ImportError:
+        pass
+    try:
+        from PyQt6.QtCore import PYQT_VERSION_STR, QT_VERSION_STR
+        info['pyqt'] = PYQT_VERSION_STR
+        info['qt'] = QT_VERSION_STR
+    except ImportError:
+        pass
+    return info
+
+
+def save(results: Dict[str, Dict], path: str) -> None:
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+
+
+def load(path: str) -> Dict[str, Dict]:
+    with open(path, 'r') as f:
+        return json.load(f)['results']
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict],
+            threshold: float = DEFAULT_THRESHOLD,
+            log: Callable[[str], None] = print) -> List[str]:
+    """
+    Compares the best times of results with the ones of baseline.
+
+    :return: The names of the benchmarks more than 'threshold' times slower than the baseline.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference: Optional[Dict] = baseline.get(name)
+        if reference is None:
+            log(f"{name:<50} {'new':>10}")
+            continue
+        ratio = result['min'] / reference['min']
+        flag = ''
+        if ratio > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        log(f"{name:<50} {format_time(reference['min']):>10} -> {format_time(result['min']):>10}"
+            f"  x{ratio:.2f}{flag}")
+    return regressions
@@ -0,0 +1,107 @@
+"""
+Batch benchmark: the cross-fusions of growing batches, evaluated in the calling process and by the worker pool
+(see data.parallel), to find the batch size from which the pool is faster (MIN_PARALLEL_PAIRS).
+Usage: python -m benchmarks.parallel --help
+
+The pool is started before the batches are timed (its start-up time is reported on its own).
+"""
+import argparse
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import benchmarks  # noqa: F401 (prepares the environment)
+
+""" Batch sizes measured by default (pairs of Pokemon) """
+SIZES: Sequence[int] = (250, 500, 1000, 2000, 4000, 8000, 16000)
+
+
+def _pairs(size: int) -> List[Tuple[str, str]]:
+    """
+    Returns the pairs of the smallest Batch list (the first names of the pokedex) with at least size pairs
+    """
+    from data import pokedex, utils
+
+    names = pokedex.get_names()
+    count = 2
+    while count * (count - 1) // 2 < size and count < len(names):
+        count += 1
+    return utils.get_batch_pairs(names[:count])[:size]
+
+
+def _time_batch(evaluate: Callable[[], object], repeat: int) -> float:
+    """
+    Returns the best time of evaluate over repeat runs
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        evaluate()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def measure(sizes: Sequence[int], workers: int, repeat: int) -> Dict:
+    """
+    Times the batches of every size in this process and with the pool of workers
+    """
+    from data import parallel
+
+    start = time.perf_counter()
+    parallel._get_pool(workers).apply(parallel._evaluate_shard, ([],))
+    pool_start = time.perf_counter() - start
+
+    # The pool is used for every size (a batch size that is not parallel would be evaluated in this process)
+    min_parallel_pairs, parallel.MIN_PARALLEL_PAIRS = parallel.MIN_PARALLEL_PAIRS, 0
+    results = []
+    try:
+        for size in sizes:
+            pairs = _pairs(size)
+            sequential = _time_batch(lambda: list(parallel.evaluate_pairs(pairs, workers=1)), repeat)
+            pooled = _time_batch(lambda: list(parallel.evaluate_pairs(pairs, workers=workers)), repeat)
+            results.append({'pairs': len(pairs), 'sequential': sequential, 'parallel': pooled})
+            print(f"{len(pairs):>7} pairs: sequential {sequential * 1000:8.1f}ms  "
+                  f"{workers} workers {pooled * 1000:8.1f}ms  ({sequential / pooled:.2f}x)")
+    finally:
+        parallel.MIN_PARALLEL_PAIRS = min_parallel_pairs
+        parallel.close()
+    return {'workers': workers, 'pool_start': pool_start, 'batches': results}
+
+
+def crossover(batches: List[Dict]) -> Optional[int]:
+    """
+    Returns the smallest batch size from which the pool is always faster, None if it never is
+    """
+    faster = None
+    for batch in reversed(batches):
+        if batch['parallel'] >= batch['sequential']:
+            break
+        faster = batch['pairs']
+    return faster
+
+
+def main() -> int:
+    import os
+    from data import parallel
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.parallel',
+                                     description="Measures from which batch size the worker pool is faster")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help=f"pairs per batch (default: {' '.join(map(str, SIZES))})")
+    parser.add_argument('--workers', type=int, default=max(2, parallel.get_workers()),
+                        help="worker processes (default: one per CPU, at least 2)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per batch (default: 3)")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.workers} workers, "
+          f"MIN_PARALLEL_PAIRS is {parallel.MIN_PARALLEL_PAIRS}")
+    measures = measure(args.sizes, args.workers, args.repeat)
+    print(f"Pool started in {measures['pool_start'] * 1000:.0f}ms")
+    size = crossover(measures['batches'])
+    print(f"The pool is faster from {size} pairs" if size is not None else
+          "The pool is never faster than the calling process")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
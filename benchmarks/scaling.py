@@ -0,0 +1,154 @@
+"""
+Scaling benchmark: how the pokedex lookups, the fusions and the Type search behave as the pokedex grows.
+Usage: python -m benchmarks.scaling --help
+
+The real pokedex and synthetic ones (see synthetic.py) of every size are measured in turn,
+each one in a fresh process (the pokedex is loaded when the app modules are imported,
+from IFC_DATA_PATH). For each operation the first call (cold caches), the median of the
+following ones and the peak memory allocated by a call are reported, with the time
+needed to load the pokedex and the peak memory of the whole process.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from benchmarks import ROOT_PATH, harness, synthetic
+
+""" Folder where results are saved by default """
+RESULTS_PATH: str = os.path.join(ROOT_PATH, 'benchmarks', 'results')
+""" Typings of the Type searches: fully typed, so that only a fraction of the evoline pairs is searched """
+SEARCH_TYPINGS = (('FIRE', 'WATER'), ('GRASS', 'POISON'))
+
+
+def _peak_rss() -> float:
+    """
+    Returns the peak resident memory of this process (MB), 0 where it's not available
+    """
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def _profile(function: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """
+    Times the first call of function and the following ones (see harness.measure),
+    then traces the memory allocated by one more call (tracing slows it down, so it's not timed)
+    """
+    start = time.perf_counter()
+    function()
+    first = time.perf_counter() - start
+    timing = harness.measure(function, repeat)
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'first': first, **timing, 'peak_mb': peak / 2 ** 20}
+
+
+def _operations() -> Dict[str, Callable[[], object]]:
+    """
+    Returns the operations to measure, by name (the pokedex is loaded by the imports)
+    """
+    from benchmarks import data_benchmarks
+    from data import search
+    from data.enums import Type
+
+    operations = {
+        'pokedex.get_evolines_by_type (all typings)': data_benchmarks.get_evolines_by_type(),
+        f'utils.get_fusions ({data_benchmarks.FUSION_PAIRS} random pairs)': data_benchmarks.get_fusions(),
+    }
+    for type_a, type_b in SEARCH_TYPINGS:
+        operations[f'search.search_by_type ({type_a}/{type_b})'] = \
+            lambda type_a=Type[type_a], type_b=Type[type_b]: search.search_by_type(type_a, type_b)
+    return operations
+
+
+def measure_pokedex(repeat: int) -> Dict:
+    """
+    Measures the pokedex of this process (see IFC_DATA_PATH), must run in a fresh process
+    """
+    start = time.perf_counter()
+    from data import fusion, pokedex
+    load_time = time.perf_counter() - start
+
+    results = {name: _profile(operation, repeat) for name, operation in _operations().items()}
+    return {
+        'species': len(pokedex.get_ids()),
+        'evolines': len(pokedex.get_evoline_ids_by_type()),
+        'complete_table': fusion.has_table(),
+        'load': load_time,
+        'peak_rss_mb': _peak_rss(),
+        'results': results,
+    }
+
+
+def _run_pokedex(data_path: str, repeat: int) -> Dict:
+    """
+    Measures a pokedex csv (the real one if data_path is None) in a child process
+    """
+    env = dict(os.environ)
+    if data_path is not None:
+        env['IFC_DATA_PATH'] = data_path
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.scaling', '--child', '--repeat', str(repeat)],
+                            cwd=ROOT_PATH, env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output)
+
+
+def _print_pokedex(measures: Dict) -> None:
+    table = 'complete fusion table' if measures['complete_table'] else 'fusions computed in blocks'
+    print(f"\n{measures['species']} species, {measures['evolines']} evolines ({table}): "
+          f"loaded in {harness.format_time(measures['load'])}, peak memory {measures['peak_rss_mb']:.0f}MB")
+    for name, result in measures['results'].items():
+        print(f"  {name:<48} first {harness.format_time(result['first']):>9}  "
+              f"median {harness.format_time(result['median']):>9}  peak {result['peak_mb']:7.1f}MB")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.scaling',
+                                     description="Measures how the app scales with the size of the pokedex")
+    parser.add_argument('--sizes', type=int, nargs='+', default=synthetic.SIZES,
+                        help=f"species of the synthetic pokedexes (default: {' '.join(map(str, synthetic.SIZES))})")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic pokedexes (default: 0)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per operation (default: 3)")
+    parser.add_argument('-o', '--output',
+                        help="where to save the results (default: benchmarks/results/scaling-<time>.json)")
+    # Internal: measure the pokedex of this process and print the results as JSON
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        json.dump(measure_pokedex(args.repeat), sys.stdout)
+        return 0
+
+    measures: List[Dict] = []
+    with tempfile.TemporaryDirectory(prefix='ifc-scaling-') as folder:
+        # The real pokedex first, as a reference
+        for species in [None, *args.sizes]:
+            data_path = None
+            if species is not None:
+                data_path = os.path.join(folder, f'data-{species}.csv')
+                synthetic.write_dex(data_path, species, args.seed)
+            measures.append(_run_pokedex(data_path, args.repeat))
+            _print_pokedex(measures[-1])
+
+    output = args.output or os.path.join(RESULTS_PATH, time.strftime('scaling-%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'environment': harness.environment(), 'pokedexes': measures}, f, indent=2)
+    print(f"\nResults saved to '{output}'")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
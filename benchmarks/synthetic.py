@@ -0,0 +1,105 @@
+"""
+Synthetic pokedexes: csv files in the schema of ifc/resources/data.csv, with as many species as needed,
+to measure how the app scales with the size of the pokedex (see scaling.py).
+
+Every synthetic evoline is a copy of a real one (so sizes, level windows, branches and evolutions by stone
+look like the real thing) with its types shuffled and its stats jittered.
+Usage: python -m benchmarks.synthetic <species> -o <path>
+"""
+import argparse
+import csv
+import json
+import os
+from random import Random
+from typing import Dict, List, Sequence
+
+from benchmarks import APP_PATH
+
+""" The real pokedex, the model of the synthetic ones """
+REAL_DATA_PATH: str = os.path.join(APP_PATH, 'resources', 'data.csv')
+""" Columns of a pokedex csv, in order """
+FIELDS = ('ID', 'NAME', 'MIN_LEVEL', 'MAX_LEVEL', 'EVOLINE', 'TYPES', 'HP', 'ATK', 'DEF', 'SPATK', 'SPDEF', 'SPD')
+""" Stat columns """
+STAT_FIELDS = ('HP', 'ATK', 'DEF', 'SPATK', 'SPDEF', 'SPD')
+""" Pokedex sizes measured by default """
+SIZES: Sequence[int] = (1000, 5000, 20000)
+""" Largest supported pokedex: cached fusion tables store IDs as int16 """
+MAX_SPECIES: int = 32767
+""" Maximum relative change of a copied stat """
+STAT_JITTER: float = 0.2
+
+
+def _real_evolines() -> List[List[Dict[str, str]]]:
+    """
+    Returns the rows of the real pokedex, grouped by evoline (in pokedex order)
+    """
+    with open(REAL_DATA_PATH, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    evolines: Dict[int, List[Dict[str, str]]] = dict()
+    for row in rows:
+        evolines.setdefault(json.loads(row['EVOLINE'])[0], []).append(row)
+    return list(evolines.values())
+
+
+def _jitter(stat: int, random: Random) -> int:
+    """
+    Returns stat changed by up to STAT_JITTER (a valid stat, between 1 and 255)
+    """
+    return max(1, min(255, round(stat * random.uniform(1 - STAT_JITTER, 1 + STAT_JITTER))))
+
+
+def generate(species: int, seed: int = 0) -> List[Dict[str, str]]:
+    """
+    Returns the rows of a synthetic pokedex with the given number of species (IDs from 1 to species).
+    The same species and seed always give the same pokedex.
+    """
+    assert 0 < species <= MAX_SPECIES, f'Between 1 and {MAX_SPECIES} species are supported'
+    random = Random(seed)
+    models = _real_evolines()
+    largest = max(map(len, models))
+    type_names = sorted({name for evoline in models for row in evoline for name in json.loads(row['TYPES'])})
+
+    rows = []
+    while len(rows) < species:
+        remaining = species - len(rows)
+        model = random.choice(models if remaining >= largest else
+                              [evoline for evoline in models if len(evoline) <= remaining])
+        # IDs are assigned in the order of the model (the real pokedex lists branches after the base form)
+        ids = {row['ID']: str(len(rows) + i + 1) for i, row in enumerate(model)}
+        evoline = [int(ids[str(idx)]) for idx in json.loads(model[0]['EVOLINE'])]
+        shuffled = dict(zip(type_names, random.sample(type_names, len(type_names))))
+        for row in model:
+            rows.append({
+                'ID': ids[row['ID']],
+                'NAME': f"{row['NAME']}-{ids[row['ID']]}",
+                'MIN_LEVEL': row['MIN_LEVEL'], 'MAX_LEVEL': row['MAX_LEVEL'],
+                'EVOLINE': json.dumps(evoline),
+                'TYPES': json.dumps([shuffled[name] for name in json.loads(row['TYPES'])]),
+                **{stat: str(_jitter(int(row[stat]), random)) for stat in STAT_FIELDS},
+            })
+    return rows
+
+
+def write_dex(path: str, species: int, seed: int = 0) -> None:
+    """
+    Writes a synthetic pokedex (see generate) to a csv file
+    """
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(generate(species, seed))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.synthetic',
+                                     description="Writes a synthetic pokedex csv")
+    parser.add_argument('species', type=int, help=f"number of species (at most {MAX_SPECIES})")
+    parser.add_argument('-o', '--output', required=True, help="path of the csv")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the random generator (default: 0)")
+    args = parser.parse_args()
+    write_dex(args.output, args.species, args.seed)
+    print(f"{args.species} species written to '{args.output}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,3 +3,8 @@ import os
 RESOURCES_PATH: str = os.path.join(os.path.dirname(__file__), 'resources')
 FONTS_PATH: str = os.path.join(RESOURCES_PATH, 'fonts')
 IMAGES_PATH: str = os.path.join(RESOURCES_PATH, 'images')
+""" The pokedex csv, can be overridden with IFC_DATA_PATH (e.g. a synthetic pokedex, see benchmarks/synthetic.py) """
+DATA_PATH: str = os.environ.get('IFC_DATA_PATH', os.path.join(RESOURCES_PATH, 'data.csv'))
+
+""" Folder where the app keeps user data (e.g. downloaded sprites), can be overridden with IFC_CACHE_PATH """
+CACHE_PATH: str = os.environ.get('IFC_CACHE_PATH', os.path.join(os.path.expanduser('~'), '.ifc'))
@@ -0,0 +1,216 @@
+"""
+Command line interface: the Single, Batch and Type modes without the GUI (PyQt is never imported).
+Fusions are streamed to stdout as NDJSON (one object per line) or CSV, one record per fusion.
+
+    python -m ifc.cli single fearow ekans
+    python -m ifc.cli batch bulbasaur charmander squirtle --format csv
+    python -m ifc.cli type FIRE WATER --top 10 --workers 4
+
+The export command writes the complete head x body fusion table instead (in chunks),
+also to the columnar formats Parquet and .npz:
+
+    python -m ifc.cli export -o fusions.parquet --type FIRE --format parquet
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+# The modules of the app import each other as top-level packages (e.g. 'from data import ...')
+_APP_PATH = os.path.dirname(os.path.abspath(__file__))
+for _path in (_APP_PATH, os.path.dirname(_APP_PATH)):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from data import export, parallel, pokedex, search, utils  # noqa: E402
+from data.enums import Type  # noqa: E402
+from data.export import FIELDS  # noqa: E402
+from data.fusion import FusionRows  # noqa: E402
+from ifc import tracing  # noqa: E402
+
+""" Supported output formats """
+FORMATS = ('ndjson', 'csv')
+""" Output formats only supported by the export command (they are written to a file) """
+COLUMNAR_FORMATS = ('parquet', 'npz')
+
+""" A pair of Pokemon to fuse (see parallel.evaluate_pairs) """
+Pair = Tuple[str, str]
+""" A fusion as a plain dict of FIELDS, plus the index of its evoline """
+Record = Dict[str, object]
+
+
+def number_evolines(results: Iterable[List[FusionRows]]) -> Iterator[Record]:
+    """
+    Flattens the evolines to a stream of records (built from their columns, see export.chunk_records),
+    adding the index of their evoline
+    """
+    names = export.names_by_id()
+    evoline = 0
+    for evolines in results:
+        for rows in evolines:
+            for record in export.chunk_records(rows.columns, names):
+                yield {'evoline': evoline, **record}
+            evoline += 1
+
+
+def write_ndjson(records: Iterable[Record], out: TextIO) -> None:
+    for record in records:
+        out.write(json.dumps(record) + '\n')
+
+
+def write_csv(records: Iterable[Record], out: TextIO) -> None:
+    writer = csv.DictWriter(out, fieldnames=('evoline',) + FIELDS, lineterminator='\n')
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+
+
+def single_pairs(args: argparse.Namespace) -> List[Pair]:
+    return [(args.pokemon1, args.pokemon2)]
+
+
+def batch_pairs(args: argparse.Namespace) -> List[Pair]:
+    return utils.get_batch_pairs(args.pokemons)
+
+
+def type_pairs(args: argparse.Namespace) -> List[Pair]:
+    based_on = pokedex.get_pokemon(name=args.based_on) if args.based_on else None
+    results = search.search_by_type(args.type_a, args.type_b,
+                                    based_on=based_on,
+                                    sort_by=args.sort_by,
+                                    k=args.top,
+                                    min_level=args.min_level,
+                                    max_level=args.max_level)
+    return [(result.head.name, result.body.name) for result in results]
+
+
+def run_export(args: argparse.Namespace) -> None:
+    """
+    Writes the fusion table (see data.export) to args.output, or to stdout
+    """
+    evoline_ids = None
+    if args.evolines:
+        evoline_ids = {pokedex.get_pokemon(name=name).raw_evoline[0] for name in args.evolines}
+    chunks = export.Chunks(args.types, evoline_ids, args.chunk_rows)
+
+    output = args.output
+    if args.format in COLUMNAR_FORMATS:
+        root, extension = os.path.splitext(output)
+        if args.format == 'parquet' and not export.has_parquet():
+            args.format = 'npz'
+            # Don't give a .npz file the name of a Parquet file
+            if extension.lower() == '.parquet':
+                output, extension = root + '.npz', '.npz'
+            logging.warning("pyarrow is not installed, writing a .npz file instead of a Parquet file")
+        if not extension:
+            output += f'.{args.format}'
+        write = export.write_parquet if args.format == 'parquet' else export.write_npz
+        rows = write(chunks, output)
+    elif output:
+        with open(output, 'w', newline='') as f:
+            rows = (export.write_csv if args.format == 'csv' else export.write_ndjson)(chunks, f)
+    else:
+        (export.write_csv if args.format == 'csv' else export.write_ndjson)(chunks, sys.stdout)
+        sys.stdout.flush()
+        return
+    print(f"{rows} fusions exported to '{output}'", file=sys.stderr)
+
+
+def _pokemon_name(value: str) -> str:
+    try:
+        return pokedex.get_pokemon(name=value).name
+    except KeyError:
+        raise argparse.ArgumentTypeError(f"unknown Pokemon '{value}'")
+
+
+def _pokemon_type(value: str) -> Type:
+    try:
+        return Type[value.upper()]
+    except KeyError:
+        raise argparse.ArgumentTypeError(f"unknown type '{value}' (choose from {', '.join(pokedex.get_types())})")
+
+
+def _positive_int(value: str) -> int:
+    if not value.isdigit() or int(value) <= 0:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a positive integer")
+    return int(value)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m ifc.cli', description=f"{utils.NAME} v{utils.VERSION}")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    # Options of every command, given after its name (e.g. 'batch bulbasaur charmander --format csv')
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--format', choices=FORMATS + COLUMNAR_FORMATS, default='ndjson',
+                        help="output format (default: ndjson), parquet and npz are only supported by export")
+    common.add_argument('--trace', metavar='PATH',
+                        help="save a Chrome trace of the run to PATH, and print a summary of the spans on exit")
+    # Options of the commands fusing many pairs
+    pairs = argparse.ArgumentParser(add_help=False)
+    pairs.add_argument('--workers', type=_positive_int, default=1,
+                       help="number of processes computing the fusions (default: 1)")
+
+    single = commands.add_parser('single', parents=[common], help="fusions between the evolines of two Pokemon")
+    single.add_argument('pokemon1', type=_pokemon_name)
+    single.add_argument('pokemon2', type=_pokemon_name)
+    single.set_defaults(pairs=single_pairs, display_ba=True, workers=1)
+
+    batch = commands.add_parser('batch', parents=[common, pairs],
+                                help="fusions between every pair of the given Pokemon "
+                                     "(repeat a Pokemon to fuse it with itself)")
+    batch.add_argument('pokemons', type=_pokemon_name, nargs='+')
+    batch.set_defaults(pairs=batch_pairs, display_ba=True)
+
+    by_type = commands.add_parser('type', parents=[common, pairs],
+                                  help="fusions having the given types (ANY matches every type)")
+    by_type.add_argument('type_a', type=_pokemon_type)
+    by_type.add_argument('type_b', type=_pokemon_type)
+    by_type.add_argument('--based-on', type=_pokemon_name, help="Pokemon whose evoline is part of every fusion")
+    by_type.add_argument('--sort-by', choices=search.SORT_STATS, default='total', help="(default: total)")
+    by_type.add_argument('--top', type=_positive_int, help="only the best TOP pairs (default: all of them)")
+    by_type.add_argument('--min-level', type=int, help="only fusions existing at this level or later")
+    by_type.add_argument('--max-level', type=int, help="only fusions existing at this level or before")
+    # Same as the Type tab: only the head/body fusions of each pair
+    by_type.set_defaults(pairs=type_pairs, display_ba=False)
+
+    table = commands.add_parser('export', parents=[common],
+                                help="the complete head x body fusion table, written in chunks")
+    table.add_argument('-o', '--output', help="file to write (default: stdout, required by parquet and npz)")
+    table.add_argument('--type', dest='types', type=_pokemon_type, action='append', default=[],
+                       help="only fusions having this type (repeat it for dual-typed fusions)")
+    table.add_argument('--evoline', dest='evolines', type=_pokemon_name, action='append', default=[],
+                       help="only fusions with a member of the evoline of this Pokemon (can be repeated)")
+    table.add_argument('--chunk-rows', type=_positive_int, default=export.CHUNK_ROWS,
+                       help=f"rows of the table processed at a time (default: {export.CHUNK_ROWS})")
+    table.set_defaults(pairs=None)
+
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.format in COLUMNAR_FORMATS and (args.command != 'export' or not args.output):
+        parser.error(f"--format {args.format} requires the export command and its --output option")
+    if args.trace:
+        tracing.enable(args.trace)
+    try:
+        if args.command == 'export':
+            run_export(args)
+            return 0
+        write = write_csv if args.format == 'csv' else write_ndjson
+        results = parallel.evaluate_pairs(args.pairs(args), args.workers, args.display_ba)
+        write(number_evolines(evolines for _, evolines in results), sys.stdout)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into 'head'): stop quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
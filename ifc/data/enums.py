@@ -43,3 +43,12 @@ class Type(Enum):
         if isinstance(type_to_check, Type):
             return type_to_check.name == Type.ANY.name
         return False
+
+
+class TypeSlot(Enum):
+    """
+    Position of a Type inside the typing of a Pokemon
+    """
+    PRIMARY = 'primary'
+    SECONDARY = 'secondary'
+    ANY = 'any'
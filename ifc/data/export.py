@@ -0,0 +1,244 @@
+"""
+Export of the complete head x body fusion table, for offline analysis.
+
+Rows are read from the precomputed fusion table (see fusion.get_table, the same
+formulas used by FusedPokemon, computed on the fly for pokedexes too big to have one)
+and written in chunks of CHUNK_ROWS rows,
+so memory usage does not grow with the size of the export.
+Supported formats are CSV, NDJSON, Parquet (if pyarrow is installed) and .npz (one array per column).
+"""
+import csv
+import importlib.util
+import json
+import zipfile
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, TextIO
+
+import numpy as np
+
+from data import fusion, pokedex, sprites
+from data.enums import Type
+from data.fusion import STATS
+from ifc import tracing
+
+""" Columns of the export, in order (type_2 of single-typed fusions is their type_1, it's never empty) """
+FIELDS = ('head', 'body', 'head_id', 'body_id', 'type_1', 'type_2') \
+    + STATS + ('total', 'min_level', 'max_level', 'sprite_url')
+""" FIELDS stored as strings (the others are integers) """
+STRING_FIELDS = ('head', 'body', 'type_1', 'type_2', 'sprite_url')
+""" Default number of rows computed and written at a time """
+CHUNK_ROWS: int = 65536
+
+""" A chunk of the table: numeric column name -> values (see fusion.ID_COLUMNS and fusion.COLUMNS) """
+Chunk = Dict[str, np.ndarray]
+
+
+def _member_mask(evoline_ids: Iterable[int]) -> np.ndarray:
+    """
+    Returns an array telling, for each pokedex ID, if it's a member of one of the evolines
+    """
+    mask = np.zeros(max(pokedex.get_ids()) + 1, dtype=bool)
+    for evoline_id in evoline_ids:
+        mask[list(pokedex.get_evoline_members(evoline_id))] = True
+    return mask
+
+
+def iter_chunks(types: Sequence[Type] = (),
+                evoline_ids: Optional[Iterable[int]] = None,
+                chunk_rows: int = CHUNK_ROWS) -> Iterator[Chunk]:
+    """
+    Yields the rows of the fusion table (ordered by head, then by body) in chunks,
+    skipping the fusions that can't exist in game (their level window is empty, see FusionTable.overlapping)
+    and the rows that don't match the filters (chunks can be smaller than chunk_rows, or empty).
+
+    :param types: Types every fusion must have (ANY matches every fusion).
+    :param evoline_ids: If given, only the fusions whose head or body belongs to one of these evolines.
+    :param chunk_rows: Rows of the table read at a time.
+    """
+    codes = [fusion.type_code(t) for t in types if not Type.is_any(t)]
+    members = _member_mask(evoline_ids) if evoline_ids is not None else None
+
+    for chunk in _table_chunks(chunk_rows):
+        mask = chunk['min_level'] <= chunk['max_level']
+        for code in codes:
+            mask &= (chunk['type_1'] == code) | (chunk['type_2'] == code)
+        if members is not None:
+            mask &= members[chunk['head_id']] | members[chunk['body_id']]
+        yield {column: np.asarray(values[mask]) for column, values in chunk.items()}
+
+
+def _table_chunks(chunk_rows: int) -> Iterator[Chunk]:
+    """
+    Yields the whole fusion table in chunks of chunk_rows rows (about chunk_rows, for pokedexes
+    too big to have a complete table: they are computed a block of heads at a time)
+    """
+    columns = fusion.ID_COLUMNS + fusion.COLUMNS
+    if fusion.has_table():
+        table = fusion.get_table()
+        for start in range(0, len(table), chunk_rows):
+            # Slices of the memory-mapped table: only this chunk is read
+            yield {column: table[column][start:start + chunk_rows] for column in columns}
+    else:
+        ids = pokedex.get_ids()
+        for table in fusion.compute_blocks(ids, ids, chunk_rows):
+            yield {column: table[column] for column in columns}
+
+
+def chunk_column(chunk: Chunk, field: str, names: List[Optional[str]] = None) -> list:
+    """
+    Returns one of the FIELDS of a chunk as a list of Python values
+
+    :param names: Names of the Pokemon by pokedex ID (see names_by_id), to avoid building them for every chunk.
+    """
+    if field in ('head', 'body'):
+        names = names or names_by_id()
+        return [names[idx] for idx in chunk[f'{field}_id'].tolist()]
+    if field in ('type_1', 'type_2'):
+        return [fusion.TYPES[code].name for code in chunk[field].tolist()]
+    if field == 'sprite_url':
+        return [sprites.fusion_sprite_url(head, body)
+                for head, body in zip(chunk['head_id'].tolist(), chunk['body_id'].tolist())]
+    return chunk[field].tolist()
+
+
+def chunk_columns(chunk: Chunk, names: List[Optional[str]] = None) -> Dict[str, list]:
+    """
+    Returns the FIELDS of a chunk as lists of Python values (names, type names and sprite urls included)
+
+    :param names: Names of the Pokemon by pokedex ID (see names_by_id), to avoid building them for every chunk.
+    """
+    names = names or names_by_id()
+    return {field: chunk_column(chunk, field, names) for field in FIELDS}
+
+
+def chunk_records(chunk: Chunk, names: List[Optional[str]] = None) -> Iterator[Dict[str, object]]:
+    """
+    Yields the rows of a chunk as dicts of FIELDS
+
+    :param names: Names of the Pokemon by pokedex ID (see names_by_id), to avoid building them for every chunk.
+    """
+    columns = chunk_columns(chunk, names)
+    for values in zip(*(columns[field] for field in FIELDS)):
+        yield dict(zip(FIELDS, values))
+
+
+def names_by_id() -> List[Optional[str]]:
+    """
+    Returns the names of the Pokemon, indexed by pokedex ID
+    """
+    names: List[Optional[str]] = [None] * (max(pokedex.get_ids()) + 1)
+    for idx in pokedex.get_ids():
+        names[idx] = pokedex.get_pokemon(idx).name
+    return names
+
+
+@tracing.traced('export.write_csv')
+def write_csv(chunks: Iterable[Chunk], out: TextIO) -> int:
+    """
+    Writes the chunks as CSV (with a header), returns the number of rows written
+    """
+    writer = csv.DictWriter(out, fieldnames=FIELDS, lineterminator='\n')
+    writer.writeheader()
+    rows = 0
+    for chunk in chunks:
+        for record in chunk_records(chunk):
+            writer.writerow(record)
+            rows += 1
+    return rows
+
+
+@tracing.traced('export.write_ndjson')
+def write_ndjson(chunks: Iterable[Chunk], out: TextIO) -> int:
+    """
+    Writes the chunks as NDJSON (one object per row), returns the number of rows written
+    """
+    rows = 0
+    for chunk in chunks:
+        for record in chunk_records(chunk):
+            out.write(json.dumps(record) + '\n')
+            rows += 1
+    return rows
+
+
+def has_parquet() -> bool:
+    """
+    Returns True if Parquet files can be written (pyarrow is installed)
+    """
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+@tracing.traced('export.write_parquet')
+def write_parquet(chunks: Iterable[Chunk], path: str) -> int:
+    """
+    Writes the chunks to a Parquet file (one row group per non-empty chunk), returns the number of rows written.
+    Requires pyarrow (see has_parquet).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(field, pa.string() if field in STRING_FIELDS else pa.int16()) for field in FIELDS])
+    rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            if len(chunk['head_id']) == 0:
+                continue
+            columns = chunk_columns(chunk)
+            writer.write_table(pa.table({field: columns[field] for field in FIELDS}, schema=schema))
+            rows += len(chunk['head_id'])
+    return rows
+
+
+def _npz_dtypes() -> Dict[str, np.dtype]:
+    """
+    Returns the dtype of each of the FIELDS in a .npz export: strings are fixed width, wide enough for every row
+    """
+    names = [name for name in names_by_id() if name is not None]
+    max_id = max(pokedex.get_ids())
+    dtypes = {field: np.dtype(np.int16) for field in FIELDS}
+    dtypes['head'] = dtypes['body'] = np.dtype(f'U{max(map(len, names))}')
+    dtypes['type_1'] = dtypes['type_2'] = np.dtype(f'U{max(len(t.name) for t in fusion.TYPES)}')
+    # Urls are longest when the IDs have the most digits
+    dtypes['sprite_url'] = np.dtype(f'U{len(sprites.fusion_sprite_url(max_id, max_id))}')
+    return dtypes
+
+
+@tracing.traced('export.write_npz')
+def write_npz(chunks: Iterable[Chunk], path: str) -> int:
+    """
+    Writes the chunks to a .npz file (readable with numpy.load), with one array per field.
+    Returns the number of rows written.
+
+    Each array is streamed to the archive chunk by chunk, so chunks is iterated
+    once to count the rows and once per field: it must be re-iterable (e.g. a list, or
+    a Chunks object), not a generator.
+    """
+    rows = sum(len(chunk['head_id']) for chunk in chunks)
+    dtypes = _npz_dtypes()
+    names = names_by_id()
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for field in FIELDS:
+            with archive.open(f'{field}.npy', 'w', force_zip64=True) as f:
+                np.lib.format.write_array_header_1_0(f, {'descr': np.lib.format.dtype_to_descr(dtypes[field]),
+                                                         'fortran_order': False,
+                                                         'shape': (rows,)})
+                for chunk in chunks:
+                    if len(chunk['head_id']) == 0:
+                        continue
+                    values = chunk_column(chunk, field, names) if field in STRING_FIELDS else chunk[field]
+                    f.write(np.asarray(values, dtype=dtypes[field]).tobytes())
+    return rows
+
+
+class Chunks:
+    """
+    Re-iterable iter_chunks: every iteration reads the table again (see write_npz)
+    """
+
+    def __init__(self, types: Sequence[Type] = (),
+                 evoline_ids: Optional[Iterable[int]] = None,
+                 chunk_rows: int = CHUNK_ROWS):
+        self.types = tuple(types)
+        self.evoline_ids = None if evoline_ids is None else tuple(evoline_ids)
+        self.chunk_rows = chunk_rows
+
+    def __iter__(self) -> Iterator[Chunk]:
+        return iter_chunks(self.types, self.evoline_ids, self.chunk_rows)
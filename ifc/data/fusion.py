@@ -0,0 +1,480 @@
+"""
+Vectorized fusion engine.
+
+Computes stats, typing and level windows of many head/body pairs at once
+using numpy arrays, applying the same formulas and type rules of FusedPokemon.
+Results are kept as column arrays: FusedPokemon objects are only built
+for the rows that are actually needed.
+"""
+import glob
+import logging
+import os
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from data import memo, pokedex, sprites
+from data.enums import Type
+from data.pokemon import FusedPokemon, fuse_head_stat, fuse_body_stat
+from ifc import tracing
+
+""" Stats where the head counts twice as much as the body """
+HEAD_STATS = ('hp', 'special_attack', 'special_defense')
+""" Stats where the body counts twice as much as the head """
+BODY_STATS = ('attack', 'defense', 'speed')
+""" All the stats, in the same order used by the pokedex """
+STATS = ('hp', 'attack', 'defense', 'special_attack', 'special_defense', 'speed')
+""" Columns identifying the pokemons of a fusion """
+ID_COLUMNS = ('head_id', 'body_id')
+""" All the data columns of a FusionTable """
+COLUMNS = STATS + ('total', 'type_1', 'type_2', 'min_level', 'max_level')
+
+""" Every column, to check the columns of FusionRows cheaply (one is built per evoline) """
+_ALL_COLUMNS = frozenset(ID_COLUMNS + COLUMNS)
+
+""" Types, indexed by their type code """
+TYPES: List[Type] = [*Type]
+""" Type code used when a Pokemon has no second type """
+NO_TYPE: int = -1
+"""
+Largest pokedex whose complete table is cached (see get_table): the table grows with the square
+of the species, 2000 of them make 4M rows (about 100MB). Bigger pokedexes are computed in blocks.
+"""
+MAX_TABLE_SPECIES: int = 2000
+""" Default number of rows computed at a time by compute_blocks """
+BLOCK_ROWS: int = 1 << 20
+
+
+def type_code(t: Type) -> int:
+    """
+    Returns the code used to store 't' inside the fusion arrays.
+    Names are compared instead of Types since Type.ANY is equal to every Type.
+    """
+    return [other.name for other in TYPES].index(t.name)
+
+
+class _Species:
+    """
+    Per-species arrays (stats, type codes and levels) of the whole pokedex,
+    the inputs of every vectorized fusion.
+    """
+
+    def __init__(self):
+        pokemons = [pokedex.get_pokemon(idx) for idx in pokedex.get_ids()]
+
+        self.ids = np.array(pokedex.get_ids(), dtype=np.int32)
+        self._rows = _positions(self.ids)
+
+        self.stats: Dict[str, np.ndarray] = {
+            stat: np.array([getattr(p, stat) for p in pokemons], dtype=np.int32)
+            for stat in STATS
+        }
+        self.type_1 = np.array([type_code(p.types[0]) for p in pokemons], dtype=np.int32)
+        self.type_2 = np.array([type_code(p.types[1]) if len(p.types) > 1 else NO_TYPE
+                                for p in pokemons], dtype=np.int32)
+        self.min_level = np.array([p.min_level for p in pokemons], dtype=np.int32)
+        self.max_level = np.array([p.max_level for p in pokemons], dtype=np.int32)
+
+    def rows(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Converts pokedex IDs to row indexes of the species arrays
+        """
+        assert ids.min() >= 0 and ids.max() < len(self._rows), 'Unknown pokedex ID'
+        rows = self._rows[ids]
+        assert (rows >= 0).all(), 'Unknown pokedex ID'
+        return rows
+
+
+""" Guards the lazy initialization of _species and _table (searches also run in background threads) """
+_lock = threading.RLock()
+
+_species: Optional[_Species] = None
+
+
+def _get_species() -> _Species:
+    global _species
+    with _lock:
+        if _species is None:
+            _species = _Species()
+    return _species
+
+
+class FusionTable:
+    """
+    Column arrays describing the fusions of a grid of heads and bodies,
+    one row per head/body pair (ordered by head, then by body).
+    Every column is accessible by name (see ID_COLUMNS and COLUMNS).
+    """
+
+    def __init__(self, heads: np.ndarray, bodies: np.ndarray, columns: Dict[str, np.ndarray]):
+        assert set(columns.keys()) == set(ID_COLUMNS + COLUMNS), 'Missing or unknown columns'
+        self._heads = heads
+        self._bodies = bodies
+        self._columns = columns
+
+        # Lazily built ID -> grid position lookups (used by rows())
+        self._head_positions: Optional[np.ndarray] = None
+        self._body_positions: Optional[np.ndarray] = None
+
+    @property
+    def heads(self) -> np.ndarray:
+        """ IDs of the heads of the grid """
+        return self._heads
+
+    @property
+    def bodies(self) -> np.ndarray:
+        """ IDs of the bodies of the grid """
+        return self._bodies
+
+    @property
+    def head_id(self) -> np.ndarray:
+        return self._columns['head_id']
+
+    @property
+    def body_id(self) -> np.ndarray:
+        return self._columns['body_id']
+
+    def __len__(self) -> int:
+        return len(self._heads) * len(self._bodies)
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self._columns[column]
+
+    def rows(self, head_ids: Iterable[int], body_ids: Iterable[int]) -> np.ndarray:
+        """
+        Returns the row indexes of a sub-grid of this table.
+
+        :param head_ids: IDs of the heads, they must be part of self.heads.
+        :param body_ids: IDs of the bodies, they must be part of self.bodies.
+        :return: a len(head_ids) x len(body_ids) array of row indexes.
+        """
+        if self._head_positions is None:
+            self._head_positions = _positions(self._heads)
+            self._body_positions = _positions(self._bodies)
+        head_rows = self._head_positions[np.fromiter(head_ids, dtype=np.int32)]
+        body_rows = self._body_positions[np.fromiter(body_ids, dtype=np.int32)]
+        assert (head_rows >= 0).all() and (body_rows >= 0).all(), 'IDs are not part of the table'
+        return head_rows[:, np.newaxis] * len(self._bodies) + body_rows[np.newaxis, :]
+
+    def overlapping(self) -> np.ndarray:
+        """
+        Returns a boolean mask of the rows having a non-empty level window
+        (the fusions that can actually exist in game).
+        """
+        return self._columns['min_level'] <= self._columns['max_level']
+
+    def to_fused_pokemon(self, row: int) -> FusedPokemon:
+        """
+        Builds the FusedPokemon of a single row
+        """
+        return memo.fuse_ids(int(self.head_id[row]), int(self.body_id[row]))
+
+    def to_fused_pokemons(self, rows: Iterable[int] = None) -> List[FusedPokemon]:
+        """
+        Builds the FusedPokemon of the given rows (or of all of them if rows is None)
+        """
+        if rows is None:
+            rows = range(len(self))
+        return [self.to_fused_pokemon(row) for row in rows]
+
+
+class FusionRows(Sequence):
+    """
+    Fusions of arbitrary head/body pairs as column arrays (see ID_COLUMNS and COLUMNS), one row per fusion.
+    It's a sequence of FusedPokemon, built (through the memo) only when a row is accessed:
+    the columns can be read, and the sprite urls listed, without building any fusion.
+    """
+
+    __slots__ = ('_columns', '_start', '_stop')
+
+    def __init__(self, columns: Dict[str, np.ndarray], start: int = 0, stop: int = None):
+        """
+        :param columns: The column arrays.
+        :param start: First row of the columns that is part of this sequence.
+        :param stop: Row after the last one of this sequence, the end of the columns if None.
+        """
+        assert columns.keys() == _ALL_COLUMNS, 'Missing or unknown columns'
+        self._columns = columns
+        self._start = start
+        self._stop = len(columns['head_id']) if stop is None else stop
+
+    @property
+    def columns(self) -> Dict[str, np.ndarray]:
+        return {column: values[self._start:self._stop] for column, values in self._columns.items()}
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[row] for row in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('FusionRows index out of range')
+        row = self._start + index
+        return memo.fuse_ids(int(self._columns['head_id'][row]), int(self._columns['body_id'][row]))
+
+    def sprite_urls(self) -> List[str]:
+        """
+        Returns the sprite url of every row (see FusedPokemon.get_sprite_url)
+        """
+        return [sprites.fusion_sprite_url(head_id, body_id)
+                for head_id, body_id in zip(self._columns['head_id'][self._start:self._stop].tolist(),
+                                            self._columns['body_id'][self._start:self._stop].tolist())]
+
+    def split(self, lengths: Iterable[int]) -> List['FusionRows']:
+        """
+        Splits the rows in consecutive groups of the given lengths (sharing the columns, nothing is copied)
+        """
+        groups = []
+        start = self._start
+        for length in lengths:
+            groups.append(FusionRows(self._columns, start, start + length))
+            start += length
+        return groups
+
+
+def _positions(ids: np.ndarray) -> np.ndarray:
+    """
+    Returns an array mapping each ID to its position inside ids (-1 if missing)
+    """
+    positions = np.full(int(ids.max(initial=0)) + 1, -1, dtype=np.int32)
+    positions[ids] = np.arange(len(ids), dtype=np.int32)
+    return positions
+
+
+@tracing.traced('fusion.compute')
+def compute(head_ids: Iterable[int] = None, body_ids: Iterable[int] = None) -> FusionTable:
+    """
+    Computes all the fusions between head_ids and body_ids.
+    Rows are ordered by head, then by body.
+
+    :param head_ids: pokedex IDs of the heads, all the pokedex if None.
+    :param body_ids: pokedex IDs of the bodies, all the pokedex if None.
+    :return: a FusionTable with len(head_ids) * len(body_ids) rows.
+    """
+    species = _get_species()
+    heads = species.ids if head_ids is None else np.fromiter(head_ids, dtype=np.int32)
+    bodies = species.ids if body_ids is None else np.fromiter(body_ids, dtype=np.int32)
+
+    if len(heads) == 0 or len(bodies) == 0:
+        return FusionTable(heads, bodies,
+                           {column: np.empty(0, dtype=np.int16) for column in ID_COLUMNS + COLUMNS})
+
+    # Broadcast heads over rows and bodies over columns, then flatten
+    columns = _fuse(species, species.rows(heads)[:, np.newaxis], species.rows(bodies)[np.newaxis, :])
+    columns['head_id'] = np.repeat(heads, len(bodies)).astype(np.int16)
+    columns['body_id'] = np.tile(bodies, len(heads)).astype(np.int16)
+    return FusionTable(heads, bodies, columns)
+
+
+@tracing.traced('fusion.compute_pairs')
+def compute_pairs(head_ids: Iterable[int], body_ids: Iterable[int]) -> FusionRows:
+    """
+    Computes the fusions of the pairs (head_ids[i], body_ids[i]), one row per pair (in the same order).
+
+    :param head_ids: pokedex IDs of the heads.
+    :param body_ids: pokedex IDs of the bodies, as many as head_ids.
+    """
+    species = _get_species()
+    heads = np.fromiter(head_ids, dtype=np.int32)
+    bodies = np.fromiter(body_ids, dtype=np.int32)
+    assert len(heads) == len(bodies), 'Every head needs a body'
+
+    if len(heads) == 0:
+        return FusionRows({column: np.empty(0, dtype=np.int16) for column in ID_COLUMNS + COLUMNS})
+    columns = _fuse(species, species.rows(heads), species.rows(bodies))
+    columns['head_id'] = heads.astype(np.int16)
+    columns['body_id'] = bodies.astype(np.int16)
+    return FusionRows(columns)
+
+
+def _fuse(species: _Species, h: np.ndarray, b: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Returns the data columns (see COLUMNS) of the fusions of the species rows h (heads) and b (bodies),
+    broadcast against each other and flattened
+    """
+    shape = np.broadcast_shapes(h.shape, b.shape)
+
+    columns = {}
+    for stat in HEAD_STATS:
+        columns[stat] = fuse_head_stat(species.stats[stat][h], species.stats[stat][b])
+    for stat in BODY_STATS:
+        columns[stat] = fuse_body_stat(species.stats[stat][h], species.stats[stat][b])
+    columns['total'] = sum(columns[stat] for stat in STATS)
+
+    # Head gives its first type, body gives its second one (if it has one, and it's not a duplicate)
+    head_type = np.broadcast_to(species.type_1[h], shape)
+    body_type_2 = species.type_2[b]
+    columns['type_1'] = head_type
+    columns['type_2'] = np.where((body_type_2 != NO_TYPE) & (body_type_2 != head_type),
+                                 body_type_2,
+                                 species.type_1[b])
+
+    columns['min_level'] = np.maximum(species.min_level[h], species.min_level[b])
+    columns['max_level'] = np.minimum(species.max_level[h], species.max_level[b])
+
+    return {column: np.ascontiguousarray(np.broadcast_to(values, shape), dtype=np.int16).ravel()
+            for column, values in columns.items()}
+
+
+def compute_blocks(head_ids: Iterable[int], body_ids: Iterable[int],
+                   block_rows: int = BLOCK_ROWS) -> Iterator[FusionTable]:
+    """
+    Yields all the fusions between head_ids and body_ids as FusionTables of (about) block_rows rows,
+    each one with a slice of the heads and all the bodies: memory does not grow with the number of fusions.
+    """
+    heads = list(head_ids)
+    bodies = list(body_ids)
+    step = max(1, block_rows // max(1, len(bodies)))
+    for start in range(0, len(heads), step):
+        yield compute(heads[start:start + step], bodies)
+
+
+def has_table() -> bool:
+    """
+    Returns True if the pokedex is small enough to have a complete table (see MAX_TABLE_SPECIES and get_table)
+    """
+    return len(pokedex.get_ids()) <= MAX_TABLE_SPECIES
+
+
+_table: Optional[FusionTable] = None
+
+
+def get_table() -> FusionTable:
+    """
+    Returns the complete head x body FusionTable of the pokedex.
+
+    The table is memory-mapped from a binary file saved next to the pokedex csv,
+    so its columns are never copied into Python objects.
+    The file name contains the hash of the csv: if the csv changes,
+    the table is recomputed and the stale file is replaced
+    (when the pokedex is reloaded, only the fusions of the changed species are).
+    Safe to call from multiple threads: the table is loaded only once.
+    Raises ValueError if the pokedex is too big to have one (see has_table), use compute_blocks instead.
+    """
+    global _table
+    if not has_table():
+        raise ValueError(f"No complete fusion table for {len(pokedex.get_ids())} species "
+                         f"(more than {MAX_TABLE_SPECIES})")
+    with _lock:
+        if _table is None:
+            _table = _load_table()
+    return _table
+
+
+def _cache_path(digest: str) -> str:
+    """
+    Returns the path of the cached table of the pokedex csv with the given content hash
+    """
+    root, _ = os.path.splitext(pokedex.get_data_path())
+    return f'{root}.{digest[:16]}.fusions.npy'
+
+
+@tracing.traced('fusion.load_table')
+def _load_table() -> FusionTable:
+    path = _cache_path(pokedex.get_data_digest())
+
+    if os.path.exists(path):
+        try:
+            table = _from_matrix(np.load(path, mmap_mode='r'))
+            if table.heads.tolist() != pokedex.get_ids():
+                raise ValueError('the species do not match the pokedex')
+            return table
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read cached fusions '{path}', recomputing them: {e}")
+
+    return _cache_table(compute(), path)
+
+
+def _cache_table(table: FusionTable, path: str) -> FusionTable:
+    """
+    Saves the table to path and returns it memory-mapped from there (table itself if it can't be saved).
+    The cached tables of the other versions of the csv are removed.
+    """
+    try:
+        _save_matrix(table, path)
+    except (OSError, ValueError) as e:
+        # e.g. read-only installation folder: keep the table in memory
+        logging.warning(f"Could not cache fusions to '{path}': {e}")
+        return table
+    for stale in glob.glob(_cache_path('*')):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError as e:
+                # e.g. the previous table is still mapped (Windows): it's removed by the next update
+                logging.warning(f"Could not remove stale fusions '{stale}': {e}")
+    return _from_matrix(np.load(path, mmap_mode='r'))
+
+
+@tracing.traced('fusion.update_table')
+def _update_table(table: FusionTable, species_ids: Iterable[int]) -> FusionTable:
+    """
+    Returns a copy of table where only the fusions having one of species_ids as head or body are computed again,
+    cached for the loaded csv. The table must have all the species of the pokedex, in the pokedex order.
+    """
+    names = ID_COLUMNS + COLUMNS
+    matrix = np.stack([table[column] for column in names])
+    updated = _from_matrix(matrix)
+    changed = sorted(species_ids)
+    ids = pokedex.get_ids()
+    # Rows of the changed heads, then columns of the changed bodies
+    for rows, fusions in ((updated.rows(changed, ids), compute(changed, ids)),
+                          (updated.rows(ids, changed), compute(ids, changed))):
+        for i, column in enumerate(names):
+            matrix[i, rows.ravel()] = fusions[column]
+    return _cache_table(updated, _cache_path(pokedex.get_data_digest()))
+
+
+def _on_pokedex_changed(change: pokedex.DexChange):
+    """
+    Updates the species arrays and the complete table after the pokedex was reloaded:
+    if it still has the same species (in the same order) only the fusions of the changed ones
+    are computed again, otherwise the table is recomputed the next time it's needed.
+    """
+    global _species, _table
+    with _lock:
+        _species = None
+        if _table is None:
+            return
+        if has_table() and _table.heads.tolist() == pokedex.get_ids():
+            _table = _update_table(_table, change.changed)
+        else:
+            _table = None
+
+
+pokedex.add_listener(_on_pokedex_changed)
+
+
+def _save_matrix(table: FusionTable, path: str) -> None:
+    """
+    Saves the table as a single (columns x rows) int16 matrix.
+    The matrix is written to a temporary file first, so a half-written
+    cache is never picked up by another instance of the app.
+    """
+    if table.heads.max(initial=0) > np.iinfo(np.int16).max:
+        raise ValueError('IDs do not fit the cache format')
+    matrix = np.stack([table[column] for column in ID_COLUMNS + COLUMNS]).astype(np.int16)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, matrix)
+    os.replace(tmp_path, path)
+
+
+def _from_matrix(matrix: np.ndarray) -> FusionTable:
+    """
+    Wraps a (columns x rows) matrix saved by _save_matrix in a FusionTable,
+    every column is a view of the matrix.
+    """
+    names = ID_COLUMNS + COLUMNS
+    if matrix.ndim != 2 or matrix.shape[0] != len(names):
+        raise ValueError(f'Invalid fusion matrix shape {matrix.shape}')
+    columns = {name: matrix[i] for i, name in enumerate(names)}
+    # The table is a full grid: every species is both a head and a body
+    n = int(round(np.sqrt(matrix.shape[1])))
+    if n * n != matrix.shape[1]:
+        raise ValueError(f'Invalid fusion matrix shape {matrix.shape}')
+    return FusionTable(heads=columns['head_id'][::n], bodies=columns['body_id'][:n], columns=columns)
@@ -0,0 +1,123 @@
+"""
+Memo of the fusions built so far.
+
+The same fusion is needed again and again (both directions of every pair, evolines shared
+by different pairs, repeated searches): fusions are immutable, so each one is built once
+and shared, with its sprite url (and, once shown, its tooltip) already formatted.
+When the pokedex is reloaded, only the fusions of the species that changed are forgotten.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from data import pokedex
+from data.pokemon import FusedPokemon, Pokemon
+
+""" Default maximum number of fusions kept (the whole pokedex has about 176k of them) """
+DEFAULT_MAX_FUSIONS: int = 50000
+
+
+class FusionMemo:
+    """
+    LRU memo of FusedPokemon keyed by (head ID, body ID), holding at most max_fusions of them.
+    Safe to use from multiple threads.
+    """
+
+    def __init__(self, max_fusions: int = DEFAULT_MAX_FUSIONS):
+        self._max_fusions = max_fusions
+        self._fusions: 'OrderedDict[Tuple[int, int], FusedPokemon]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._fusions)
+
+    def fuse(self, head: Pokemon, body: Pokemon) -> FusedPokemon:
+        """
+        Returns the fusion of head and body, building it only if it's not in the memo
+        """
+        key = (head.idx, body.idx)
+        with self._lock:
+            fusion = self._fusions.get(key)
+            if fusion is not None:
+                self._fusions.move_to_end(key)
+                self.hits += 1
+                return fusion
+            self.misses += 1
+
+        # Built outside of the lock: two threads may build the same fusion, they are equal
+        fusion = FusedPokemon(head, body)
+        with self._lock:
+            self._fusions[key] = fusion
+            while len(self._fusions) > self._max_fusions:
+                self._fusions.popitem(last=False)
+        return fusion
+
+    def forget(self, species_ids: Iterable[int]):
+        """
+        Forgets the fusions having one of species_ids as head or body (e.g. when they change in the pokedex)
+        """
+        species_ids = set(species_ids)
+        with self._lock:
+            for key in [key for key in self._fusions if key[0] in species_ids or key[1] in species_ids]:
+                del self._fusions[key]
+
+    def clear(self):
+        """
+        Forgets every fusion (e.g. when the pokedex changes) and resets the statistics
+        """
+        with self._lock:
+            self._fusions.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Returns hits, misses, hit rate, size and maximum size of the memo
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                    'size': len(self._fusions), 'max_size': self._max_fusions}
+
+
+_memo: Optional[FusionMemo] = None
+_memo_lock = threading.Lock()
+
+
+def get_memo() -> FusionMemo:
+    """
+    Returns the app-wide fusion memo.
+    Its size can be configured with the environment variable IFC_FUSION_MEMO (maximum number of fusions).
+    """
+    global _memo
+    if _memo is None:
+        with _memo_lock:
+            if _memo is None:
+                _memo = FusionMemo(int(os.environ.get('IFC_FUSION_MEMO', DEFAULT_MAX_FUSIONS)))
+    return _memo
+
+
+def _on_pokedex_changed(change: pokedex.DexChange):
+    if _memo is not None:
+        _memo.forget(change.species)
+
+
+pokedex.add_listener(_on_pokedex_changed)
+
+
+def fuse(head: Pokemon, body: Pokemon) -> FusedPokemon:
+    """
+    Returns the fusion of head and body, see FusionMemo.fuse
+    """
+    return get_memo().fuse(head, body)
+
+
+def fuse_ids(head_id: int, body_id: int) -> FusedPokemon:
+    """
+    Returns the fusion of the Pokemon with pokedex IDs head_id and body_id, see FusionMemo.fuse
+    """
+    return get_memo().fuse(pokedex.get_pokemon(head_id), pokedex.get_pokemon(body_id))
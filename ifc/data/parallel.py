@@ -0,0 +1,164 @@
+"""
+Batch cross-fusions evaluated in shards across a pool of processes.
+
+Pairs are split in shards of SHARD_SIZE pairs, shards are evaluated by the worker
+processes (each one loads the pokedex once, when it starts) and their results are
+merged back in the order of the pairs. Workers do the whole work of a shard: they find the fusions
+of its pairs (see utils.get_fusion_ids) and compute their stats, types and levels
+at once (see fusion.compute_pairs), sending back compact column arrays.
+Evolines are FusionRows: the calling process only splits the columns, FusedPokemon
+are built through its memo when a row is displayed (see memo.fuse_ids).
+
+The pool is started the first time it's needed and reused by the next batches (until the pokedex
+is reloaded: the workers have to load it again), small batches are evaluated in the calling
+process (starting the workers would cost more), in shards as well.
+"""
+import atexit
+import multiprocessing
+import multiprocessing.pool
+import os
+import threading
+from collections import deque
+from itertools import islice
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from data import fusion, pokedex, segments, utils
+from data.fusion import FusionRows
+
+""" Number of pairs evaluated by a worker at a time """
+SHARD_SIZE: int = 256
+""" Batches with fewer pairs than this are evaluated in the calling process: starting the pool (0.3s to 0.5s)
+takes as long as evaluating them, measured with python -m benchmarks.parallel """
+MIN_PARALLEL_PAIRS: int = 20000
+""" Shards submitted to the pool per worker, ahead of the ones being merged """
+SHARDS_AHEAD: int = 2
+
+""" A pair of Pokemon names and its evolines (see utils.get_evolines) """
+PairResult = Tuple[Tuple[str, str], List[FusionRows]]
+""" The fusions of a shard, and the lengths of the evolines of each pair """
+ShardResult = Tuple[FusionRows, List[List[int]]]
+
+
+def get_workers() -> int:
+    """
+    Returns the number of worker processes: the IFC_WORKERS environment variable, or the number of CPUs
+    (a single CPU means a single worker: batches are evaluated in the calling process)
+    """
+    return max(1, int(os.environ.get('IFC_WORKERS', 0)) or os.cpu_count() or 1)
+
+
+def shard(items: Sequence, size: int = SHARD_SIZE) -> List[Sequence]:
+    """
+    Splits items in consecutive shards of (at most) size items
+    """
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def _init_worker(data_path: str, digest: str):
+    # The pokedex was loaded when this module was imported: load the one of the app if it's another one
+    if pokedex.get_data_path() != data_path or pokedex.get_data_digest() != digest:
+        pokedex.load(data_path)
+    segments.get_table()
+
+
+def _evaluate_shard(pairs: Sequence[Tuple[str, str]], display_ba: bool = True) -> ShardResult:
+    """
+    Returns the fusions of the evolines of every pair of a shard, in order, skipping empty evolines
+    like utils.get_evolines (top-level function, so that it can run in worker processes)
+    """
+    head_ids = []
+    body_ids = []
+    lengths = []
+    for name1, name2 in pairs:
+        ids_ab, ids_ba = utils.get_fusion_ids(name1, name2)
+        evolines = [evoline for evoline in ((ids_ab, ids_ba) if display_ba else (ids_ab,)) if evoline]
+        lengths.append([len(evoline) for evoline in evolines])
+        for evoline in evolines:
+            for head_id, body_id in evoline:
+                head_ids.append(head_id)
+                body_ids.append(body_id)
+    return fusion.compute_pairs(head_ids, body_ids), lengths
+
+
+def _split(pairs: Sequence[Tuple[str, str]], result: ShardResult) -> Iterator[PairResult]:
+    """
+    Yields the evolines of every pair of a shard
+    """
+    rows, lengths = result
+    evolines = iter(rows.split(length for pair_lengths in lengths for length in pair_lengths))
+    for pair, pair_lengths in zip(pairs, lengths):
+        yield pair, list(islice(evolines, len(pair_lengths)))
+
+
+""" Guards the lazy creation of _pool (batches are evaluated in background threads) """
+_lock = threading.Lock()
+
+_pool: Optional[multiprocessing.pool.Pool] = None
+_pool_workers: int = 0
+""" Hash of the pokedex loaded by the workers of _pool """
+_pool_digest: str = ''
+
+
+def _get_pool(workers: int) -> multiprocessing.pool.Pool:
+    """
+    Returns the pool of worker processes, (re)started if it does not have the given number of workers
+    or if the pokedex was reloaded since it was started
+    """
+    global _pool, _pool_workers, _pool_digest
+    with _lock:
+        if _pool is None or _pool_workers != workers or _pool_digest != pokedex.get_data_digest():
+            if _pool is not None:
+                _pool.terminate()
+            # Spawned, not forked: the calling process may be running other threads (e.g. Qt ones)
+            _pool_digest = pokedex.get_data_digest()
+            _pool = multiprocessing.get_context('spawn').Pool(
+                workers, initializer=_init_worker, initargs=(pokedex.get_data_path(), _pool_digest))
+            _pool_workers = workers
+        return _pool
+
+
+def close():
+    """
+    Stops the worker processes (a later batch starts them again)
+    """
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.terminate()
+            _pool = None
+
+
+atexit.register(close)
+
+
+def evaluate_pairs(pairs: Sequence[Tuple[str, str]], workers: int = None,
+                   display_ba: bool = True) -> Iterator[PairResult]:
+    """
+    Yields (pair, evolines) for every pair, in the order of pairs, see utils.get_evolines
+    (evolines are FusionRows, with the same fusions).
+    Results are yielded as soon as their shard is done: stopping the iteration early
+    drops the shards that were not evaluated yet.
+
+    :param pairs: The pairs of Pokemon names to fuse.
+    :param workers: Number of worker processes, see get_workers if None.
+    :param display_ba: If False, only the fusions having the first Pokemon of the pair as head
+                       (its evoline as head, the evoline of the second one as body).
+    """
+    workers = workers or get_workers()
+    if workers <= 1 or len(pairs) < MIN_PARALLEL_PAIRS:
+        for pairs_shard in shard(pairs):
+            yield from _split(pairs_shard, _evaluate_shard(pairs_shard, display_ba))
+        return
+
+    pool = _get_pool(workers)
+    shards = iter(shard(pairs))
+    # Only a few shards per worker are submitted ahead, so that results come back
+    # in order while the workers stay busy
+    pending = deque((pairs_shard, pool.apply_async(_evaluate_shard, (pairs_shard, display_ba)))
+                    for pairs_shard in islice(shards, workers * SHARDS_AHEAD))
+    while pending:
+        pairs_shard, result = pending.popleft()
+        result = result.get()
+        for next_shard in islice(shards, 1):
+            pending.append((next_shard, pool.apply_async(_evaluate_shard, (next_shard, display_ba))))
+        yield from _split(pairs_shard, result)
@@ -1,22 +1,231 @@
-import json
-import os.path
-from typing import List
+"""
+The pokedex: every Pokemon of the csv, its evolution lines and the indexes used by the searches.
 
-import pandas as pd
-from pandas import DataFrame
+The csv is loaded when this module is imported and can be loaded again while the app runs
+(see load): only the rows that changed are parsed again, and only the evolines they belong to
+are rebuilt. Modules caching data derived from the pokedex (e.g. fusions) register a listener
+to update what depends on the changed species (see add_listener).
+"""
+import csv
+import hashlib
+import io
+import json
+import logging
+import threading
+from itertools import groupby
+from typing import Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Set, Tuple, TypeVar
 
-from data.enums import Type
+from data.enums import Type, TypeSlot
 from data.pokemon import Pokemon
-from ifc import RESOURCES_PATH
+from ifc import DATA_PATH, tracing
+
+
+def _read_data(path: str) -> Tuple[List[Dict[str, str]], str]:
+    """
+    Reads the rows of the pokedex csv (a few hundred small rows: the csv module is
+    much faster to import and run than a dataframe library for this).
+    Returns them with the hash of the file (of the same bytes the rows were read from).
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    rows = list(csv.DictReader(io.StringIO(content.decode('utf-8'), newline='')))
+    return rows, hashlib.sha1(content).hexdigest()
+
+
+def _parse_row(row: Dict[str, str]) -> Pokemon:
+    """
+    Parses a row of the pokedex (JSON columns included) into a Pokemon.
+    Pokemon are immutable, so these instances are shared by every caller.
+    Raises ValueError if the row is not valid.
+    """
+    try:
+        return Pokemon(idx=int(row['ID']),
+                       name=row['NAME'],
+                       min_level=int(row['MIN_LEVEL']), max_level=int(row['MAX_LEVEL']),
+                       evoline=json.loads(row['EVOLINE']),
+                       types=[Type[t] for t in json.loads(row['TYPES'])],
+                       hp=int(row['HP']),
+                       attack=int(row['ATK']), defense=int(row['DEF']),
+                       spatk=int(row['SPATK']), spdef=int(row['SPDEF']),
+                       speed=int(row['SPD']))
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid pokedex row {row.get('ID')!r}: {type(e).__name__} {e}") from e
+
+
+class Evoline(NamedTuple):
+    """
+    An evolution line, identified by the ID of its base form.
+    members are sorted by min_level (ties keep the pokedex order) and intervals are their
+    level windows (min_level, max_level). Members sharing the same level window form a stage:
+    a stage with more than one member is a branch (e.g. the evolutions of eevee).
+    Evolutions that don't depend on the level (e.g. by stone) share the window of the member
+    they evolve from, so it's part of the same stage (gloom, vileplume and bellossom).
+    """
+    idx: int
+    members: Tuple[Pokemon, ...]
+    intervals: Tuple[Tuple[int, int], ...]
+    stages: Tuple[Tuple[Pokemon, ...], ...]
+
+    @property
+    def member_ids(self) -> Tuple[int, ...]:
+        return tuple(member.idx for member in self.members)
+
+    @property
+    def branches(self) -> Tuple[Tuple[Pokemon, ...], ...]:
+        """ The stages having more than one member """
+        return tuple(stage for stage in self.stages if len(stage) > 1)
+
+
+class DexChange(NamedTuple):
+    """
+    What a load of the pokedex changed (see load).
+    added, removed and changed are pokedex IDs (changed: anything in their row),
+    evolines are the IDs of the evolines those species belong to, before or after the change.
+    Empty changes are falsy.
+    """
+    added: FrozenSet[int]
+    removed: FrozenSet[int]
+    changed: FrozenSet[int]
+    evolines: FrozenSet[int]
 
-_data: DataFrame = pd.read_csv(os.path.join(RESOURCES_PATH, 'data.csv'), index_col='ID')
+    @property
+    def species(self) -> FrozenSet[int]:
+        """ IDs of the species added, removed or changed """
+        return self.added | self.removed | self.changed
+
+    def __bool__(self) -> bool:
+        return bool(self.species)
+
+
+""" Path of the loaded csv, and the hash of its content """
+_data_path: str = DATA_PATH
+_data_digest: str = ''
+""" Rows of the loaded csv by ID, as they were read: a reload only parses the rows that differ """
+_rows: Dict[int, Dict[str, str]] = dict()
+""" Every Pokemon of the pokedex, by ID (in pokedex order) """
+_pokemons: Dict[int, Pokemon] = dict()
+""" Lowercase name -> ID """
+_ids_by_name: Dict[str, int] = dict()
+""" Evoline ID -> member IDs (evolines in pokedex order, see _update_evolines) """
+_evolines: Dict[int, Tuple[int, ...]] = dict()
+""" (type name, slot) -> IDs of the evolines having at least one member with that type in that slot """
+_evolines_by_slot: Dict[Tuple[str, TypeSlot], Dict[int, None]] = dict()
+""" (first type name, second type name) -> IDs of the evolines having a member with exactly that typing """
+_evolines_by_typing: Dict[Tuple[str, str], Dict[int, None]] = dict()
+""" Evoline ID -> Evoline """
+_evoline_graph: Dict[int, Evoline] = dict()
+
+
+def _slot_keys(pokemon: Pokemon) -> List[Tuple[str, TypeSlot]]:
+    """
+    Returns the keys of _evolines_by_slot matching pokemon
+    """
+    names = [t.name for t in pokemon.types]
+    keys = [(names[0], TypeSlot.PRIMARY)]
+    if len(names) > 1:
+        keys.append((names[1], TypeSlot.SECONDARY))
+    return keys + [(name, TypeSlot.ANY) for name in names]
+
+
+def _typing_keys(pokemon: Pokemon) -> List[Tuple[str, str]]:
+    """
+    Returns the keys of _evolines_by_typing matching pokemon
+    """
+    names = [t.name for t in pokemon.types]
+    return [(names[0], names[1])] if len(names) > 1 else []
+
+
+def _update_evolines(old: Dict[int, Tuple[int, ...]], pokemons: Dict[int, Pokemon], parsed: Iterable[int],
+                     affected: Set[int], positions: Dict[int, int]) -> Dict[int, Tuple[int, ...]]:
+    """
+    Returns the evoline table with the affected evolines rebuilt from their members in pokemons.
+    An evoline is identified by the ID of its first member (the base form) and lists the members
+    of its first Pokemon in the pokedex, evolines are ordered by their first Pokemon in the pokedex.
+    Raises ValueError if an evoline lists a Pokemon that is not in the pokedex.
+
+    :param parsed: IDs of the Pokemon added or changed.
+    :param positions: Pokedex ID -> position in the pokedex.
+    """
+    # Possible members of the affected evolines: the old ones, and the Pokemon that now belong to them
+    candidates: Dict[int, Set[int]] = {evoline_id: set(old.get(evoline_id, ())) for evoline_id in affected}
+    for idx in parsed:
+        candidates[pokemons[idx].raw_evoline[0]].add(idx)
+
+    evolines = {evoline_id: members for evoline_id, members in old.items() if evoline_id not in affected}
+    for evoline_id, members in candidates.items():
+        members = [idx for idx in members if idx in pokemons and pokemons[idx].raw_evoline[0] == evoline_id]
+        if not members:
+            continue
+        evolines[evoline_id] = pokemons[min(members, key=positions.__getitem__)].raw_evoline
+        missing = [idx for idx in evolines[evoline_id] if idx not in pokemons]
+        if missing:
+            raise ValueError(f"Evoline {evoline_id} lists unknown pokedex IDs {missing}")
+    return dict(sorted(evolines.items(), key=lambda item: min(positions[idx] for idx in item[1])))
+
+
+def _build_evoline(pokemons: Dict[int, Pokemon], evoline_id: int, member_ids: Tuple[int, ...]) -> Evoline:
+    """
+    Builds the Evoline of the given members
+    """
+    members = tuple(sorted((pokemons[idx] for idx in member_ids), key=lambda p: p.min_level))
+    intervals = tuple((p.min_level, p.max_level) for p in members)
+    stages = tuple(tuple(stage) for _, stage in groupby(members, key=lambda p: (p.min_level, p.max_level)))
+    return Evoline(evoline_id, members, intervals, stages)
+
+
+K = TypeVar('K')
+
+
+def _update_type_index(index: Dict[K, Dict[int, None]], keys: Callable[[Pokemon], List[K]],
+                       old_evolines: Dict[int, Tuple[int, ...]], old_pokemons: Dict[int, Pokemon],
+                       evolines: Dict[int, Tuple[int, ...]], pokemons: Dict[int, Pokemon],
+                       affected: Set[int], positions: Dict[int, int]) -> Dict[K, Dict[int, None]]:
+    """
+    Returns a copy of an inverted type index with the entries matched by the affected evolines
+    (by their members before or after the change) rebuilt, the other entries are shared.
+    Entry values are dicts used as insertion-ordered sets: evolines are listed
+    in the order their first matching member appears in the pokedex.
+
+    :param keys: Returns the keys of the index matching a Pokemon.
+    """
+    touched = set()
+    # Key -> evoline ID -> position of its first member matching the key
+    first_positions: Dict[K, Dict[int, int]] = dict()
+    for evoline_id in affected:
+        for idx in old_evolines.get(evoline_id, ()):
+            touched.update(keys(old_pokemons[idx]))
+        for idx in evolines.get(evoline_id, ()):
+            for key in keys(pokemons[idx]):
+                entry = first_positions.setdefault(key, dict())
+                entry[evoline_id] = min(entry.get(evoline_id, positions[idx]), positions[idx])
+    touched.update(first_positions)
+
+    updated = dict(index)
+    for key in touched:
+        entry = first_positions.get(key, dict())
+        # The other evolines of the entry keep their members, but not necessarily their positions
+        for evoline_id in index.get(key, ()):
+            if evoline_id not in affected:
+                entry[evoline_id] = min(positions[idx] for idx in evolines[evoline_id] if key in keys(pokemons[idx]))
+        if entry:
+            updated[key] = dict.fromkeys(sorted(entry, key=entry.__getitem__))
+        else:
+            updated.pop(key, None)
+    return updated
 
 
 def get_names() -> List[str]:
     """
     Returns a list of the names of all the pokemons in the pokedex
     """
-    return _data['NAME'].tolist()
+    return [pokemon.name for pokemon in _pokemons.values()]
+
+
+def get_ids() -> List[int]:
+    """
+    Returns a list of the IDs of all the pokemons in the pokedex
+    """
+    return list(_pokemons.keys())
 
 
 def get_types() -> List[str]:
@@ -33,36 +242,187 @@ def get_pokemon(idx: int = None, name: str = None) -> Pokemon:
     if idx is None:
         idx = get_id_by_name(name)
 
-    pokemon = Pokemon(_data.loc[idx])
+    return _pokemons[idx]
+
+
+def get_evoline_ids(pokemon_type: Type, slot: TypeSlot = TypeSlot.ANY) -> FrozenSet[int]:
+    """
+    Returns the IDs of the evolines having at least one member with pokemon_type in the given slot.
+    Type.ANY matches every evoline.
+    """
+    if Type.is_any(pokemon_type):
+        return frozenset(_evolines)
+    return frozenset(_evolines_by_slot.get((pokemon_type.name, slot), ()))
+
+
+def _ordered_evoline_ids_by_type(first_type: Type = None, second_type: Type = None) -> Iterable[int]:
+    first_type = first_type if first_type and not Type.is_any(first_type) else None
+    second_type = second_type if second_type and not Type.is_any(second_type) else None
+
+    if first_type and second_type:
+        return _evolines_by_typing.get((first_type.name, second_type.name), ())
+    if first_type:
+        return _evolines_by_slot.get((first_type.name, TypeSlot.PRIMARY), ())
+    if second_type:
+        return _evolines_by_slot.get((second_type.name, TypeSlot.SECONDARY), ())
+    return _evolines
+
+
+def get_evoline_ids_by_type(first_type: Type = None, second_type: Type = None) -> FrozenSet[int]:
+    """
+    Returns the IDs of the evolines having at least one member with first_type as primary type
+    and second_type as secondary type.
+    A None (or ANY) type does not filter: if both are specified, a member must have exactly that typing.
+    """
+    return frozenset(_ordered_evoline_ids_by_type(first_type, second_type))
+
+
+def get_evoline_members(evoline_id: int) -> Tuple[int, ...]:
+    """
+    Returns the IDs of the members of an evoline (base form first)
+    """
+    return _evolines[evoline_id]
 
-    return pokemon
+
+def get_evoline(evoline_id: int = None, name: str = None) -> Evoline:
+    """
+    Returns an evoline given its ID, or the evoline of the Pokemon with name 'name'
+    """
+    assert (evoline_id is not None) ^ (name is not None), 'Only one between id or name can be used'
+    if evoline_id is None:
+        evoline_id = get_pokemon(name=name).raw_evoline[0]
+    return _evoline_graph[evoline_id]
 
 
+@tracing.traced('pokedex.get_evolines_by_type')
 def get_evolines_by_type(first_type: Type = None, second_type: Type = None) -> List[List[Pokemon]]:
-    must_contain = (f'\["{first_type.name}"' if first_type and not Type.is_any(first_type) else "") + \
-                   (f', "{second_type.name}"\]' if second_type and not Type.is_any(second_type) else "")
+    """
+    Returns the evolines (in pokedex order) having at least one member
+    with first_type as primary type and second_type as secondary type
+    (see get_evoline_ids_by_type).
+    """
     return [
-        get_pokemon(json.loads(evo)[0]).evoline
-        for evo in _data[
-            _data['TYPES'].str.contains(must_contain)
-        ]['EVOLINE'].unique()
+        list(_evoline_graph[evoline_id].members)
+        for evoline_id in _ordered_evoline_ids_by_type(first_type, second_type)
     ]
 
 
-
 def get_id_by_name(name: str) -> int:
     """
     Returns the ID of the pokemon with name 'name'
-    :param name: The name of the pokemon to get the id of
+    :param name: The name of the pokemon to get the id of (case-insensitive)
     :return: The id of the pokemon
     """
-    return int(_data[_data['NAME'] == name].index[0])
+    return _ids_by_name[name.lower()]
 
 
 def get_evolution_list(name: str) -> List[Pokemon]:
-    result = list()
+    """
+    Returns the members of the evoline of the Pokemon with name 'name', sorted by min_level
+    """
+    return list(get_evoline(name=name).members)
+
+
+""" Guards load (the pokedex can be reloaded while searches read it from other threads) """
+_lock = threading.Lock()
+""" Functions called with the DexChange of every load that changed the pokedex """
+_listeners: List[Callable[[DexChange], None]] = []
+
+
+def get_data_path() -> str:
+    """
+    Returns the path of the loaded pokedex csv
+    """
+    return _data_path
+
+
+def get_data_digest() -> str:
+    """
+    Returns the hash of the content of the loaded pokedex csv
+    """
+    return _data_digest
+
+
+def add_listener(listener: Callable[[DexChange], None]) -> None:
+    """
+    Registers a function called with the DexChange every time a load changes the pokedex
+    (after the new pokedex replaced the old one, in the thread calling load)
+    """
+    _listeners.append(listener)
+
+
+@tracing.traced('pokedex.load')
+def load(path: str = None) -> DexChange:
+    """
+    Loads the pokedex csv at path (the loaded one again if None) in place of the current pokedex.
+
+    Only what changed since the last load is rebuilt: the new and changed rows are parsed
+    (the other Pokemon instances are kept), and the evolines they belong to are rebuilt in
+    the evoline graph and in the type indexes. The new pokedex replaces the old one once it's
+    complete, then the listeners are called with the changes (see add_listener).
+    Raises OSError if the csv can't be read and ValueError if it's not a valid pokedex:
+    the current pokedex is kept.
+
+    :return: What changed (falsy if nothing did).
+    """
+    global _data_path, _data_digest, _rows, _pokemons, _ids_by_name, \
+        _evolines, _evolines_by_slot, _evolines_by_typing, _evoline_graph
+    with _lock:
+        path = path or _data_path
+        data, digest = _read_data(path)
+        rows: Dict[int, Dict[str, str]] = dict()
+        for row in data:
+            try:
+                idx = int(row['ID'])
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Invalid pokedex ID {row.get('ID')!r}") from e
+            if idx in rows:
+                raise ValueError(f"Duplicate pokedex ID {idx}")
+            rows[idx] = row
+
+        if [idx for idx in rows if idx in _rows] == [idx for idx in _rows if idx in rows]:
+            parsed = {idx: _parse_row(row) for idx, row in rows.items() if _rows.get(idx) != row}
+        else:
+            # Rows were moved: the pokedex order changed, everything is rebuilt
+            parsed = {idx: _parse_row(row) for idx, row in rows.items()}
+        removed = frozenset(_rows.keys() - rows.keys())
+        changed = frozenset(parsed.keys() & _rows.keys())
+        pokemons = {idx: parsed[idx] if idx in parsed else _pokemons[idx] for idx in rows}
+        positions = {idx: position for position, idx in enumerate(pokemons)}
+        # Evolines of the changed species, before and after the change
+        affected = {_pokemons[idx].raw_evoline[0] for idx in removed | changed} \
+            | {pokemon.raw_evoline[0] for pokemon in parsed.values()}
+
+        ids_by_name = dict(_ids_by_name)
+        for idx in removed | changed:
+            del ids_by_name[_pokemons[idx].name.lower()]
+        for idx, pokemon in parsed.items():
+            if pokemon.name.lower() in ids_by_name:
+                raise ValueError(f"Duplicate pokedex name '{pokemon.name}'")
+            ids_by_name[pokemon.name.lower()] = idx
+
+        evolines = _update_evolines(_evolines, pokemons, parsed, affected, positions)
+        evoline_graph = {evoline_id: _build_evoline(pokemons, evoline_id, members) if evoline_id in affected
+                         else _evoline_graph[evoline_id]
+                         for evoline_id, members in evolines.items()}
+        by_slot = _update_type_index(_evolines_by_slot, _slot_keys, _evolines, _pokemons,
+                                     evolines, pokemons, affected, positions)
+        by_typing = _update_type_index(_evolines_by_typing, _typing_keys, _evolines, _pokemons,
+                                       evolines, pokemons, affected, positions)
+
+        _data_path, _data_digest, _rows = path, digest, rows
+        _pokemons, _ids_by_name, _evolines, _evoline_graph = pokemons, ids_by_name, evolines, evoline_graph
+        _evolines_by_slot, _evolines_by_typing = by_slot, by_typing
+        change = DexChange(added=frozenset(parsed.keys() - changed), removed=removed, changed=changed,
+                           evolines=frozenset(affected))
+
+    if change:
+        for listener in list(_listeners):
+            try:
+                listener(change)
+            except Exception:
+                logging.exception(f"Could not update {listener.__module__} after the pokedex changed")
+    return change
+
 
-    for idx in json.loads(_data.loc[get_id_by_name(name)]['EVOLINE']):
-        result.append(get_pokemon(idx=idx))
-    result.sort(key=lambda a: a.min_level)
-    return result
+load(DATA_PATH)
@@ -1,29 +1,48 @@
 from __future__ import annotations
 
 import abc
-import json
+import functools
 from abc import ABC
-from typing import List
+from typing import List, Sequence, Tuple, Type as Class
 
-import pandas as pd
-from PyQt6 import QtNetwork
-from PyQt6.QtCore import QUrl
-from PyQt6.QtNetwork import QNetworkAccessManager
-
-from data import pokedex
+from data import pokedex, sprites
 from data.enums import Type
 
 
+def fuse_head_stat(head, body):
+    """
+    Stat formula used for HP, Special Attack and Special Defense,
+    where the head counts twice as much as the body.
+    Works both on plain ints and on numpy integer arrays.
+    """
+    return (head * 2 + body) // 3
+
+
+def fuse_body_stat(head, body):
+    """
+    Stat formula used for Attack, Defense and Speed,
+    where the body counts twice as much as the head.
+    Works both on plain ints and on numpy integer arrays.
+    """
+    return (head + body * 2) // 3
+
+
 class AbstractPokemon(ABC):
     """
     Abstract class.
     Base for utility classed for Pokemon data.
+    Instances are immutable (so they can be safely shared):
+    subclasses must set their own attributes before calling super().__init__.
     """
 
+    __slots__ = ('_name', '_min_level', '_max_level', '_types',
+                 '_hp', '_atk', '_def', '_spatk', '_spdef', '_spd',
+                 '_frozen')
+
     def __init__(self,
                  name: str,
                  min_level: int, max_level: int,
-                 types: List[Type],
+                 types: Sequence[Type],
                  hp: int,
                  attack: int, defense: int,
                  spatk: int, spdef: int,
@@ -34,7 +53,7 @@ class AbstractPokemon(ABC):
         self._min_level = min_level
         self._max_level = max_level
 
-        self._types = types
+        self._types = tuple(types)
 
         self._hp = hp
         self._atk = attack
@@ -43,6 +62,17 @@ class AbstractPokemon(ABC):
         self._spdef = spdef
         self._spd = speed
 
+        self._frozen = True
+
+    def __setattr__(self, key, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError(f"{type(self).__name__} is immutable, can't set '{key}'")
+        super().__setattr__(key, value)
+
+    def __reduce__(self):
+        # Pickled as the values of its slots: unpickling neither recomputes them nor goes through __setattr__
+        return _restore, (type(self), tuple(object.__getattribute__(self, slot) for slot in _slots(type(self))))
+
     @property
     def name(self) -> str:
         return self._name
@@ -56,7 +86,7 @@ class AbstractPokemon(ABC):
         return self._max_level
 
     @property
-    def types(self) -> List[Type]:
+    def types(self) -> Tuple[Type, ...]:
         return self._types
 
     @property
@@ -87,10 +117,6 @@ class AbstractPokemon(ABC):
     def total(self) -> int:
         return self.hp + self.attack + self.defense + self.special_attack + self.special_defense + self.speed
 
-    def fetch_image(self, nam: QNetworkAccessManager) -> None:
-        qurl = QtNetwork.QNetworkRequest(QUrl(self.get_sprite_url()))
-        nam.get(qurl)
-
     @abc.abstractmethod
     def get_sprite_url(self) -> str:
         raise NotImplementedError("Implement this method!")
@@ -100,53 +126,79 @@ class Pokemon(AbstractPokemon):
     """
     Utility class for (unfused) Pokemon data.
     Used to access csv data in an easier way.
+    Instances are created once by the pokedex and shared: use pokedex.get_pokemon to get one.
     """
 
-    def __init__(self, series: pd.Series):
-        assert len(series.index) == 11, f'Not enough values in Series {series}'
-        for i in range(4):
-            assert series.index[i] in ['NAME',
-                                       'MIN_LEVEL', 'MAX_LEVEL',
-                                       'EVOLINE',
-                                       'TYPES',
-                                       'HP', 'ATK', 'DEF', 'SPATK', 'SPDEF', 'SPD'], \
-                f"{series.index[i]} is not a valid index"
+    __slots__ = ('_idx', '_evoline')
 
-        self._evoline = json.loads(series['EVOLINE'])
+    def __init__(self,
+                 idx: int,
+                 name: str,
+                 min_level: int, max_level: int,
+                 evoline: Sequence[int],
+                 types: Sequence[Type],
+                 hp: int,
+                 attack: int, defense: int,
+                 spatk: int, spdef: int,
+                 speed: int):
+        self._idx = idx
+        self._evoline = tuple(evoline)
 
-        super().__init__(name=series['NAME'],
-                         min_level=series['MIN_LEVEL'], max_level=series['MAX_LEVEL'],
-                         types=[Type[t] for t in json.loads(series['TYPES'])],
-                         hp=series['HP'],
-                         attack=series['ATK'], defense=series['DEF'],
-                         spatk=series['SPATK'], spdef=series['SPDEF'],
-                         speed=series['SPD'])
+        super().__init__(name=name,
+                         min_level=min_level, max_level=max_level,
+                         types=types,
+                         hp=hp,
+                         attack=attack, defense=defense,
+                         spatk=spatk, spdef=spdef,
+                         speed=speed)
+
+    @property
+    def idx(self) -> int:
+        """
+        The pokedex ID of this Pokemon.
+        """
+        return self._idx
 
     @property
     def evoline(self) -> List[Pokemon]:
         """
-        List containing the IDs of all the Pokemon in this evolution line.
+        List containing all the Pokemon in this evolution line (sorted by min_level, see pokedex.get_evoline).
         """
-        return [pokedex.get_pokemon(idx) for idx in self._evoline]
+        return list(pokedex.get_evoline(self._evoline[0]).members)
 
     @property
-    def raw_evoline(self) -> List[int]:
+    def raw_evoline(self) -> Tuple[int, ...]:
         """
-        List containing the IDs of all the Pokemon in this evolution line.
+        Tuple containing the IDs of all the Pokemon in this evolution line.
         """
         return self._evoline
 
     def get_sprite_url(self) -> str:
-        return f"https://img.pokemondb.net/sprites/black-white/normal/{self.name}.png"
+        return sprites.pokemon_sprite_url(self.name)
+
+    def __reduce__(self):
+        # Unpickled as the shared instance of the pokedex
+        return pokedex.get_pokemon, (self.idx,)
 
 
 class FusedPokemon(AbstractPokemon):
     """
     Utility class for Fused Pokemon data.
     Calculates typing and stats given a head and body pokemon.
+    Use memo.fuse to get one: fusions are built once and shared.
     """
 
+    __slots__ = ('_head', '_body', '_head_id', '_body_id', '_sprite_url', '_tooltip')
+
     def __init__(self, head: Pokemon, body: Pokemon):
+        self._head = head.name
+        self._body = body.name
+        self._head_id = head.idx
+        self._body_id = body.idx
+        self._sprite_url = sprites.fusion_sprite_url(head.idx, body.idx)
+        # Built the first time it's needed (see tooltip)
+        self._tooltip = None
+
         super().__init__(name=head.name+"/"+body.name,
                          min_level=max(head.min_level, body.min_level),
                          max_level=min(head.max_level, body.max_level),
@@ -154,14 +206,12 @@ class FusedPokemon(AbstractPokemon):
                                 body.types[1]
                                 if len(body.types) > 1 and body.types[1] != head.types[0]
                                 else body.types[0]],
-                         hp=int((body.hp + head.hp*2)/3),
-                         attack=int((body.attack*2 + head.attack)/3),
-                         defense=int((body.defense * 2 + head.defense) / 3),
-                         spatk=int((body.special_attack + head.special_attack * 2) / 3),
-                         spdef=int((body.special_defense + head.special_defense * 2) / 3),
-                         speed=int((body.speed*2 + head.speed)/3))
-        self._head = head.name
-        self._body = body.name
+                         hp=fuse_head_stat(head.hp, body.hp),
+                         attack=fuse_body_stat(head.attack, body.attack),
+                         defense=fuse_body_stat(head.defense, body.defense),
+                         spatk=fuse_head_stat(head.special_attack, body.special_attack),
+                         spdef=fuse_head_stat(head.special_defense, body.special_defense),
+                         speed=fuse_body_stat(head.speed, body.speed))
 
     @property
     def head(self):
@@ -171,9 +221,59 @@ class FusedPokemon(AbstractPokemon):
     def body(self):
         return self._body
 
+    @property
+    def head_id(self) -> int:
+        return self._head_id
+
+    @property
+    def body_id(self) -> int:
+        return self._body_id
+
     def get_sprite_url(self):
-        from data import pokedex
-        head_id = pokedex.get_id_by_name(self.head)
-        body_id = pokedex.get_id_by_name(self.body)
-        return f"https://raw.githubusercontent.com/Aegide/custom-fusion-sprites/" \
-               f"main/CustomBattlers/{head_id}.{body_id}.png"
+        return self._sprite_url
+
+    @property
+    def tooltip(self) -> str:
+        """
+        The HTML showing typing and stats of this fusion
+        """
+        if self._tooltip is None:
+            # The only attribute set after __init__: a cache, every thread would build the same HTML
+            object.__setattr__(self, '_tooltip', _tooltip_html(self))
+        return self._tooltip
+
+
+def _tooltip_html(fusion: FusedPokemon) -> str:
+    return (f'<h1 style="background-color:{fusion.types[0].value}; color: white;">'
+            f'  {fusion.types[0].name}'
+            f'</h1>'
+            + (f'<h1 style="background-color:{fusion.types[1].value};color: white;">'
+               f'   {fusion.types[1].name}'
+               f'</h1>' if fusion.types[1] != fusion.types[0] else '') +
+            f'<p>HP: {fusion.hp}</p>'
+            f'<p>ATK: {fusion.attack}</p>'
+            f'<p>DEF: {fusion.defense}</p>'
+            f'<p>SP.ATK: {fusion.special_attack}</p>'
+            f'<p>SP.DEF: {fusion.special_defense}</p>'
+            f'<p>SPEED: {fusion.speed}</p>'
+            f'<p>'
+            f'  TOTAL: {fusion.total}'
+            f'</p>')
+
+
+@functools.lru_cache(maxsize=None)
+def _slots(cls: Class[AbstractPokemon]) -> Tuple[str, ...]:
+    """
+    Returns the names of all the slots of cls (base classes first)
+    """
+    return tuple(slot for klass in reversed(cls.__mro__) for slot in klass.__dict__.get('__slots__', ()))
+
+
+def _restore(cls: Class[AbstractPokemon], values: Tuple) -> AbstractPokemon:
+    """
+    Rebuilds a pickled Pokemon from the values of its slots (see AbstractPokemon.__reduce__)
+    """
+    pokemon = object.__new__(cls)
+    for slot, value in zip(_slots(cls), values):
+        object.__setattr__(pokemon, slot, value)
+    return pokemon
@@ -0,0 +1,221 @@
+"""
+GUI-free searches over the precomputed fusion table
+(computed block by block instead, for pokedexes too big to have one: see fusion.has_table).
+"""
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from data import fusion, pokedex
+from data.enums import Type
+from data.pokemon import FusedPokemon, Pokemon
+from ifc import tracing
+
+""" Values accepted as sort_by """
+SORT_STATS = fusion.STATS + ('total',)
+
+
+class TypeSearchResult(NamedTuple):
+    """
+    A head evoline / body evoline pair found by search_by_type.
+    head and body are the first members of their evolines.
+    """
+    value: int
+    head: Pokemon
+    body: Pokemon
+
+
+def _evoline_positions(evoline_ids: List[int]) -> np.ndarray:
+    """
+    Returns an array mapping each pokedex ID to the position of its evoline inside evoline_ids (-1 if none)
+    """
+    positions = np.full(max(pokedex.get_ids()) + 1, -1, dtype=np.int32)
+    for position, evoline_id in enumerate(evoline_ids):
+        positions[list(pokedex.get_evoline_members(evoline_id))] = position
+    return positions
+
+
+def _members(evoline_ids: Iterable[int]) -> List[int]:
+    """
+    Returns the IDs of the members of the evolines
+    """
+    return [idx for evoline_id in evoline_ids for idx in pokedex.get_evoline_members(evoline_id)]
+
+
+def _top(values: np.ndarray, k: Optional[int]) -> np.ndarray:
+    """
+    Returns the indexes of the k highest values, highest first (ties by position).
+    Uses partial selection, so ranking costs O(len(values) + k log k).
+
+    :param values: The values to rank.
+    :param k: Number of indexes to return, all of them if None.
+    """
+    if k is None or k >= len(values):
+        candidates = np.arange(len(values))
+    elif k <= 0:
+        candidates = np.arange(0)
+    else:
+        # Take everything above the k-th highest value, then fill with ties (by position)
+        kth = np.partition(values, len(values) - k)[len(values) - k]
+        above = np.flatnonzero(values > kth)
+        tied = np.flatnonzero(values == kth)[:k - len(above)]
+        candidates = np.sort(np.concatenate([above, tied]))
+    return candidates[np.argsort(-values[candidates], kind='stable')]
+
+
+def _level_mask(table: fusion.FusionTable, min_level: Optional[int], max_level: Optional[int]) -> np.ndarray:
+    """
+    Returns a boolean mask of the fusions that exist (at least at one level) between min_level and max_level
+    """
+    mask = table.overlapping()
+    if min_level is not None:
+        mask &= table['max_level'] >= min_level
+    if max_level is not None:
+        mask &= table['min_level'] <= max_level
+    return mask
+
+
+def _type_mask(table: fusion.FusionTable, pokemon_type: Type) -> np.ndarray:
+    """
+    Returns a boolean mask of the fusions having pokemon_type (ANY matches every fusion)
+    """
+    if Type.is_any(pokemon_type):
+        return np.ones(len(table), dtype=bool)
+    code = fusion.type_code(pokemon_type)
+    return (table['type_1'] == code) | (table['type_2'] == code)
+
+
+def _candidate_pairs(type_a: Type, type_b: Type,
+                     based_on: Optional[Pokemon]) -> List[Tuple[Iterable[int], Iterable[int]]]:
+    """
+    Returns the (head evolines, body evolines) groups that can give a fusion typed type_a/type_b.
+    Heads give their primary type and bodies their secondary one,
+    if based_on is given its evoline is used for type_a.
+    """
+    if based_on is not None:
+        based_on_evoline = [based_on.raw_evoline[0]]
+        if len(based_on.types) > 1:
+            if based_on.types[0] == type_a:
+                type_a_heads, type_a_bodies = based_on_evoline, []
+            else:  # based_on.types[1] == type_a
+                type_a_heads, type_a_bodies = [], based_on_evoline
+        else:
+            type_a_heads, type_a_bodies = based_on_evoline, based_on_evoline
+    else:
+        type_a_heads = pokedex.get_evoline_ids_by_type(first_type=type_a)
+        type_a_bodies = pokedex.get_evoline_ids_by_type(second_type=type_a)
+
+    type_b_heads = pokedex.get_evoline_ids_by_type(first_type=type_b)
+    type_b_bodies = pokedex.get_evoline_ids_by_type(second_type=type_b)
+
+    pairs = [(type_a_heads, type_b_bodies), (type_b_heads, type_a_bodies)]
+    if based_on is not None and Type.is_any(type_b):
+        pairs += [(based_on_evoline, pokedex.get_evoline_ids_by_type(second_type=type_a)),
+                  (type_a_heads, based_on_evoline)]
+    return pairs
+
+
+@tracing.traced('search.search_by_type')
+def search_by_type(type_a: Type, type_b: Type,
+                   based_on: Pokemon = None,
+                   sort_by: str = 'total',
+                   k: int = None,
+                   min_level: int = None, max_level: int = None) -> List[TypeSearchResult]:
+    """
+    Finds the head evoline / body evoline pairs that can give a fusion
+    having both type_a and type_b (Type.ANY matches any type).
+
+    :param type_a: First requested type.
+    :param type_b: Second requested type.
+    :param based_on: If given, the evoline of this Pokemon must be part of every pair.
+    :param sort_by: Name of the stat used for ranking (one of SORT_STATS).
+    :param k: If given, only the best k pairs are returned.
+    :param min_level: If given, only fusions existing at this level or later are considered.
+    :param max_level: If given, only fusions existing at this level or before are considered.
+    :return: Deduplicated pairs, sorted by the best value of sort_by among the
+             fusions of the pair matching the requested types (highest first).
+    """
+    assert sort_by in SORT_STATS, f"Can't sort by '{sort_by}'"
+    candidates = _candidate_pairs(type_a, type_b, based_on)
+
+    # Only the evolines of the candidate pairs are indexed (in pokedex order, for the ties),
+    # so memory follows the size of the search rather than the square of the pokedex
+    evoline_ids = list(pokedex.get_evoline_ids_by_type())
+    candidate_heads = set().union(*(heads for heads, _ in candidates))
+    candidate_bodies = set().union(*(bodies for _, bodies in candidates))
+    head_evolines = [evoline_id for evoline_id in evoline_ids if evoline_id in candidate_heads]
+    body_evolines = [evoline_id for evoline_id in evoline_ids if evoline_id in candidate_bodies]
+    head_count, body_count = len(head_evolines), len(body_evolines)
+    head_positions = _evoline_positions(head_evolines)
+    body_positions = _evoline_positions(body_evolines)
+
+    # Evoline pairs that are worth checking, as a (head, body) boolean matrix.
+    # Its last row and column stay False: position -1 (not a candidate) points to them
+    allowed = np.zeros((head_count + 1, body_count + 1), dtype=bool)
+    for heads, bodies in candidates:
+        allowed[np.ix_(head_positions[np.fromiter(heads, dtype=np.int32)],
+                       body_positions[np.fromiter(bodies, dtype=np.int32)])] = True
+
+    best = np.full(head_count * body_count, -1, dtype=np.int32)
+    if fusion.has_table():
+        # Single pass over the complete table
+        tables = [fusion.get_table()]
+    else:
+        tables = fusion.compute_blocks(_members(head_evolines), _members(body_evolines))
+    for table in tables:
+        # Matching fusions that can exist...
+        table_heads = head_positions[table.head_id]
+        table_bodies = body_positions[table.body_id]
+        matching = _level_mask(table, min_level, max_level) \
+            & _type_mask(table, type_a) \
+            & _type_mask(table, type_b) \
+            & allowed[table_heads, table_bodies]
+
+        # ...then the best value of each evoline pair
+        keys = table_heads[matching].astype(np.int64) * body_count + table_bodies[matching]
+        np.maximum.at(best, keys, table[sort_by][matching])
+
+    found = np.flatnonzero(best >= 0)
+    # Highest value first, ties in pokedex order
+    found = found[_top(best[found], k)]
+
+    return [
+        TypeSearchResult(value=int(best[key]),
+                         head=pokedex.get_pokemon(head_evolines[key // body_count]),
+                         body=pokedex.get_pokemon(body_evolines[key % body_count]))
+        for key in found
+    ]
+
+
+@tracing.traced('search.top_fusions')
+def top_fusions(k: int,
+                sort_by: str = 'total',
+                type_a: Type = None, type_b: Type = None,
+                min_level: int = None, max_level: int = None,
+                species: Iterable[Pokemon] = None) -> List[FusedPokemon]:
+    """
+    Returns the best k fusions of the pokedex by the given stat.
+    Only the k returned fusions are built as FusedPokemon.
+
+    :param k: Number of fusions to return.
+    :param sort_by: Name of the stat used for ranking (one of SORT_STATS).
+    :param type_a: If given, fusions must have this type.
+    :param type_b: If given, fusions must have this type.
+    :param min_level: If given, fusions must exist at this level or later.
+    :param max_level: If given, fusions must exist at this level or before.
+    :param species: If given, either the head or the body of the fusions must be one of these.
+    :return: The fusions, highest value first (ties by head, then body, in pokedex order).
+    """
+    assert sort_by in SORT_STATS, f"Can't sort by '{sort_by}'"
+    table = fusion.get_table()
+
+    mask = _level_mask(table, min_level, max_level)
+    for pokemon_type in (type_a, type_b):
+        if pokemon_type is not None:
+            mask &= _type_mask(table, pokemon_type)
+    if species is not None:
+        ids = np.fromiter((pokemon.idx for pokemon in species), dtype=np.int32)
+        mask &= np.isin(table.head_id, ids) | np.isin(table.body_id, ids)
+
+    rows = np.flatnonzero(mask)
+    return table.to_fused_pokemons(rows[_top(table[sort_by][rows], k)])
@@ -0,0 +1,142 @@
+"""
+Level segments of evoline pairs.
+
+A segment is a pair of members (one from each evoline) whose level windows overlap:
+their fusion exists in game. Segments are found with a sweep over the level windows,
+so only the pairs that can actually be fused are ever looked at, and they are kept in a
+table of evoline pairs shared by every search (each pair is swept at most once).
+When the pokedex is reloaded, only the pairs of the evolines that changed are swept again.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from data import pokedex
+from ifc import tracing
+
+""" A level window: (min_level, max_level), both included """
+Interval = Tuple[int, int]
+""" The pokedex IDs of two fusable members, one of each evoline of a pair """
+Segment = Tuple[int, int]
+
+
+def sweep(intervals_a: Sequence[Interval], intervals_b: Sequence[Interval]) -> List[Tuple[int, int]]:
+    """
+    Returns the (i, j) index pairs of the overlapping intervals of intervals_a and intervals_b,
+    ordered by i, then by j.
+    Both sequences must be sorted by min_level: windows are swept in order of their start,
+    each one is paired with the windows of the other sequence that are still open, so the cost
+    is O(n + m + number of pairs) (windows of a sequence may overlap each other, e.g. branched evolutions).
+    Empty windows (min_level > max_level) overlap nothing.
+    """
+    pairs = []
+    # Windows started so far that may still overlap the next ones, for each sequence
+    open_a: List[int] = []
+    open_b: List[int] = []
+    i = j = 0
+    while i < len(intervals_a) or j < len(intervals_b):
+        # Take the window starting first (a first on ties, b then sees it as open)
+        if j == len(intervals_b) or (i < len(intervals_a) and intervals_a[i][0] <= intervals_b[j][0]):
+            start, end = intervals_a[i]
+            if start <= end:
+                open_b[:] = [k for k in open_b if intervals_b[k][1] >= start]
+                pairs += [(i, k) for k in open_b]
+                open_a.append(i)
+            i += 1
+        else:
+            start, end = intervals_b[j]
+            if start <= end:
+                open_a[:] = [k for k in open_a if intervals_a[k][1] >= start]
+                pairs += [(k, j) for k in open_a]
+                open_b.append(j)
+            j += 1
+    pairs.sort()
+    return pairs
+
+
+class SegmentTable:
+    """
+    The segments of the (head evoline, body evoline) pairs of the pokedex.
+    Members of each evoline are ordered by min_level (see pokedex.Evoline),
+    segments by head member, then by body member.
+    A pair is swept the first time it's requested: sweeping all the 40k pairs up front
+    would take half a second, while a search only needs a few of them.
+    Safe to use from multiple threads (a pair may just be swept twice).
+    """
+
+    @tracing.traced('SegmentTable.__init__')
+    def __init__(self):
+        # Evoline ID -> its members (sorted by min_level) and their level windows
+        self._members: Dict[int, Tuple[int, ...]] = dict()
+        self._intervals: Dict[int, Tuple[Interval, ...]] = dict()
+        for evoline_id in pokedex.get_evoline_ids_by_type():
+            evoline = pokedex.get_evoline(evoline_id)
+            self._members[evoline_id] = evoline.member_ids
+            self._intervals[evoline_id] = evoline.intervals
+
+        self._segments: Dict[Tuple[int, int], Tuple[Segment, ...]] = dict()
+
+    def _sweep(self, evoline_a: int, evoline_b: int) -> Tuple[Segment, ...]:
+        members_a, members_b = self._members[evoline_a], self._members[evoline_b]
+        return tuple((members_a[i], members_b[j])
+                     for i, j in sweep(self._intervals[evoline_a], self._intervals[evoline_b]))
+
+    def update(self, evoline_ids: Iterable[int]):
+        """
+        Reads the given evolines from the pokedex again (e.g. after it was reloaded, removed ones are dropped)
+        and forgets the segments of every pair involving them
+        """
+        evoline_ids = set(evoline_ids)
+        existing = pokedex.get_evoline_ids_by_type()
+        for evoline_id in evoline_ids:
+            if evoline_id in existing:
+                evoline = pokedex.get_evoline(evoline_id)
+                self._members[evoline_id] = evoline.member_ids
+                self._intervals[evoline_id] = evoline.intervals
+            else:
+                self._members.pop(evoline_id, None)
+                self._intervals.pop(evoline_id, None)
+        # A new dict, so that searches running in other threads never see it change size
+        self._segments = {pair: segments for pair, segments in list(self._segments.items())
+                          if pair[0] not in evoline_ids and pair[1] not in evoline_ids}
+
+    def get(self, evoline_a: int, evoline_b: int) -> Tuple[Segment, ...]:
+        """
+        Returns the (head ID, body ID) segments of a member of evoline_a and a member of evoline_b
+        """
+        segments = self._segments.get((evoline_a, evoline_b))
+        if segments is None:
+            segments = self._segments[evoline_a, evoline_b] = self._sweep(evoline_a, evoline_b)
+        return segments
+
+
+""" Guards the lazy initialization of _table (searches also run in background threads) """
+_lock = threading.Lock()
+
+_table: Optional[SegmentTable] = None
+
+
+def get_table() -> SegmentTable:
+    """
+    Returns the segment table of the pokedex (created at the first call)
+    """
+    global _table
+    with _lock:
+        if _table is None:
+            _table = SegmentTable()
+    return _table
+
+
+def _on_pokedex_changed(change: pokedex.DexChange):
+    with _lock:
+        if _table is not None:
+            _table.update(change.evolines)
+
+
+pokedex.add_listener(_on_pokedex_changed)
+
+
+def get_segments(evoline_a: int, evoline_b: int) -> Tuple[Segment, ...]:
+    """
+    Returns the (head ID, body ID) segments of evoline_a and evoline_b, see SegmentTable.get
+    """
+    return get_table().get(evoline_a, evoline_b)
@@ -0,0 +1,421 @@
+"""
+Sprite URLs resolution and on-disk sprite cache.
+Nothing in here depends on Qt: the GUI downloads sprites, this module decides
+which URL to try next and remembers what was downloaded.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from ifc import CACHE_PATH
+
+""" Base url of vanilla Pokemon sprites """
+POKEMON_SPRITES_URL: str = 'https://img.pokemondb.net/sprites/'
+""" Base url of the fusion sprites repositories """
+FUSION_SPRITES_URL: str = 'https://raw.githubusercontent.com/Aegide/'
+
+""" Default size cap of the sprite cache (bytes) """
+DEFAULT_MAX_BYTES: int = 200 * 1024 * 1024
+""" Default time (seconds) after which a cached sprite is revalidated with the server """
+DEFAULT_MAX_AGE: float = 7 * 24 * 60 * 60
+""" Default time (seconds) after which the resolved url of a sprite is forgotten """
+DEFAULT_MANIFEST_TTL: float = 7 * 24 * 60 * 60
+""" Default time (seconds) after which a sprite that could not be found is looked for again """
+DEFAULT_MISS_TTL: float = 24 * 60 * 60
+
+
+def pokemon_sprite_url(name: str) -> str:
+    """
+    Returns the first url to try for the sprite of a vanilla Pokemon
+    """
+    return f"{POKEMON_SPRITES_URL}black-white/normal/{name}.png"
+
+
+def fusion_sprite_url(head_id: int, body_id: int) -> str:
+    """
+    Returns the first url to try for the sprite of a fusion
+    """
+    return f"{FUSION_SPRITES_URL}custom-fusion-sprites/main/CustomBattlers/{head_id}.{body_id}.png"
+
+
+def fallback_chain(url: str) -> List[str]:
+    """
+    Returns url followed by all its alternatives, in the order they are tried
+    """
+    chain = [url]
+    while True:
+        next_url = next_fallback_url(chain[-1])
+        if next_url is None:
+            return chain
+        chain.append(next_url)
+
+
+def next_fallback_url(url: str) -> Optional[str]:
+    """
+    Returns the URL to try when url could not be downloaded, None if there are no alternatives left.
+    Vanilla sprites fall back from black-white to sun-moon sprites,
+    fusion sprites from main/CustomBattlers to master/Battlers, master/Battlers/<head_id>
+    and finally to the autogen-fusion-sprites repository.
+    """
+    if 'black-white' in url:
+        return url.replace('black-white', 'sun-moon')
+    if 'main/CustomBattlers' in url:
+        return url.replace('main/CustomBattlers', 'master/Battlers')
+    if re.search(r'master/Battlers/\d+.\d+\.png', url):
+        idx = url.split('/')[-1].split('.')[0]
+        return url.replace('master/Battlers/', f'master/Battlers/{idx}/')
+    if re.search(r'master/Battlers/\d+/\d+.\d+\.png', url) and 'custom' in url:
+        return url.replace('custom', 'autogen')
+    return None
+
+
+class CachedSprite(NamedTuple):
+    """
+    A sprite read from the cache.
+    'fresh' is False when the sprite should be revalidated with the server before being trusted.
+    """
+    data: bytes
+    fresh: bool
+
+
+class SpriteCache:
+    """
+    Content-addressed disk cache of downloaded sprites.
+
+    Sprites are stored once per content (named by their sha256) and an index maps
+    each URL to its content and HTTP validators (ETag/Last-Modified).
+    When the size cap is exceeded the least recently used URLs are evicted.
+    In offline mode cached sprites are always considered fresh.
+    """
+
+    """ Number of changes after which the index is written to disk """
+    FLUSH_EVERY: int = 50
+
+    def __init__(self, path: str,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: float = DEFAULT_MAX_AGE,
+                 offline: bool = False):
+        self._path = path
+        self._index_path = os.path.join(path, 'index.json')
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self.offline = offline
+
+        os.makedirs(os.path.join(path, 'blobs'), exist_ok=True)
+
+        # url -> {sha, size, etag, last_modified, validated}, least recently used first
+        self._entries: 'OrderedDict[str, dict]' = self._load_index()
+        # sha -> number of urls pointing to that content
+        self._refs: Dict[str, int] = dict()
+        self._size = 0
+        for entry in self._entries.values():
+            self._acquire(entry['sha'], entry['size'])
+        self._changes = 0
+        self._evict()
+
+    @property
+    def size(self) -> int:
+        """ Bytes currently used by cached sprites """
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._entries
+
+    def get(self, url: str) -> Optional[CachedSprite]:
+        """
+        Returns the cached sprite of url (marking it as recently used), None if it's not cached
+        """
+        entry = self._entries.get(url)
+        if entry is None:
+            return None
+        try:
+            with open(self._blob_path(entry['sha']), 'rb') as f:
+                data = f.read()
+        except OSError:
+            # Blob removed from outside the app, forget about it
+            self._remove(url)
+            return None
+
+        self._entries.move_to_end(url)
+        self._changed()
+        fresh = self.offline or time.time() - entry['validated'] < self._max_age
+        return CachedSprite(data=data, fresh=fresh)
+
+    def validators(self, url: str) -> Dict[str, str]:
+        """
+        Returns the headers needed to revalidate the cached sprite of url with a conditional request
+        """
+        entry = self._entries.get(url)
+        headers = dict()
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url: str, data: bytes, etag: str = None, last_modified: str = None) -> None:
+        """
+        Stores the sprite downloaded from url, evicting old sprites if the cache gets too big
+        """
+        sha = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(sha)
+        if not os.path.exists(blob_path):
+            tmp_path = f'{blob_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, blob_path)
+
+        # Acquire the new content before releasing the old one: they may be the same blob
+        self._acquire(sha, len(data))
+        self._remove(url)
+        self._entries[url] = {'sha': sha, 'size': len(data),
+                              'etag': etag, 'last_modified': last_modified,
+                              'validated': time.time()}
+        self._evict()
+        self._changed()
+
+    def revalidated(self, url: str) -> Optional[CachedSprite]:
+        """
+        To be called when the server confirmed (HTTP 304) that the cached sprite of url is still valid.
+        Returns the cached sprite.
+        """
+        entry = self._entries.get(url)
+        if entry is None:
+            return None
+        entry['validated'] = time.time()
+        return self.get(url)
+
+    def flush(self) -> None:
+        """
+        Writes the index to disk (if it changed)
+        """
+        if self._changes == 0:
+            return
+        tmp_path = f'{self._index_path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self._index_path)
+            self._changes = 0
+        except OSError as e:
+            logging.warning(f"Could not save sprite cache index: {e}")
+
+    def _load_index(self) -> 'OrderedDict[str, dict]':
+        try:
+            with open(self._index_path) as f:
+                entries = json.load(f, object_pairs_hook=OrderedDict)
+        except FileNotFoundError:
+            return OrderedDict()
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read sprite cache index, starting empty: {e}")
+            return OrderedDict()
+        return OrderedDict((url, entry) for url, entry in entries.items()
+                           if os.path.exists(self._blob_path(entry['sha'])))
+
+    def _blob_path(self, sha: str) -> str:
+        return os.path.join(self._path, 'blobs', f'{sha}.png')
+
+    def _acquire(self, sha: str, size: int) -> None:
+        if self._refs.get(sha, 0) == 0:
+            self._size += size
+        self._refs[sha] = self._refs.get(sha, 0) + 1
+
+    def _remove(self, url: str) -> None:
+        entry = self._entries.pop(url, None)
+        if entry is None:
+            return
+        sha = entry['sha']
+        self._refs[sha] -= 1
+        if self._refs[sha] == 0:
+            del self._refs[sha]
+            self._size -= entry['size']
+            try:
+                os.remove(self._blob_path(sha))
+            except OSError:
+                pass
+        self._changed()
+
+    def _evict(self) -> None:
+        while self._size > self._max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def _changed(self) -> None:
+        self._changes += 1
+        if self._changes >= self.FLUSH_EVERY:
+            self.flush()
+
+
+class SpriteManifest:
+    """
+    Persistent record of where each sprite was finally found.
+
+    For the first url of a fallback chain (e.g. the CustomBattlers url of a fusion)
+    it stores the url that actually worked, or that none of the chain did (a confirmed miss),
+    so later requests can skip the failing round trips.
+    Entries expire after a while, since sprites are added to the repositories over time.
+    """
+
+    """ Number of changes after which the manifest is written to disk """
+    FLUSH_EVERY: int = 50
+
+    def __init__(self, path: str,
+                 ttl: float = DEFAULT_MANIFEST_TTL,
+                 miss_ttl: float = DEFAULT_MISS_TTL):
+        self._path = path
+        self._ttl = ttl
+        self._miss_ttl = miss_ttl
+        # first url -> [resolved url (None for a miss), time of resolution]
+        self._entries: Dict[str, list] = self._load()
+        self._changes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def resolve(self, url: str) -> Optional[str]:
+        """
+        Returns the url where the sprite of url was found, None if unknown (or missing)
+        """
+        entry = self._valid_entry(url)
+        return entry[0] if entry is not None else None
+
+    def is_missing(self, url: str) -> bool:
+        """
+        Returns True if it's known that no url of the fallback chain of url has a sprite
+        """
+        entry = self._valid_entry(url)
+        return entry is not None and entry[0] is None
+
+    def record(self, url: str, resolved_url: Optional[str]) -> None:
+        """
+        Records that the sprite of url was found at resolved_url (None if it was not found at all)
+        """
+        entry = self._entries.get(url)
+        if entry is not None and entry[0] == resolved_url and time.time() - entry[1] < self._ttl / 2:
+            # Nothing new, avoid rewriting the manifest
+            return
+        self._entries[url] = [resolved_url, time.time()]
+        self._changed()
+
+    def import_listing(self, path: str, base_url: str = None) -> int:
+        """
+        Bulk imports the sprites available in a local listing of sprite files,
+        a text file with one file per line (e.g. the output of 'git ls-files' in a clone of a sprite repository).
+        When more urls of the same chain are available, the first one of the chain is recorded.
+        Raises ValueError if a line is not an url and there is no base_url.
+
+        :param path: Path of the listing file.
+        :param base_url: Prefix of the lines that are not full urls,
+                         e.g. 'https://raw.githubusercontent.com/Aegide/custom-fusion-sprites/main/'.
+        :return: The number of sprites recorded.
+        """
+        available = set()
+        with open(path) as f:
+            for line in f:
+                line = line.strip().replace('\\', '/')
+                if not line.endswith('.png'):
+                    continue
+                if not line.startswith(('http://', 'https://')):
+                    if base_url is None:
+                        raise ValueError(f"'{line}' is not an url, a base_url is needed")
+                    line = base_url.rstrip('/') + '/' + line.lstrip('/')
+                available.add(line)
+        return self._import(available)
+
+    def _import(self, available: Iterable[str]) -> int:
+        available = set(available)
+        starts = set()
+        for url in available:
+            match = re.search(r'(\d+)\.(\d+)\.png$', url)
+            if match:
+                starts.add(fusion_sprite_url(int(match.group(1)), int(match.group(2))))
+
+        now = time.time()
+        recorded = 0
+        for start in starts:
+            resolved = next((url for url in fallback_chain(start) if url in available), None)
+            if resolved is not None:
+                self._entries[start] = [resolved, now]
+                recorded += 1
+        self._changes += recorded
+        self.flush()
+        return recorded
+
+    def flush(self) -> None:
+        """
+        Writes the manifest to disk (if it changed)
+        """
+        if self._changes == 0:
+            return
+        tmp_path = f'{self._path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self._path)
+            self._changes = 0
+        except OSError as e:
+            logging.warning(f"Could not save sprite manifest: {e}")
+
+    def _load(self) -> Dict[str, list]:
+        try:
+            with open(self._path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return dict()
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read sprite manifest, starting empty: {e}")
+            return dict()
+
+    def _valid_entry(self, url: str) -> Optional[list]:
+        entry = self._entries.get(url)
+        if entry is None:
+            return None
+        ttl = self._ttl if entry[0] is not None else self._miss_ttl
+        if time.time() - entry[1] >= ttl:
+            del self._entries[url]
+            self._changed()
+            return None
+        return entry
+
+    def _changed(self) -> None:
+        self._changes += 1
+        if self._changes >= self.FLUSH_EVERY:
+            self.flush()
+
+
+_cache: Optional[SpriteCache] = None
+_manifest: Optional[SpriteManifest] = None
+
+
+def get_cache() -> SpriteCache:
+    """
+    Returns the app-wide sprite cache.
+    It can be configured with the environment variables
+    IFC_SPRITE_CACHE_MB (size cap in megabytes) and IFC_OFFLINE (1 to only use cached sprites).
+    """
+    global _cache
+    if _cache is None:
+        max_bytes = int(float(os.environ.get('IFC_SPRITE_CACHE_MB', DEFAULT_MAX_BYTES / 1024 / 1024))
+                        * 1024 * 1024)
+        offline = os.environ.get('IFC_OFFLINE', '0') not in ('', '0')
+        _cache = SpriteCache(os.path.join(CACHE_PATH, 'sprites'), max_bytes=max_bytes, offline=offline)
+    return _cache
+
+
+def get_manifest() -> SpriteManifest:
+    """
+    Returns the app-wide sprite manifest
+    """
+    global _manifest
+    if _manifest is None:
+        _manifest = SpriteManifest(os.path.join(CACHE_PATH, 'sprite_manifest.json'))
+    return _manifest
@@ -0,0 +1,270 @@
+"""
+Sprite loading telemetry: what every sprite really costs.
+The sprite service records each network round trip (latency, bytes, HTTP status)
+and how each sprite was finally obtained (memory or disk cache, network, and which
+fallback url worked), this module aggregates them into histograms and cache hit rates.
+
+The report is shown by the diagnostics dialog of the app (Ctrl+Shift+D),
+set IFC_TELEMETRY to a file path to also save it as JSON when the app is closed.
+"""
+import json
+import logging
+import os
+from collections import Counter, deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Sequence
+
+from data import sprites
+
+""" Upper bounds (milliseconds) of the latency histogram buckets, slower requests go in a last bucket """
+LATENCY_BUCKETS: Sequence[float] = (25, 50, 100, 250, 500, 1000, 2500, 5000)
+""" Upper bounds (bytes) of the response size histogram buckets, bigger responses go in a last bucket """
+SIZE_BUCKETS: Sequence[int] = (0, 1024, 2 * 1024, 4 * 1024, 8 * 1024, 16 * 1024, 64 * 1024)
+""" Number of most recent requests kept in detail (and used for the latency percentiles) """
+MAX_RECENT: int = 500
+
+""" How a sprite was obtained """
+MEMORY: str = 'memory'
+DISK: str = 'disk'
+NETWORK: str = 'network'
+REVALIDATED: str = 'revalidated'
+STALE: str = 'stale'
+NOT_FOUND: str = 'not found'
+""" The download failed for another reason than a missing sprite (e.g. the server can't be reached) """
+FAILED: str = 'failed'
+KNOWN_MISSING: str = 'known missing'
+CANCELLED: str = 'cancelled'
+
+
+class RequestRecord(NamedTuple):
+    """
+    A network round trip.
+    status is None when no HTTP response was received (error then tells why),
+    depth is the position of url in the fallback chain of its sprite (0 for the first url).
+    """
+    url: str
+    source: str
+    depth: int
+    status: Optional[int]
+    error: Optional[str]
+    latency_ms: float
+    bytes: int
+
+
+def sprite_source(url: str) -> str:
+    """
+    Returns which alternative of a fallback chain url is (see sprites.next_fallback_url)
+    """
+    if 'autogen' in url:
+        return 'autogen'
+    if 'CustomBattlers' in url:
+        return 'CustomBattlers'
+    if 'Battlers' in url:
+        # master/Battlers/<head_id>.<body_id>.png or master/Battlers/<head_id>/<head_id>.<body_id>.png
+        return 'Battlers/<head>' if url.split('/')[-2].isdigit() else 'Battlers'
+    for source in ('black-white', 'sun-moon'):
+        if source in url:
+            return source
+    return 'other'
+
+
+def fallback_depth(chain_start: str, url: str) -> int:
+    """
+    Returns the position of url in the fallback chain starting at chain_start, 0 if it's not part of it
+    """
+    chain = sprites.fallback_chain(chain_start)
+    return chain.index(url) if url in chain else 0
+
+
+def _rate(hits: int, misses: int) -> Optional[float]:
+    return round(hits / (hits + misses), 3) if hits + misses else None
+
+
+def _percentile(values: List[float], percent: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * percent / 100))], 1)
+
+
+class SpriteTelemetry:
+    """
+    Counters and histograms of the sprite loading, fed by the sprite service
+    """
+
+    def __init__(self, max_recent: int = MAX_RECENT):
+        self.reset(max_recent)
+
+    def reset(self, max_recent: int = None):
+        """
+        Forgets everything recorded so far
+        """
+        max_recent = max_recent if max_recent is not None else self._recent.maxlen
+        self._recent: Deque[RequestRecord] = deque(maxlen=max_recent)
+        self._requests = 0
+        self._bytes = 0
+        self._latency_ms = 0.0
+        self._latency_counts = Counter()
+        self._size_counts = Counter()
+        self._statuses = Counter()
+        self._request_sources = Counter()
+        # Cache lookups: cache -> Counter of 'hits'/'misses' (and 'stale' for the disk cache)
+        self._lookups: Dict[str, Counter] = {MEMORY: Counter(), DISK: Counter(), 'manifest': Counter()}
+        # How sprites were obtained, which url of their chain worked and after how many round trips
+        self._outcomes = Counter()
+        self._sources = Counter()
+        self._depths = Counter()
+        self._round_trips = Counter()
+        # Chain start -> round trips made so far, for the sprites being loaded
+        self._pending: Dict[str, int] = dict()
+        self._coalesced = 0
+
+    def record_lookup(self, cache: str, result: str):
+        """
+        Records a cache lookup
+
+        :param cache: MEMORY, DISK or 'manifest'.
+        :param result: 'hits', 'misses' (or 'stale', for the disk cache).
+        """
+        self._lookups[cache][result] += 1
+
+    def record_coalesced(self):
+        """
+        Records a download that was not started because the same url was already being downloaded
+        """
+        self._coalesced += 1
+
+    def record_request(self, url: str, chain_start: str, status: Optional[int], error: Optional[str],
+                       latency_ms: float, size: int):
+        """
+        Records a network round trip made for the sprite requested as chain_start
+        """
+        record = RequestRecord(url=url, source=sprite_source(url), depth=fallback_depth(chain_start, url),
+                               status=status, error=error, latency_ms=round(latency_ms, 1), bytes=size)
+        self._recent.append(record)
+        self._requests += 1
+        self._bytes += size
+        self._latency_ms += latency_ms
+        self._latency_counts[self._bucket(latency_ms, LATENCY_BUCKETS)] += 1
+        self._size_counts[self._bucket(size, SIZE_BUCKETS)] += 1
+        self._statuses[str(status) if status is not None else error or 'no response'] += 1
+        self._request_sources[record.source] += 1
+        self._pending[chain_start] = self._pending.get(chain_start, 0) + 1
+
+    def record_sprite(self, chain_start: str, url: Optional[str], outcome: str):
+        """
+        Records how the sprite requested as chain_start was finally obtained
+
+        :param url: The url that worked, None if the sprite could not be found.
+        :param outcome: MEMORY, DISK, NETWORK, REVALIDATED, STALE, NOT_FOUND, FAILED, KNOWN_MISSING or CANCELLED.
+        """
+        self._outcomes[outcome] += 1
+        round_trips = self._pending.pop(chain_start, 0)
+        if outcome == CANCELLED:
+            return
+        self._round_trips[round_trips] += 1
+        if url is not None:
+            self._sources[sprite_source(url)] += 1
+            self._depths[fallback_depth(chain_start, url)] += 1
+
+    @staticmethod
+    def _bucket(value: float, bounds: Sequence[float]) -> int:
+        return next((i for i, bound in enumerate(bounds) if value <= bound), len(bounds))
+
+    @staticmethod
+    def _histogram(counts: Counter, bounds: Sequence[float], unit: str) -> Dict[str, int]:
+        labels = [f'<={bound}{unit}' for bound in bounds] + [f'>{bounds[-1]}{unit}']
+        return {label: counts[i] for i, label in enumerate(labels)}
+
+    def report(self) -> Dict:
+        """
+        Returns everything recorded so far as a JSON-serializable dict
+        """
+        latencies = [record.latency_ms for record in self._recent]
+        sprites_count = sum(self._round_trips.values())
+        return {
+            'requests': {
+                'count': self._requests,
+                'bytes': self._bytes,
+                'mean_latency_ms': round(self._latency_ms / self._requests, 1) if self._requests else None,
+                'p50_latency_ms': _percentile(latencies, 50),
+                'p95_latency_ms': _percentile(latencies, 95),
+                'latency_histogram': self._histogram(self._latency_counts, LATENCY_BUCKETS, 'ms'),
+                'size_histogram': self._histogram(self._size_counts, SIZE_BUCKETS, 'B'),
+                'statuses': dict(self._statuses),
+                'sources': dict(self._request_sources),
+                'coalesced': self._coalesced,
+            },
+            'caches': {
+                cache: {**counts, 'hit_rate': _rate(counts['hits'], sum(counts.values()) - counts['hits'])}
+                for cache, counts in self._lookups.items()
+            },
+            'sprites': {
+                'count': sprites_count,
+                'mean_round_trips': round(sum(n * count for n, count in self._round_trips.items())
+                                          / sprites_count, 2) if sprites_count else None,
+                'round_trips': {str(n): count for n, count in sorted(self._round_trips.items())},
+                'outcomes': dict(self._outcomes),
+                'sources': dict(self._sources),
+                'fallback_depths': {str(depth): count for depth, count in sorted(self._depths.items())},
+            },
+            'recent_requests': [record._asdict() for record in self._recent],
+        }
+
+    def dump(self, path: str) -> None:
+        """
+        Saves the report as JSON
+        """
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def format_report(report: Dict) -> str:
+    """
+    Returns a readable summary of a report (without the detail of the recent requests)
+    """
+    requests = report['requests']
+    lines = [f"Requests: {requests['count']}, {requests['bytes'] / 1024:.1f}KB, "
+             f"latency mean {requests['mean_latency_ms']}ms, "
+             f"p50 {requests['p50_latency_ms']}ms, p95 {requests['p95_latency_ms']}ms, "
+             f"{requests['coalesced']} coalesced"]
+    for title, counts in (('Latency', requests['latency_histogram']), ('Size', requests['size_histogram']),
+                          ('HTTP status', requests['statuses']), ('Requested', requests['sources'])):
+        lines.append(f"  {title + ':':<13} " + ', '.join(f"{key} {count}" for key, count in counts.items()))
+
+    lines.append("Caches:")
+    for cache, counts in report['caches'].items():
+        rate = f"{counts['hit_rate']:.0%}" if counts['hit_rate'] is not None else '-'
+        details = ', '.join(f"{key} {count}" for key, count in counts.items() if key != 'hit_rate')
+        lines.append(f"  {cache + ':':<13} hit rate {rate} ({details or 'no lookups'})")
+
+    loaded = report['sprites']
+    lines.append(f"Sprites: {loaded['count']}, {loaded['mean_round_trips']} round trips per sprite")
+    for title, counts in (('Round trips', loaded['round_trips']), ('Obtained', loaded['outcomes']),
+                          ('Found in', loaded['sources']), ('Fallbacks', loaded['fallback_depths'])):
+        lines.append(f"  {title + ':':<13} " + ', '.join(f"{key} {count}" for key, count in counts.items()))
+    return '\n'.join(lines)
+
+
+_telemetry: Optional[SpriteTelemetry] = None
+
+
+def get_telemetry() -> SpriteTelemetry:
+    """
+    Returns the app-wide sprite telemetry
+    """
+    global _telemetry
+    if _telemetry is None:
+        _telemetry = SpriteTelemetry()
+    return _telemetry
+
+
+def save_on_exit() -> None:
+    """
+    Saves the report to IFC_TELEMETRY, if it's set
+    """
+    path = os.environ.get('IFC_TELEMETRY')
+    if path:
+        try:
+            get_telemetry().dump(path)
+        except OSError as e:
+            logging.warning(f"Could not save the sprite telemetry to '{path}': {e}")
@@ -0,0 +1,77 @@
+"""
+Update check: compares the latest release on GitHub with the running version.
+Nothing in here depends on Qt or does network requests: the GUI downloads the release
+(asynchronously), this module parses it and remembers it, so GitHub is asked at most
+once every CHECK_INTERVAL seconds.
+"""
+import json
+import logging
+import os
+import time
+from typing import Optional, Tuple
+
+from data import utils
+from ifc import CACHE_PATH
+
+""" GitHub API endpoint describing the latest release of the app """
+LATEST_RELEASE_URL: str = "https://api.github.com/repos/vittoema96/InfiniteFusionCalculator/releases/latest"
+""" Time (seconds) the latest release is remembered before asking GitHub again """
+CHECK_INTERVAL: float = 24 * 60 * 60
+""" Time (milliseconds) after which the request to GitHub is abandoned """
+TIMEOUT_MS: int = 5000
+
+""" File where the latest release is remembered """
+RELEASE_CACHE_PATH: str = os.path.join(CACHE_PATH, 'latest_release.json')
+
+
+def parse_version(version: str) -> Tuple[int, int, int]:
+    """
+    Returns (major, minor, patch) of a version like '0.3' or 'v0.3.1' (missing parts are 0)
+    """
+    parts = [int(p) for p in version.strip().lstrip('vV').split('.')]
+    parts += [0] * (3 - len(parts))
+    return parts[0], parts[1], parts[2]
+
+
+def is_newer(version: str) -> bool:
+    """
+    Returns True if version is more recent than the running one
+    """
+    return parse_version(version) > (utils.MAJOR, utils.MINOR, utils.PATCH)
+
+
+def parse_release(payload: bytes) -> str:
+    """
+    Returns the version of the release described by a response of LATEST_RELEASE_URL
+    """
+    version = json.loads(payload)['name']
+    parse_version(version)  # fail now if the name is not a version
+    return version
+
+
+def get_cached_release(path: str = RELEASE_CACHE_PATH, max_age: float = CHECK_INTERVAL) -> Optional[str]:
+    """
+    Returns the latest release version saved by save_release, None if missing or older than max_age
+    """
+    try:
+        with open(path, 'r') as f:
+            cached = json.load(f)
+        if time.time() - cached['checked'] < max_age:
+            return cached['version']
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logging.warning(f"Could not read '{path}', ignoring it: {e}")
+    return None
+
+
+def save_release(version: str, path: str = RELEASE_CACHE_PATH) -> None:
+    """
+    Remembers the latest release version (see get_cached_release)
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'version': version, 'checked': time.time()}, f)
+    except OSError as e:
+        logging.warning(f"Could not save the latest release to '{path}': {e}")
@@ -1,11 +1,14 @@
 import os
-from typing import Tuple, List, Optional
+from itertools import combinations
+from typing import Tuple, List, Optional, Iterable, TYPE_CHECKING
 
-from PyQt6.QtGui import QFontDatabase, QFont
-
-from data.pokedex import get_evolution_list
+from data import memo, segments
+from data.pokedex import get_pokemon
 from data.pokemon import FusedPokemon
-from ifc import FONTS_PATH
+from ifc import FONTS_PATH, tracing
+
+if TYPE_CHECKING:
+    from PyQt6.QtGui import QFont
 
 """ Short name for the app"""
 SHORTNAME: str = "IFC"
@@ -27,10 +30,14 @@ MARGIN: int = 10
 TITLE: str = SHORTNAME + ' - ' + NAME + ' v' + VERSION
 
 
+@tracing.traced('utils.get_font', tracing.GUI)
 def get_font(font_size: int = 12,
              bold: bool = False,
              italic: bool = False,
-             underline: bool = False) -> QFont:
+             underline: bool = False) -> 'QFont':
+    # Imported here so that the data package can be used without PyQt (e.g. by the cli)
+    from PyQt6.QtGui import QFontDatabase, QFont
+
     font_id = QFontDatabase.addApplicationFont(os.path.join(FONTS_PATH, "pokemon_pixel_font.ttf"))
     assert font_id >= 0, 'Could not find font'
     font_name = QFontDatabase.applicationFontFamilies(font_id)[0]
@@ -42,6 +49,25 @@ def get_font(font_size: int = 12,
     return qfont
 
 
+def get_fusion_ids(name1: str, name2: str) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """
+    Returns the (head ID, body ID) pairs of the fusions returned by get_fusions, in the same order,
+    without building the fusions (IDs are cheap to send between processes, see data.parallel)
+    """
+    pokemon1 = get_pokemon(name=name1)
+    pokemon2 = get_pokemon(name=name2)
+
+    ids_ab = []
+    ids_ba = []
+    for head_id, body_id in segments.get_segments(pokemon1.raw_evoline[0], pokemon2.raw_evoline[0]):
+        ids_ab.append((head_id, body_id))
+        if head_id != body_id:
+            ids_ba.append((body_id, head_id))
+
+    return ids_ab, ids_ba
+
+
+@tracing.traced('utils.get_fusions')
 def get_fusions(name1: str, name2: str) -> \
         Tuple[
             List[FusedPokemon],
@@ -54,18 +80,49 @@ def get_fusions(name1: str, name2: str) -> \
     List 2 has fusions with head <pokemon from evoline of pkmn2>
     and body <pokemon from evoline of pkmn1>
     """
-    l1 = get_evolution_list(name1)
-    l2 = get_evolution_list(name2)
+    pokemon1 = get_pokemon(name=name1)
+    pokemon2 = get_pokemon(name=name2)
 
+    # Only the members whose level windows overlap can be fused, see segments.sweep
     result_ab = []
     result_ba = []
-    for i, a in enumerate(l1):
-        for b in l2:
-            fusion_ab = FusedPokemon(a, b)
-            fusion_ba = FusedPokemon(b, a)
-            if fusion_ab.max_level - fusion_ba.min_level >= 0:
-                result_ab.append(fusion_ab)
-                if a.name != b.name:
-                    result_ba.append(fusion_ba)
+    for head_id, body_id in segments.get_segments(pokemon1.raw_evoline[0], pokemon2.raw_evoline[0]):
+        head, body = get_pokemon(head_id), get_pokemon(body_id)
+        result_ab.append(memo.fuse(head, body))
+        if head_id != body_id:
+            result_ba.append(memo.fuse(body, head))
 
     return result_ab, result_ba
+
+
+def get_evolines(pkmn1: str, pkmn2: str, display_ab: bool = True, display_ba: bool = True) \
+        -> List[List[FusedPokemon]]:
+    """
+    Returns the fusion evolines of pkmn1 and pkmn2 (the ab one and/or the ba one, see get_fusions),
+    skipping empty ones
+    """
+    fusions_ab, fusions_ba = get_fusions(pkmn1, pkmn2)
+
+    evolines = []
+    # Add ab and ba fusions separately only if they are enabled
+    if display_ab:
+        evolines.append(fusions_ab)
+    if display_ba:
+        evolines.append(fusions_ba)
+    return [evoline for evoline in evolines if len(evoline) > 0]
+
+
+def get_batch_pairs(names: Iterable[str]) -> List[Tuple[str, str]]:
+    """
+    Returns the pairs of Pokemon fused by the Batch mode:
+    every combination of 2 different names, plus (name, name) for the names appearing more than once.
+    Pairs follow the order of names.
+    """
+    names = list(names)
+
+    # extract duplicates and keep unique elements (in order)
+    duplicates = [name for name in dict.fromkeys(names) if names.count(name) > 1]
+    unique = list(dict.fromkeys(names))
+
+    # all combinations of 2 pokemons, plus the duplicates fused with themselves
+    return list(combinations(unique, 2)) + [(duplicate, duplicate) for duplicate in duplicates]
@@ -0,0 +1,80 @@
+"""
+Reloads the pokedex while the app runs, every time its csv is edited.
+"""
+import logging
+import os
+from typing import Optional, Tuple
+
+from PyQt6.QtCore import QFileSystemWatcher, QObject, QTimer, pyqtSignal
+
+from data import pokedex
+
+""" Time (milliseconds) waited after the last change of the file before reloading it """
+DEBOUNCE_MS: int = 300
+
+
+class DexWatcher(QObject):
+    """
+    Watches the pokedex csv (see pokedex.get_data_path) and reloads it when it changes (see pokedex.load),
+    changed is emitted with the DexChange of every reload that changed something.
+
+    Editors save a file in several writes, or by replacing it with a new one (which QFileSystemWatcher
+    stops watching): the folder is watched too, and the csv is only reloaded once it has been
+    left alone for DEBOUNCE_MS. An invalid csv (e.g. a half-typed edit) is reported and
+    the current pokedex is kept, until the next change.
+    """
+
+    changed = pyqtSignal(object)
+
+    def __init__(self, parent: QObject = None):
+        super().__init__(parent)
+        self._path = os.path.abspath(pokedex.get_data_path())
+        self._last_stat = self._stat()
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(DEBOUNCE_MS)
+        self._timer.timeout.connect(self.reload)
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self._on_event)
+        self._watcher.directoryChanged.connect(self._on_event)
+        self._watcher.addPath(os.path.dirname(self._path))
+        self._watch_file()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        """ Returns modification time and size of the csv, None if it does not exist """
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _watch_file(self):
+        if self._path not in self._watcher.files() and os.path.exists(self._path):
+            self._watcher.addPath(self._path)
+
+    def _on_event(self, _path: str):
+        # A replaced file is not watched anymore: watch the new one
+        self._watch_file()
+        # Other files of the folder (e.g. the cached fusions) do not matter
+        if self._stat() != self._last_stat:
+            self._timer.start()
+
+    def reload(self):
+        """
+        Reloads the pokedex if its csv changed since the last (re)load
+        """
+        stat = self._stat()
+        if stat is None or stat == self._last_stat:
+            return
+        self._last_stat = stat
+        try:
+            change = pokedex.load()
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not reload the pokedex from '{self._path}', keeping the current one: {e}")
+            return
+        if change:
+            logging.info(f"Pokedex reloaded: {len(change.added)} species added, {len(change.removed)} removed, "
+                         f"{len(change.changed)} changed")
+            self.changed.emit(change)
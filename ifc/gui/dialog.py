@@ -1,7 +1,9 @@
-from PyQt6.QtWidgets import QDialog, QDialogButtonBox, QVBoxLayout, QLabel
+from PyQt6.QtGui import QFontDatabase
+from PyQt6.QtWidgets import QDialog, QDialogButtonBox, QVBoxLayout, QLabel, QPlainTextEdit, QFileDialog
+import logging
 import webbrowser
 
-from data import utils
+from data import memo, utils, telemetry
 
 
 class ConnectionErrorDialog(QDialog):
@@ -50,4 +52,55 @@ class UpdateDialog(QDialog):
         self.setLayout(self.layout)
 
     def go_to_github(self):
-        webbrowser.open('https://github.com/vittoema96/InfiniteFusionCalculator#exe')
\ No newline at end of file
+        webbrowser.open('https://github.com/vittoema96/InfiniteFusionCalculator#exe')
+
+
+class DiagnosticsDialog(QDialog):
+    """
+    Hidden dialog (Ctrl+Shift+D) showing the sprite loading telemetry:
+    round trips, latencies, sizes, HTTP statuses, fallbacks and cache hit rates
+    (and the statistics of the fusion memo)
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.setWindowTitle("Diagnostics")
+        self.resize(900, 450)
+
+        self.report = QPlainTextEdit()
+        self.report.setReadOnly(True)
+        self.report.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.report.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+
+        buttons = QDialogButtonBox.StandardButton.Save | QDialogButtonBox.StandardButton.Reset \
+            | QDialogButtonBox.StandardButton.Close
+        self.buttonBox = QDialogButtonBox(buttons)
+        self.buttonBox.addButton("Refresh", QDialogButtonBox.ButtonRole.ActionRole).clicked.connect(self.refresh)
+        self.buttonBox.button(QDialogButtonBox.StandardButton.Save).clicked.connect(self.save)
+        self.buttonBox.button(QDialogButtonBox.StandardButton.Reset).clicked.connect(self.reset)
+        self.buttonBox.rejected.connect(self.reject)
+
+        self.layout = QVBoxLayout()
+        self.layout.addWidget(self.report)
+        self.layout.addWidget(self.buttonBox)
+        self.setLayout(self.layout)
+
+        self.refresh()
+
+    def refresh(self):
+        stats = memo.get_memo().stats()
+        self.report.setPlainText(telemetry.format_report(telemetry.get_telemetry().report())
+                                 + '\nFusion memo: ' + ', '.join(f"{key} {value}" for key, value in stats.items()))
+
+    def reset(self):
+        telemetry.get_telemetry().reset()
+        self.refresh()
+
+    def save(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save the telemetry", 'sprite_telemetry.json', "JSON (*.json)")
+        if not path:
+            return
+        try:
+            telemetry.get_telemetry().dump(path)
+        except OSError as e:
+            logging.warning(f"Could not save the sprite telemetry to '{path}': {e}")
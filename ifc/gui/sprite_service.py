@@ -0,0 +1,437 @@
+"""
+App-wide sprite service: downloads sprites once and shares them between all the tabs.
+"""
+import heapq
+import itertools
+import logging
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple, Union
+
+from PyQt6 import sip
+from PyQt6.QtCore import QObject, QUrl
+from PyQt6.QtGui import QPixmap
+from PyQt6.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply
+from PyQt6.QtWidgets import QLabel
+
+from data import utils, sprites, telemetry
+from ifc import tracing
+
+""" Where a downloaded image goes: a label, or a function receiving the pixmap """
+ImageTarget = Union[QLabel, Callable[[QPixmap], None]]
+
+""" Default size cap (bytes) of the decoded sprites kept in memory """
+DEFAULT_MAX_PIXMAP_BYTES: int = 64 * 1024 * 1024
+""" Default maximum number of sprites downloaded at the same time """
+DEFAULT_MAX_CONCURRENT: int = 6
+
+""" Errors telling that a sprite is not at its url: only these move on to the next url of the fallback chain """
+NOT_FOUND_ERRORS = (QNetworkReply.NetworkError.ContentNotFoundError, QNetworkReply.NetworkError.ContentGoneError)
+
+""" Priority of sprites being displayed (lower priorities are downloaded first) """
+PRIORITY_VISIBLE: int = 0
+""" Priority of sprites that are likely to be displayed soon (e.g. the rows below the visible ones) """
+PRIORITY_PREFETCH: int = 1
+
+
+class SpriteRequest(NamedTuple):
+    """
+    A target waiting for a sprite.
+    Requests of a group are cancelled all at once by SpriteService.cancel_group,
+    generation is the one of the group when the request was made.
+    """
+    target: ImageTarget
+    priority: int
+    group: Optional[Hashable] = None
+    generation: int = 0
+
+
+class Url2LabelMap:
+    """
+    The requests waiting for each url
+    """
+
+    def __init__(self):
+        self._map: Dict[str, List[SpriteRequest]] = dict()
+
+    def put(self, url: str, request: SpriteRequest):
+        self._map.setdefault(url, []).append(request)
+
+    def pop(self, url: str) -> List[SpriteRequest]:
+        return self._map.pop(url, [])
+
+    def move(self, url: str, new_url: str):
+        """ Moves all the requests waiting for url to new_url """
+        for request in self.pop(url):
+            self.put(new_url, request)
+
+    def get(self, url: str) -> List[SpriteRequest]:
+        return self._map.get(url, [])
+
+    def keys(self):
+        return self._map.keys()
+
+    def remove_group(self, group: Hashable) -> List[str]:
+        """
+        Removes the requests of group, returns the urls nobody is waiting for anymore
+        """
+        emptied = []
+        for url in list(self._map.keys()):
+            requests = [request for request in self._map[url] if request.group != group]
+            if requests:
+                self._map[url] = requests
+            else:
+                del self._map[url]
+                emptied.append(url)
+        return emptied
+
+
+class PixmapCache:
+    """
+    In-memory LRU cache of decoded (and scaled) sprites, capped by bytes
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_PIXMAP_BYTES):
+        self._max_bytes = max_bytes
+        self._pixmaps: OrderedDict[str, QPixmap] = OrderedDict()
+        self._bytes = 0
+
+    @staticmethod
+    def size_of(pixmap: QPixmap) -> int:
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+    @property
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._pixmaps)
+
+    def get(self, url: str) -> Optional[QPixmap]:
+        pixmap = self._pixmaps.get(url)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(url)
+        return pixmap
+
+    def put(self, url: str, pixmap: QPixmap) -> None:
+        old = self._pixmaps.pop(url, None)
+        if old is not None:
+            self._bytes -= self.size_of(old)
+        self._pixmaps[url] = pixmap
+        self._bytes += self.size_of(pixmap)
+        # Evict the least recently used sprites (never the one just added)
+        while self._bytes > self._max_bytes and len(self._pixmaps) > 1:
+            _, evicted = self._pixmaps.popitem(last=False)
+            self._bytes -= self.size_of(evicted)
+
+
+class SpriteService(QObject):
+    """
+    Loads sprites for every tab, using a single QNetworkAccessManager.
+    Decoded sprites are kept in a PixmapCache, sprites are downloaded only if they are
+    not in the on-disk cache (see data.sprites), and requests for a sprite that is already
+    being looked for (at any url of its fallback chain) wait for it instead of starting another chain.
+
+    Downloads are queued by priority (then most recent first, e.g. the rows the user just scrolled to)
+    and at most max_concurrent of them run at the same time.
+    Requests can belong to a group (e.g. the results of a tab): cancelling the group
+    drops its queued downloads and aborts the ones nobody else is waiting for.
+    """
+
+    def __init__(self,
+                 max_pixmap_bytes: int = DEFAULT_MAX_PIXMAP_BYTES,
+                 max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+                 parent=None):
+        super().__init__(parent)
+        self.nam = QNetworkAccessManager(self)
+        self.pixmaps = PixmapCache(max_pixmap_bytes)
+        self.max_concurrent = max_concurrent
+        # Requests waiting for each url
+        self._waiting = Url2LabelMap()
+        # Url being downloaded -> first url of its fallback chain (if they differ)
+        self._chain_starts: Dict[str, str] = dict()
+        # First url of a fallback chain in progress -> url of the chain being tried
+        self._chain_urls: Dict[str, str] = dict()
+        # Downloads waiting for a free slot: heap of (priority, -sequence, url), and url -> its current heap key
+        self._queue: List[Tuple[int, int, str]] = []
+        self._queued: Dict[str, Tuple[int, int]] = dict()
+        self._sequence = itertools.count()
+        # Url -> its running download
+        self._replies: Dict[str, QNetworkReply] = dict()
+        # Current generation of each group
+        self._generations: Dict[Hashable, int] = dict()
+
+    @staticmethod
+    @tracing.traced('SpriteService.load_pixmap', tracing.GUI)
+    def load_pixmap(image: bytes) -> QPixmap:
+        """
+        Decodes an image and scales it to the sprite size
+        """
+        pixmap = QPixmap()
+
+        pixmap.loadFromData(image)
+
+        return pixmap.scaledToHeight(utils.SPRITE_SIZE)
+
+    def fetch(self, url: str, target: ImageTarget = None,
+              priority: int = PRIORITY_VISIBLE, group: Hashable = None):
+        """
+        Loads the image at url in target (and in every other target waiting for url).
+        target can also be a function, called with the loaded QPixmap.
+        If the sprite manifest knows where the image was found last time, that url is used directly,
+        images known to be missing are not requested at all.
+
+        :param url: The url of the image (the first of its fallback chain).
+        :param target: Where to show the image.
+        :param priority: Lower priorities are downloaded first (see PRIORITY_VISIBLE and PRIORITY_PREFETCH).
+        :param group: If given, the request is dropped when the group is cancelled (see cancel_group).
+        """
+        pixmap = self.pixmaps.get(url)
+        stats = telemetry.get_telemetry()
+        stats.record_lookup(telemetry.MEMORY, 'hits' if pixmap is not None else 'misses')
+        if pixmap is not None:
+            stats.record_sprite(url, url, telemetry.MEMORY)
+            if target is not None:
+                self._deliver(pixmap, [SpriteRequest(target, priority, group, self._generations.get(group, 0))])
+            return
+
+        request = SpriteRequest(target, priority, group, self._generations.get(group, 0))
+        current_url = self._chain_urls.get(url)
+        if current_url is not None:
+            # The chain of url is already in progress: wait for it
+            stats.record_coalesced()
+            if target is not None:
+                self._waiting.put(current_url, request)
+                if current_url in self._queued:
+                    # Moved up if the request has a better priority
+                    self._enqueue(current_url)
+            return
+
+        if target is not None:
+            self._waiting.put(url, request)
+
+        manifest = sprites.get_manifest()
+        if manifest.is_missing(url):
+            stats.record_lookup('manifest', 'hits')
+            stats.record_sprite(url, None, telemetry.KNOWN_MISSING)
+            self._waiting.pop(url)
+            return
+        resolved_url = manifest.resolve(url)
+        stats.record_lookup('manifest', 'hits' if resolved_url is not None else 'misses')
+        chain_start = url
+        if resolved_url is not None and resolved_url != url:
+            self._waiting.move(url, resolved_url)
+            self._chain_starts[resolved_url] = url
+            url = resolved_url
+
+        self._chain_urls[chain_start] = url
+        self._download(url)
+
+    def cancel_group(self, group: Hashable):
+        """
+        Cancels every request of group: its targets will never receive a sprite,
+        and downloads nobody else is waiting for are dropped (or aborted, if running).
+        """
+        self._generations[group] = self._generations.get(group, 0) + 1
+        for url in self._waiting.remove_group(group):
+            chain_start = self._chain_starts.pop(url, url)
+            self._chain_urls.pop(chain_start, None)
+            telemetry.get_telemetry().record_sprite(chain_start, None, telemetry.CANCELLED)
+            self._queued.pop(url, None)
+            reply = self._replies.get(url)
+            if reply is not None:
+                reply.abort()
+
+    def _download(self, url: str):
+        """
+        Downloads url, unless it's cached or already being downloaded.
+        Fresh cached images are used directly, stale ones are revalidated with a conditional request.
+        In offline mode only cached images are used.
+        """
+        stats = telemetry.get_telemetry()
+        if url in self._replies:
+            stats.record_coalesced()
+            return
+        cache = sprites.get_cache()
+        cached = cache.get(url)
+        stats.record_lookup(telemetry.DISK, 'misses' if cached is None else 'hits' if cached.fresh else 'stale')
+        if cached is not None and cached.fresh:
+            self._show_image(url, cached.data, telemetry.DISK)
+        elif cache.offline:
+            self._try_fallback(url)
+        else:
+            self._enqueue(url)
+
+    def _enqueue(self, url: str):
+        """
+        Queues the download of url with the priority of the best request waiting for it,
+        a url already in the queue is moved up if needed (and becomes the most recent one)
+        """
+        priority = min((request.priority for request in self._waiting.get(url)), default=PRIORITY_VISIBLE)
+        key = (priority, -next(self._sequence))
+        self._queued[url] = key
+        heapq.heappush(self._queue, (*key, url))
+        self._start_queued()
+
+    def _start_queued(self):
+        """
+        Starts queued downloads while there are free slots
+        """
+        while self._queue and len(self._replies) < self.max_concurrent:
+            priority, sequence, url = heapq.heappop(self._queue)
+            # Skip entries that were re-queued with a new key, or cancelled
+            if self._queued.get(url) != (priority, sequence):
+                continue
+            del self._queued[url]
+            if url in self._replies:
+                continue
+            if url not in self._waiting.keys():
+                # Nobody is waiting for its sprite anymore: the chain stops here
+                self._chain_urls.pop(self._chain_starts.pop(url, url), None)
+                continue
+            request = QNetworkRequest(QUrl(url))
+            for header, value in sprites.get_cache().validators(url).items():
+                request.setRawHeader(header.encode(), value.encode())
+            self._get(request)
+
+    def _get(self, request: QNetworkRequest):
+        start = tracing.now()
+        reply = self.nam.get(request)
+        self._replies[request.url().url()] = reply
+        reply.finished.connect(lambda: self._on_reply(reply, start))
+
+    @tracing.traced(category=tracing.GUI)
+    def _on_reply(self, reply: QNetworkReply, start: float):
+        """
+        Called when a download is finished.
+        Stores downloaded images in the sprite cache,
+        checks for failed download and tries all alternatives.
+        """
+        reply.deleteLater()
+        error = reply.error()
+        # Use the requested url, reply.url() may be the one of a redirect
+        url: str = reply.request().url().url()
+        if self._replies.get(url) is reply:
+            del self._replies[url]
+        status = reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute)
+        telemetry.get_telemetry().record_request(
+            url, self._chain_starts.get(url, url), status,
+            error=error.name if error != QNetworkReply.NetworkError.NoError else None,
+            latency_ms=(tracing.now() - start) / 1000, size=reply.bytesAvailable())
+        if tracing.is_enabled():
+            tracing.record('sprite download', tracing.NETWORK, start, url=url, error=error.name, status=status)
+        try:
+            self._handle_reply(url, reply, error)
+        finally:
+            self._start_queued()
+
+    def _handle_reply(self, url: str, reply: QNetworkReply, error: QNetworkReply.NetworkError):
+        if url not in self._waiting.keys():
+            # Cancelled
+            return
+        cache = sprites.get_cache()
+        if error == QNetworkReply.NetworkError.NoError:
+            status = reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute)
+            if status == 304:
+                cached = cache.revalidated(url)
+                if cached is None:
+                    # Evicted while waiting for the server: download it again, queued like any other download
+                    # (it has no validators anymore, see _start_queued)
+                    self._enqueue(url)
+                    return
+                image, outcome = cached.data, telemetry.REVALIDATED
+            else:
+                image = bytes(reply.readAll())
+                cache.put(url, image,
+                          etag=bytes(reply.rawHeader(b'ETag')).decode() or None,
+                          last_modified=bytes(reply.rawHeader(b'Last-Modified')).decode() or None)
+                outcome = telemetry.NETWORK
+            self._show_image(url, image, outcome)
+
+        else:
+            # A stale copy is better than nothing (e.g. the server can't be reached)
+            cached = cache.get(url)
+            if cached is not None:
+                self._show_image(url, cached.data, telemetry.STALE, resolved=False)
+            elif error in NOT_FOUND_ERRORS:
+                self._try_fallback(url)
+            else:
+                # The sprite may well be there: don't look elsewhere, and don't remember it as missing
+                self._fail(url, error)
+
+    def _show_image(self, url: str, image: bytes, outcome: str, resolved: bool = True):
+        """
+        Shows image in all the targets waiting for url, and keeps it in memory.
+        If resolved, url is recorded in the sprite manifest as the one that works for its fallback chain.
+
+        :param outcome: How the image was obtained (see data.telemetry).
+        """
+        chain_start = self._chain_starts.pop(url, url)
+        self._chain_urls.pop(chain_start, None)
+        telemetry.get_telemetry().record_sprite(chain_start, url, outcome)
+        if resolved:
+            sprites.get_manifest().record(chain_start, url)
+        pixmap = self.load_pixmap(image)
+        # Sprites are requested by the first url of their chain
+        self.pixmaps.put(chain_start, pixmap)
+        self._deliver(pixmap, self._waiting.pop(url))
+
+    def _deliver(self, pixmap: QPixmap, requests: List[SpriteRequest]):
+        for request in requests:
+            if request.group is not None and request.generation != self._generations.get(request.group, 0):
+                # The group was cancelled after the request was made
+                continue
+            target = request.target
+            if isinstance(target, QLabel):
+                # The label may have been destroyed (e.g. by clear_layout) while its sprite was loading
+                if not sip.isdeleted(target):
+                    target.setPixmap(pixmap)
+            else:
+                target(pixmap)
+
+    def _fail(self, url: str, error: QNetworkReply.NetworkError):
+        """
+        Drops the targets waiting for url, whose download failed (they get no sprite)
+        """
+        chain_start = self._chain_starts.pop(url, url)
+        logging.warning(f"Could not download '{url}' ({error.name})")
+        telemetry.get_telemetry().record_sprite(chain_start, None, telemetry.FAILED)
+        self._chain_urls.pop(chain_start, None)
+        self._waiting.pop(url)
+
+    def _try_fallback(self, url: str):
+        """
+        Moves the targets waiting for url to the next alternative url (if any) and fetches it
+        """
+        chain_start = self._chain_starts.pop(url, url)
+        next_url = sprites.next_fallback_url(url)
+        if next_url is None:
+            logging.warning(f"Could not find an alternative url for '{chain_start}'")
+            telemetry.get_telemetry().record_sprite(chain_start, None, telemetry.NOT_FOUND)
+            self._chain_urls.pop(chain_start, None)
+            self._waiting.pop(url)
+            # Offline a missing sprite may just be a sprite that was never downloaded
+            if not sprites.get_cache().offline:
+                sprites.get_manifest().record(chain_start, None)
+        else:
+            self._waiting.move(url, next_url)
+            self._chain_starts[next_url] = chain_start
+            self._chain_urls[chain_start] = next_url
+            self._download(next_url)
+
+
+_service: Optional[SpriteService] = None
+
+
+def get_sprite_service() -> SpriteService:
+    """
+    Returns the app-wide sprite service (it must be called after the QApplication is created).
+    The size of its in-memory cache can be configured with the environment variable
+    IFC_PIXMAP_CACHE_MB (size cap in megabytes).
+    """
+    global _service
+    if _service is None:
+        max_bytes = int(float(os.environ.get('IFC_PIXMAP_CACHE_MB', DEFAULT_MAX_PIXMAP_BYTES / 1024 / 1024))
+                        * 1024 * 1024)
+        _service = SpriteService(max_pixmap_bytes=max_bytes)
+    return _service
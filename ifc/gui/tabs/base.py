@@ -1,15 +1,18 @@
 import logging
-import re
-from typing import List
+from typing import Callable, Hashable, Iterable, List, Sequence, Tuple
 
-from PyQt6 import QtNetwork
-from PyQt6.QtCore import Qt, QByteArray, QUrl
-from PyQt6.QtGui import QPixmap, QPalette, QColor
-from PyQt6.QtWidgets import QWidget, QHBoxLayout, QVBoxLayout, QScrollArea, QLayout, QLabel
+from PyQt6.QtCore import Qt, QThreadPool
+from PyQt6.QtGui import QPalette, QColor
+from PyQt6.QtWidgets import QWidget, QHBoxLayout, QVBoxLayout, QScrollArea, QLayout, QLabel, QProgressBar, \
+    QPushButton, QComboBox
 
-from data import utils
-from gui.tabs import widgets
+from data import pokedex, utils
+from data.pokemon import FusedPokemon
+from gui.tabs.results import EvolineListModel, EvolineListView
 from gui.tabs.widgets import EvolineWidget
+from gui.tabs.workers import SearchWorker
+from gui.sprite_service import ImageTarget, get_sprite_service, PRIORITY_VISIBLE
+from ifc import tracing
 
 
 class IFCBaseTab(QWidget):
@@ -19,16 +22,16 @@ class IFCBaseTab(QWidget):
     and common methods.
     """
 
-    def __init__(self):
+    def __init__(self, result_view: bool = False):
+        """
+        :param result_view: If True, results are shown in a virtualized EvolineListView
+                            (meant for tabs that may show a lot of results) instead of output_layout.
+        """
         super().__init__()
 
         self.font = utils.get_font()
         self.bold_font = utils.get_font(bold=True)
 
-        # Manager used to load sprites quickly
-        self.nam = QtNetwork.QNetworkAccessManager()
-        self.nam.finished.connect(self.on_image_result)
-
         # Create and add the root panel of the tab
         self.layout = QHBoxLayout()
         self.layout.setAlignment(Qt.AlignmentFlag.AlignLeading)
@@ -40,6 +43,46 @@ class IFCBaseTab(QWidget):
         self.input_layout = QVBoxLayout()
         input_container.setLayout(self.input_layout)
 
+        self.layout.addWidget(input_container)
+
+        # Background search state (see start_search)
+        self._search_generation = 0
+        self._search_worker = None
+
+        if result_view:
+            self.output_layout = None
+            self.result_model = EvolineListModel(self)
+            self.result_model.sprite_requested.connect(
+                lambda url, priority: self.fetch_output_image(
+                    url, lambda pixmap: self.result_model.set_sprite(url, pixmap), priority))
+            self.result_view = EvolineListView(self.result_model)
+
+            # Progress of the running search, with a button to cancel it (hidden when idle)
+            self.progress_bar = QProgressBar()
+            self.progress_bar.setFont(self.font)
+            self.cancel_button = QPushButton("Cancel")
+            self.cancel_button.setFont(self.font)
+            self.cancel_button.pressed.connect(self.cancel_search)
+            self.progress_container = QWidget()
+            progress_layout = QHBoxLayout()
+            progress_layout.setContentsMargins(0, 0, 0, 0)
+            progress_layout.addWidget(self.progress_bar)
+            progress_layout.addWidget(self.cancel_button)
+            self.progress_container.setLayout(progress_layout)
+            self.progress_container.hide()
+
+            output_container = QWidget()
+            output_container.setFixedWidth(10 * utils.SPRITE_SIZE)
+            output_layout = QVBoxLayout()
+            output_layout.setContentsMargins(0, 0, 0, 0)
+            output_layout.addWidget(self.progress_container)
+            output_layout.addWidget(self.result_view)
+            output_container.setLayout(output_layout)
+            self.layout.addWidget(output_container)
+            return
+        self.result_model = None
+        self.result_view = None
+
         # Create a scroll area (so if too many outputs are added we can scroll)
         output_scroll = QScrollArea()
         # Create the output layout and add it to a QWidget (so we can set the size)
@@ -53,7 +96,6 @@ class IFCBaseTab(QWidget):
         output_scroll.setWidgetResizable(True)
         output_scroll.setWidget(output_container)
 
-        self.layout.addWidget(input_container)
         self.layout.addWidget(output_scroll)
 
     def set_info_message(self, message: str):
@@ -89,6 +131,28 @@ class IFCBaseTab(QWidget):
         self.input_layout.addLayout(self.info_box)
         self.input_layout.addStretch()
 
+    def on_pokedex_changed(self, change: pokedex.DexChange):
+        """
+        Called when the pokedex is reloaded (see DexWatcher): the running search is cancelled,
+        tabs listing Pokemon refresh their inputs
+        """
+        self.cancel_search()
+
+    @staticmethod
+    def set_combobox_items(cbox: QComboBox, items: List[str]):
+        """
+        Replaces the items of cbox, keeping the current one if it's still there (the first one otherwise).
+        currentTextChanged is emitted once at the end, even if the current text is the same:
+        the Pokemon it names may have changed.
+        """
+        current = cbox.currentText()
+        cbox.blockSignals(True)
+        cbox.clear()
+        cbox.addItems(items)
+        cbox.setCurrentIndex(max(0, cbox.findText(current, Qt.MatchFlag.MatchExactly)))
+        cbox.blockSignals(False)
+        cbox.currentTextChanged.emit(cbox.currentText())
+
     @staticmethod
     def clear_layout(layout: QLayout):
         """ Remove all child widgets from a layout """
@@ -100,86 +164,110 @@ class IFCBaseTab(QWidget):
                 elif child.layout() is not None:
                     IFCBaseTab.clear_layout(child.layout())
 
+    def clear_output(self):
+        """ Removes all the results shown by the tab (and cancels the sprites they are waiting for) """
+        get_sprite_service().cancel_group(self)
+        if self.result_model is not None:
+            self.result_model.clear()
+        else:
+            self.clear_layout(self.output_layout)
+
     @staticmethod
-    def set_pixmap(image: QByteArray, label: QLabel):
+    def fetch_image(url: str, label: ImageTarget = None, priority: int = PRIORITY_VISIBLE):
         """
-        Given a QByteArray and a QLabel, it sets the image of the label.
-        """
-        pixmap = QPixmap()
-
-        pixmap.loadFromData(image)
+        Loads the image at url in label (see SpriteService.fetch).
+        Meant for the input widgets of the tab, see fetch_output_image for the results.
 
-        pixmap = pixmap.scaledToHeight(utils.SPRITE_SIZE)
-
-        label.setPixmap(pixmap)
-
-    def on_image_result(self, reply: QtNetwork.QNetworkReply):
+        :param url: The url of the image (the first of its fallback chain).
+        :param label: The label where to show the image, or a function receiving the QPixmap.
+        :param priority: Lower priorities are downloaded first.
         """
-        Called when the QNetworkAccessManager has finished downloading 1 image.
-        Checks for failed download and tries all alternatives.
+        get_sprite_service().fetch(url, label, priority)
 
-        :param reply:
-        :return:
+    def fetch_output_image(self, url: str, label: ImageTarget = None, priority: int = PRIORITY_VISIBLE):
+        """
+        Like fetch_image, but the request is cancelled by clear_output
         """
-        error = reply.error()
-        url: str = reply.url().url()
-
-        if url in widgets.URL2LABEL.keys():
-            if error == QtNetwork.QNetworkReply.NetworkError.NoError:
-                labels: List[QLabel] = widgets.URL2LABEL.get(url)
-
-                bytes_string = reply.readAll()
-                for label in labels:
-                    self.set_pixmap(bytes_string, label)
-                widgets.URL2LABEL.delete(url)
-
-            else:
-                if 'black-white' in url:
-                    label = widgets.URL2LABEL.delete(url)
-                    url = url.replace('black-white', 'sun-moon')
-                    qurl = QtNetwork.QNetworkRequest(QUrl(url))
-                    widgets.URL2LABEL.put(url, label)
-                    self.nam.get(qurl)
-                elif 'main/CustomBattlers' in url:
-                    label = widgets.URL2LABEL.delete(url)
-                    url = url.replace('main/CustomBattlers', 'master/Battlers')
-                    qurl = QtNetwork.QNetworkRequest(QUrl(url))
-                    widgets.URL2LABEL.put(url, label)
-                    self.nam.get(qurl)
-                elif re.search(r'master/Battlers/\d+.\d+\.png', url):
-                    label = widgets.URL2LABEL.delete(url)
-                    idx = url.split('/')[-1].split('.')[0]
-                    url = url.replace('master/Battlers/', f'master/Battlers/{idx}/')
-                    qurl = QtNetwork.QNetworkRequest(QUrl(url))
-                    widgets.URL2LABEL.put(url, label)
-                    self.nam.get(qurl)
-                elif re.search(r'master/Battlers/\d+/\d+.\d+\.png', url):
-                    label = widgets.URL2LABEL.delete(url)
-                    url = url.replace('custom', 'autogen')
-                    qurl = QtNetwork.QNetworkRequest(QUrl(url))
-                    widgets.URL2LABEL.put(url, label)
-                    self.nam.get(qurl)
-                else:
-                    logging.warning(f"Could not find an alternative url for '{url}'")
+        get_sprite_service().fetch(url, label, priority, group=self)
 
+    def start_search(self,
+                     items: Callable[[], Sequence],
+                     compute: Callable[[object], List[List[FusedPokemon]]] = None,
+                     clear: bool = True,
+                     evaluate: Callable[[Sequence], Iterable[Tuple[Hashable, List[List[FusedPokemon]]]]] = None):
+        """
+        Runs a search in a background thread (cancelling the running one, if any).
+        Results are added to the result view in chunks, while a progress bar shows how far the search is.
+        The evolines of each item are stored in the result model using the item as key.
+        Only available for tabs using the result view.
+
+        :param items: Function returning the items to process (called in the background thread).
+        :param compute: Function returning the evolines of one item (called in the background thread).
+        :param clear: If True, the results of the previous searches are removed first.
+        :param evaluate: Used instead of compute: function yielding (item, evolines) for all the items, in order
+                         (called in the background thread, see SearchWorker).
+        """
+        assert self.result_model is not None, 'Background searches need the result view'
+        self.cancel_search()
+        if clear:
+            self.clear_output()
+
+        self._search_generation += 1
+        worker = SearchWorker(self._search_generation, items, compute, evaluate)
+        worker.signals.chunk.connect(self._on_search_chunk)
+        worker.signals.progress.connect(self._on_search_progress)
+        worker.signals.finished.connect(self._on_search_finished)
+        worker.signals.failed.connect(self._on_search_failed)
+        self._search_worker = worker
+
+        self.progress_bar.setRange(0, 0)  # busy until the number of items is known
+        self.progress_container.show()
+        QThreadPool.globalInstance().start(worker)
+
+    def cancel_search(self):
+        """ Cancels the running search (results already displayed are kept) """
+        if self._search_worker is not None:
+            self._search_worker.cancel()
+            self._search_worker = None
+        if self.result_model is not None:
+            self.progress_container.hide()
+
+    @tracing.traced(category=tracing.GUI)
+    def _on_search_chunk(self, generation: int, results: List[Tuple[Hashable, List[List[FusedPokemon]]]]):
+        if generation == self._search_generation and self._search_worker is not None:
+            for item, evolines in results:
+                self.result_model.append(evolines, key=item)
+
+    def _on_search_progress(self, generation: int, done: int, total: int):
+        if generation == self._search_generation and self._search_worker is not None:
+            self.progress_bar.setRange(0, total)
+            self.progress_bar.setValue(done)
+
+    def _on_search_finished(self, generation: int):
+        if generation == self._search_generation:
+            self._search_worker = None
+            self.progress_container.hide()
+
+    def _on_search_failed(self, generation: int, message: str):
+        if generation == self._search_generation:
+            logging.error(f"Search failed: {message}")
+
+    @tracing.traced(category=tracing.GUI)
     def add_evoline_widgets(self, pkmn1: str, pkmn2: str, display_ab: bool = True, display_ba: bool = True):
 
-        fusions_ab, fusions_ba = utils.get_fusions(pkmn1, pkmn2)
+        # Add the fusions to the visible list
+        evolines = utils.get_evolines(pkmn1, pkmn2, display_ab, display_ba)
+
+        if self.result_model is not None:
+            self.result_model.append(evolines)
+            return
 
         self.output_layout.addStretch()
 
-        evolines = []
-        # Add the fusions to the visible list
-        # Add ab and ba fusions separately only if they are enabled
-        if display_ab:
-            evolines.append(fusions_ab)
-        if display_ba:
-            evolines.append(fusions_ba)
-
         # Create an Evoline widget for each enabled evoline (AB and BA)
         for row, evoline in enumerate(evolines):
             if len(evoline) > 0:
                 evoline_widget = EvolineWidget(evoline)
-                evoline_widget.fetch_images(self.nam)
+                evoline_widget.fetch_images(self.fetch_output_image)
                 self.output_layout.addWidget(evoline_widget)
                 self.output_layout.addStretch()
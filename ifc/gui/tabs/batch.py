@@ -1,17 +1,17 @@
-from itertools import combinations
+from collections import Counter
 from random import Random
 
 from PyQt6.QtCore import Qt
 from PyQt6.QtWidgets import QComboBox, QPushButton, QListWidget
 
-from data import pokedex
+from data import parallel, pokedex, utils
 from gui.tabs.base import IFCBaseTab
 
 
 class BatchTab(IFCBaseTab):
 
     def __init__(self):
-        super().__init__()
+        super().__init__(result_view=True)
 
         self.set_info_message("Add multiple Pokemon to the list and see all "
                               "the possible combinations between them!")
@@ -61,7 +61,7 @@ class BatchTab(IFCBaseTab):
         for index in indexes_to_remove:
             item = self.plist.takeItem(index).text()
             if self.cbox.findText(item, Qt.MatchFlag.MatchExactly) == -1:
-                for evo in pokedex.get_evolution_list(item):
+                for evo in pokedex.get_evoline(name=item).members:
                     self.cbox.addItem(evo.name)
 
     def update_list(self) -> None:
@@ -71,7 +71,7 @@ class BatchTab(IFCBaseTab):
         add them and remove them from the cbox list
         """
         item_to_add = self.cbox.currentText()
-        evo_list = [evo.name for evo in pokedex.get_evolution_list(item_to_add)]
+        evo_list = [evo.name for evo in pokedex.get_evoline(name=item_to_add).members]
 
         # check if any evolution is already in the list
         for evo in evo_list:
@@ -82,24 +82,41 @@ class BatchTab(IFCBaseTab):
                 break
         self.plist.addItem(item_to_add)
 
-    def mix(self):
-        self.clear_layout(self.output_layout)
+    def on_pokedex_changed(self, change: pokedex.DexChange):
+        """
+        Drops the Pokemon that are not in the pokedex anymore from the list, and the results of the pairs
+        whose evolines changed: they are computed again by the next Cross Fuse
+        """
+        super().on_pokedex_changed(change)
+        names = set(pokedex.get_names())
+        for row in reversed(range(self.plist.count())):
+            if self.plist.item(row).text() not in names:
+                self.plist.takeItem(row)
 
-        result = []
-        for i in range(self.plist.count()):
-            result.append(self.plist.item(i).text())
+        # Evolines listed more than once are not offered anymore (see update_list)
+        listed = Counter(pokedex.get_evoline(name=self.plist.item(row).text()).idx for row in range(self.plist.count()))
+        self.set_combobox_items(self.cbox, [name for name in pokedex.get_names()
+                                            if listed[pokedex.get_evoline(name=name).idx] < 2])
 
-        # extract duplicates and set result to contain unique elements
-        duplicates = set([name for name in result if result.count(name) > 1])
-        result = list(set(result))
+        self.result_model.remove({pair for pair in self.result_model.keys()
+                                  if any(name not in names or pokedex.get_evoline(name=name).idx in change.evolines
+                                         for name in pair)})
 
-        # get a list of all combinations of 2 pokemons
-        result = list(combinations(result, 2))
+    def mix(self):
+        """
+        Shows the fusions of every pair of Pokemon in the list.
+        Results are kept by pair: only the pairs involving Pokemon added since the
+        last time are computed, and only the ones involving removed Pokemon are removed.
+        Big batches are split across worker processes (see data.parallel).
+        """
+        result = utils.get_batch_pairs(self.plist.item(i).text() for i in range(self.plist.count()))
 
-        # if there were duplicates, add them to the list
-        for duplicate in duplicates:
-            result.append((duplicate, duplicate))
+        # Pairs are unordered (both ab and ba fusions are shown), use them sorted as keys
+        pairs = [tuple(sorted(pair)) for pair in result]
+        # Pairs of a cancelled search are missing from the model, so they are computed again
+        self.cancel_search()
+        shown = self.result_model.keys()
+        self.result_model.remove(shown - set(pairs))
+        new_pairs = [pair for pair in pairs if pair not in shown]
 
-        for i, (pkmn1, pkmn2) in enumerate(result):
-            self.add_evoline_widgets(pkmn1, pkmn2)
-            print(i+1, '/', len(result))
+        self.start_search(lambda: new_pairs, clear=False, evaluate=parallel.evaluate_pairs)
@@ -0,0 +1,319 @@
+import math
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Set
+
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, pyqtSignal, QPoint, QTimer
+from PyQt6.QtGui import QPainter, QPixmap, QPen, QColor, QLinearGradient, QHelpEvent
+from PyQt6.QtWidgets import QListView, QStyledItemDelegate, QStyleOptionViewItem, QToolTip, QAbstractItemView
+
+from data import utils
+from data.fusion import FusionRows
+from data.pokemon import FusedPokemon
+from gui.sprite_service import PRIORITY_VISIBLE, PRIORITY_PREFETCH
+from ifc import tracing
+
+""" Role used to get the evoline (a sequence of FusedPokemon, e.g. FusionRows) of a row """
+EVOLINE_ROLE: int = Qt.ItemDataRole.UserRole
+
+
+def _sprite_urls(evoline: Sequence[FusedPokemon]) -> List[str]:
+    # FusionRows know their urls without building their fusions (see data.parallel)
+    if isinstance(evoline, FusionRows):
+        return evoline.sprite_urls()
+    return [fusion.get_sprite_url() for fusion in evoline]
+
+
+class EvolineListModel(QAbstractListModel):
+    """
+    List model of the results of a search, one row per evoline (a sequence of FusedPokemon).
+    It also keeps the sprites of the fusions being displayed: sprites are requested
+    (through sprite_requested) only when a row is painted for the first time,
+    or with a lower priority when a row is about to be displayed (see prefetch).
+
+    Evolines can be appended with a key (e.g. the pair of Pokemon they come from),
+    so that they can be removed later without touching the other rows.
+    """
+
+    """ Emitted with the url of a sprite that should be downloaded, and its priority """
+    sprite_requested = pyqtSignal(str, int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._evolines: List[List[FusedPokemon]] = []
+        # key of each row, and number of rows of each key (keys without evolines count 0 rows)
+        self._row_keys: List[Optional[Hashable]] = []
+        self._key_rows: Dict[Hashable, int] = dict()
+        # url -> rows displaying that sprite
+        self._rows_by_url: Dict[str, List[int]] = dict()
+        self._sprites: Dict[str, QPixmap] = dict()
+        # url -> best priority it was requested with
+        self._requested: Dict[str, int] = dict()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._evolines)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._evolines):
+            return None
+        if role == EVOLINE_ROLE:
+            return self._evolines[index.row()]
+        return None
+
+    def append(self, evolines: List[List[FusedPokemon]], key: Hashable = None) -> None:
+        """
+        Adds evolines at the end of the list
+
+        :param evolines: The evolines to add, empty ones are skipped.
+        :param key: If given, the evolines are stored under this key (see keys() and remove()),
+                    the key is stored even if there are no evolines to add.
+        """
+        evolines = [evoline for evoline in evolines if len(evoline) > 0]
+        if key is not None:
+            self._key_rows[key] = self._key_rows.get(key, 0) + len(evolines)
+        if not evolines:
+            return
+        first = len(self._evolines)
+        self.beginInsertRows(QModelIndex(), first, first + len(evolines) - 1)
+        for row, evoline in enumerate(evolines, start=first):
+            self._evolines.append(evoline)
+            self._row_keys.append(key)
+            for url in _sprite_urls(evoline):
+                self._rows_by_url.setdefault(url, []).append(row)
+        self.endInsertRows()
+
+    def keys(self) -> Set[Hashable]:
+        """
+        Returns the keys of the evolines added so far
+        """
+        return set(self._key_rows.keys())
+
+    def remove(self, keys: Iterable[Hashable]) -> None:
+        """
+        Removes the evolines stored under the given keys, the other rows (and their sprites) are kept
+        """
+        keys = set(keys) & self._key_rows.keys()
+        if not keys:
+            return
+        for key in keys:
+            del self._key_rows[key]
+
+        # Remove runs of consecutive rows, from the last one so that row numbers stay valid
+        row = len(self._evolines) - 1
+        while row >= 0:
+            if self._row_keys[row] not in keys:
+                row -= 1
+                continue
+            last = row
+            while row >= 0 and self._row_keys[row] in keys:
+                row -= 1
+            self.beginRemoveRows(QModelIndex(), row + 1, last)
+            del self._evolines[row + 1:last + 1]
+            del self._row_keys[row + 1:last + 1]
+            self.endRemoveRows()
+
+        # Rows moved: rebuild the url lookup and forget the sprites nobody displays anymore
+        self._rows_by_url = dict()
+        for row, evoline in enumerate(self._evolines):
+            for url in _sprite_urls(evoline):
+                self._rows_by_url.setdefault(url, []).append(row)
+        self._sprites = {url: pixmap for url, pixmap in self._sprites.items() if url in self._rows_by_url}
+        self._requested = {url: priority for url, priority in self._requested.items() if url in self._rows_by_url}
+
+    def clear(self) -> None:
+        """
+        Removes all the evolines (and their sprites)
+        """
+        self.beginResetModel()
+        self._evolines = []
+        self._row_keys = []
+        self._key_rows = dict()
+        self._rows_by_url = dict()
+        self._sprites = dict()
+        self._requested = dict()
+        self.endResetModel()
+
+    def sprite(self, url: str) -> Optional[QPixmap]:
+        """
+        Returns the sprite at url if it was already loaded,
+        otherwise it requests it as visible (only the first time) and returns None
+        """
+        pixmap = self._sprites.get(url)
+        if pixmap is None:
+            self._request(url, PRIORITY_VISIBLE)
+        return pixmap
+
+    def prefetch(self, rows: Iterable[int]) -> None:
+        """
+        Requests (with a low priority) the sprites of rows that are not displayed yet
+        """
+        for row in rows:
+            if 0 <= row < len(self._evolines):
+                for url in _sprite_urls(self._evolines[row]):
+                    if url not in self._sprites:
+                        self._request(url, PRIORITY_PREFETCH)
+
+    def _request(self, url: str, priority: int) -> None:
+        # Request again only if the priority got better (e.g. a prefetched row became visible)
+        if priority < self._requested.get(url, priority + 1):
+            self._requested[url] = priority
+            self.sprite_requested.emit(url, priority)
+
+    def set_sprite(self, url: str, pixmap: QPixmap) -> None:
+        """
+        Stores a downloaded sprite and repaints the rows displaying it
+        """
+        rows = self._rows_by_url.get(url)
+        if not rows:
+            # The model was cleared while the sprite was downloading
+            return
+        self._sprites[url] = pixmap
+        for row in rows:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+
+class EvolineDelegate(QStyledItemDelegate):
+    """
+    Paints an evoline as a grid of fusions (5 per row) inside a gray border,
+    the same layout of EvolineWidget, without creating any widget.
+    """
+
+    COLUMNS: int = 5
+    BORDER: int = 5
+    CELL_HEIGHT: int = utils.SPRITE_SIZE + utils.MARGIN
+    INFO_WIDTH: int = int(utils.SPRITE_SIZE * 0.8)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Loading fonts is not free, do it once
+        self.font = utils.get_font()
+        self.bold_font = utils.get_font(bold=True)
+
+    def sizeHint(self, option: QStyleOptionViewItem, index: QModelIndex) -> QSize:
+        evoline = index.data(EVOLINE_ROLE) or []
+        grid_rows = math.ceil(len(evoline) / self.COLUMNS)
+        view: QListView = self.parent()
+        return QSize(view.viewport().width() - 2 * view.spacing(),
+                     grid_rows * self.CELL_HEIGHT + 2 * self.BORDER + 2 * utils.MARGIN)
+
+    def _cell_rect(self, rect: QRect, i: int) -> QRect:
+        inner = rect.adjusted(self.BORDER + utils.MARGIN, self.BORDER + utils.MARGIN,
+                              -self.BORDER - utils.MARGIN, -self.BORDER - utils.MARGIN)
+        width = inner.width() // self.COLUMNS
+        return QRect(inner.left() + (i % self.COLUMNS) * width,
+                     inner.top() + (i // self.COLUMNS) * self.CELL_HEIGHT,
+                     width, self.CELL_HEIGHT)
+
+    def _fusion_at(self, rect: QRect, evoline: List[FusedPokemon], pos: QPoint) -> Optional[FusedPokemon]:
+        for i, fusion in enumerate(evoline):
+            if self._cell_rect(rect, i).contains(pos):
+                return fusion
+        return None
+
+    @tracing.traced(category=tracing.GUI)
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex) -> None:
+        evoline: List[FusedPokemon] = index.data(EVOLINE_ROLE)
+        if not evoline:
+            return
+        model: EvolineListModel = index.model()
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+        # The gray border around the evoline
+        painter.setPen(QPen(QColor('gray'), self.BORDER))
+        half = self.BORDER // 2
+        painter.drawRect(option.rect.adjusted(half, half, -half - 1, -half - 1))
+
+        for i, fusion in enumerate(evoline):
+            cell = self._cell_rect(option.rect, i)
+            content_width = utils.SPRITE_SIZE + self.INFO_WIDTH
+            left = cell.left() + max(0, (cell.width() - content_width) // 2)
+            top = cell.top() + (cell.height() - utils.SPRITE_SIZE) // 2
+
+            pixmap = model.sprite(fusion.get_sprite_url())
+            if pixmap is not None:
+                painter.drawPixmap(left + (utils.SPRITE_SIZE - pixmap.width()) // 2, top, pixmap)
+
+            self._paint_info(painter, QRect(left + utils.SPRITE_SIZE, top, self.INFO_WIDTH, utils.SPRITE_SIZE),
+                             fusion)
+
+        painter.restore()
+
+    def _paint_info(self, painter: QPainter, rect: QRect, fusion: FusedPokemon) -> None:
+        """
+        Paints the box with head, body and levels of a fusion (same look of InfoWidget)
+        """
+        gradient = QLinearGradient(0, rect.top(), 0, rect.bottom())
+        gradient.setColorAt(0, QColor(fusion.types[0].value))
+        gradient.setColorAt(1, QColor(fusion.types[1].value))
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(gradient)
+        painter.drawRoundedRect(rect, 15, 15)
+
+        lines = [("HEAD", fusion.head.capitalize()),
+                 ("BODY", fusion.body.capitalize()),
+                 ("LEVEL", f"{fusion.min_level}-{fusion.max_level}")]
+        line_height = rect.height() // (2 * len(lines))
+        for i, (key, value) in enumerate(lines):
+            key_rect = QRect(rect.left(), rect.top() + 2 * i * line_height, rect.width(), line_height)
+            painter.setFont(self.bold_font)
+            painter.setPen(QColor('black'))
+            painter.drawText(key_rect, Qt.AlignmentFlag.AlignCenter, key)
+            painter.setFont(self.font)
+            painter.setPen(QColor('white'))
+            painter.drawText(key_rect.translated(0, line_height), Qt.AlignmentFlag.AlignCenter, value)
+
+    def helpEvent(self, event: QHelpEvent, view: QAbstractItemView,
+                  option: QStyleOptionViewItem, index: QModelIndex) -> bool:
+        if event is not None and event.type() == QHelpEvent.Type.ToolTip and index.isValid():
+            fusion = self._fusion_at(option.rect, index.data(EVOLINE_ROLE) or [], event.pos())
+            if fusion is not None:
+                QToolTip.setFont(self.font)
+                QToolTip.showText(event.globalPos(), fusion.tooltip, view)
+                return True
+            QToolTip.hideText()
+            return True
+        return super().helpEvent(event, view, option, index)
+
+
+class EvolineListView(QListView):
+    """
+    Virtualized list of evolines: only the rows inside the viewport are painted,
+    so the number of results does not affect memory or render time.
+    The sprites of the rows below the viewport are prefetched.
+    """
+
+    """ Number of rows below the viewport whose sprites are prefetched """
+    PREFETCH_ROWS: int = 5
+
+    def __init__(self, model: EvolineListModel, parent=None):
+        super().__init__(parent)
+        self.setModel(model)
+        self.setItemDelegate(EvolineDelegate(self))
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setSpacing(utils.MARGIN // 2)
+        # Rows only depend on the width of the view, relayout them when it changes
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+
+        # Prefetch once per event loop iteration, no matter how many rows were added or scrolled
+        self._prefetch_timer = QTimer(self)
+        self._prefetch_timer.setSingleShot(True)
+        self._prefetch_timer.setInterval(0)
+        self._prefetch_timer.timeout.connect(self._prefetch)
+        # (lambdas: start(int) would take the signal arguments as the interval)
+        self.verticalScrollBar().valueChanged.connect(lambda *_: self._prefetch_timer.start())
+        model.rowsInserted.connect(lambda *_: self._prefetch_timer.start())
+
+    def _prefetch(self):
+        # The bottom of the viewport may fall in the spacing between two rows
+        x = self.viewport().width() // 2
+        bottom = self.viewport().height() - 1
+        for y in range(bottom, max(bottom - 2 * self.spacing() - 2, -1), -1):
+            last_visible = self.indexAt(QPoint(x, y))
+            if last_visible.isValid():
+                model: EvolineListModel = self.model()
+                model.prefetch(range(last_visible.row() + 1, last_visible.row() + 1 + self.PREFETCH_ROWS))
+                return
@@ -4,7 +4,6 @@ from PyQt6.QtCore import Qt
 from PyQt6.QtWidgets import QVBoxLayout, QLabel, QPushButton, QComboBox
 
 from data import utils, pokedex
-from gui.tabs import widgets
 from gui.tabs.base import IFCBaseTab
 
 
@@ -17,8 +16,8 @@ class SingleTab(IFCBaseTab):
         self.info_box = QVBoxLayout()
 
         self.set_info_message("You can see typing and stats of a Pokemon hovering it with the mouse.\n\n"
-                              "To keep the application light-weight, "
-                              "the sprites are downloaded on every fusion request.")
+                              "Sprites are downloaded the first time they are needed, "
+                              "then they are loaded from a local cache.")
 
 
         # Create the 2 inputs for the pokemons (label, combobox and random button)
@@ -58,8 +57,7 @@ class SingleTab(IFCBaseTab):
 
         def on_text_changed():
             pokemon = pokedex.get_pokemon(name=cbox.currentText())
-            widgets.URL2LABEL.put(pokemon.get_sprite_url(), sprite)
-            pokemon.fetch_image(self.nam)
+            self.fetch_image(pokemon.get_sprite_url(), sprite)
 
         cbox.currentTextChanged.connect(on_text_changed)
         on_text_changed()
@@ -73,10 +71,15 @@ class SingleTab(IFCBaseTab):
         random.clicked.connect(get_random)
         return sprite, cbox, random
 
+    def on_pokedex_changed(self, change: pokedex.DexChange):
+        super().on_pokedex_changed(change)
+        for cbox in (self.cbox1, self.cbox2):
+            self.set_combobox_items(cbox, pokedex.get_names())
+
     def update_output(self):
         pkmn1 = self.cbox1.currentText()
         pkmn2 = self.cbox2.currentText()
 
-        self.clear_layout(self.output_layout)
+        self.clear_output()
 
         self.add_evoline_widgets(pkmn1, pkmn2)
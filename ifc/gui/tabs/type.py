@@ -1,22 +1,22 @@
-import logging
-
 from PyQt6.QtCore import Qt
-from PyQt6.QtWidgets import QLabel, QComboBox, QPushButton
+from PyQt6.QtWidgets import QLabel, QComboBox, QPushButton, QSpinBox
 
-from data import utils, pokedex
+from data import utils, pokedex, search
 from data.enums import Type
-from gui.tabs import widgets
 from gui.tabs.base import IFCBaseTab
 
 
 class TypeTab(IFCBaseTab):
 
+    """ Default number of evolines displayed by a search """
+    DEFAULT_SHOW_TOP: int = 50
+
     def __init__(self):
-        super().__init__()
+        super().__init__(result_view=True)
 
-        self.set_warning_message("Be aware that this mode may potentially has to load "
-                                 "hundreds of evolines at once, so be patient after clicking "
-                                 "the 'SEARCH' button")
+        self.set_info_message("Search all the fusions having the selected types! "
+                              "Results are shown while they are computed, "
+                              "use 'Cancel' to stop a long search")
         # Set label, label with image and combobox for 'based on'
         self.based_on_text = QLabel("BASED ON")
         self.based_on_text.setFont(self.bold_font)
@@ -64,8 +64,7 @@ class TypeTab(IFCBaseTab):
                 self.type_a_cbox.addItems([t.name for t in pokemon.types])
                 self.type_b_cbox.addItems(pokedex.get_types())
                 self.type_b_cbox.setCurrentText('ANY')
-                widgets.URL2LABEL.put(pokemon.get_sprite_url(), self.based_on_image)
-                pokemon.fetch_image(self.nam)
+                self.fetch_image(pokemon.get_sprite_url(), self.based_on_image)
 
             for model in [self.type_a_cbox.model(), self.type_b_cbox.model()]:
                 for i in range(len(model.findItems('', flags=Qt.MatchFlag.MatchContains))):
@@ -83,6 +82,16 @@ class TypeTab(IFCBaseTab):
             "HP", "Attack", "Defense", "Special Attack", "Special Defense", "Speed", "Total"
         ])
 
+        self.show_top_text = QLabel("SHOW TOP")
+        self.show_top_text.setFont(self.bold_font)
+
+        # Only the best N evolines are ranked and displayed (0 displays all of them)
+        self.show_top_spinbox = QSpinBox()
+        self.show_top_spinbox.setFont(self.font)
+        self.show_top_spinbox.setRange(0, 9999)
+        self.show_top_spinbox.setSpecialValueText("All")
+        self.show_top_spinbox.setValue(self.DEFAULT_SHOW_TOP)
+
         self.search_button = QPushButton("Search")
         self.search_button.setFont(self.bold_font)
         self.search_button.pressed.connect(self.search)
@@ -98,79 +107,28 @@ class TypeTab(IFCBaseTab):
         self.input_layout.addWidget(self.sort_by_text)
         self.input_layout.addWidget(self.sort_by_cbox)
         self.input_layout.addStretch()
+        self.input_layout.addWidget(self.show_top_text)
+        self.input_layout.addWidget(self.show_top_spinbox)
+        self.input_layout.addStretch()
         self.input_layout.addWidget(self.search_button)
         self.input_layout.addStretch()
 
-    def search(self):
-        self.clear_layout(self.output_layout)
+    def on_pokedex_changed(self, change: pokedex.DexChange):
+        super().on_pokedex_changed(change)
+        # Updates the types and the image too (see update_pkmn)
+        self.set_combobox_items(self.based_on_cbox, ['---'] + pokedex.get_names())
 
-        requested_type_a = Type[self.type_a_cbox.currentText()]
-        requested_type_b = Type[self.type_b_cbox.currentText()]
-        id_based_on = None
+    def search(self):
+        based_on = None
         if self.based_on_cbox.currentText() != '---':
-            id_based_on = pokedex.get_id_by_name(self.based_on_cbox.currentText())
+            based_on = pokedex.get_pokemon(name=self.based_on_cbox.currentText())
 
-        is_based_on = True if id_based_on else False
-        based_on = pokedex.get_pokemon(id_based_on) if is_based_on else None
+        # Read the inputs here, widgets can't be used from the background thread
+        type_a = Type[self.type_a_cbox.currentText()]
+        type_b = Type[self.type_b_cbox.currentText()]
+        sort_by = self.sort_by_cbox.currentText().lower().replace(' ', '_')
+        k = self.show_top_spinbox.value() or None
 
-        type_a_heads = []
-        type_a_bodies = []
-        if is_based_on:
-            if len(based_on.types) > 1:
-                if based_on.types[0] == requested_type_a:
-                    type_a_heads = [based_on.evoline]
-                else:  # based_on.types[1] == requested_type_a
-                    type_a_bodies = [based_on.evoline]
-
-            else:
-                type_a_heads = [based_on.evoline]
-                type_a_bodies = [based_on.evoline]
-
-        else:
-            type_a_heads = pokedex.get_evolines_by_type(first_type=requested_type_a)
-            type_a_bodies = pokedex.get_evolines_by_type(second_type=requested_type_a)
-
-        type_b_heads = pokedex.get_evolines_by_type(first_type=requested_type_b)
-        type_b_bodies = pokedex.get_evolines_by_type(second_type=requested_type_b)
-
-        def get_list(heads, bodies, type_a, type_b):
-            result = set()
-            for evo_head in heads:
-                for evo_body in bodies:
-                    fusions = utils.get_fusions(evo_head[0].name, evo_body[0].name)
-                    for fusion in fusions[0]:
-                        if type_a in fusion.types and type_b in fusion.types:
-                            attr = self.sort_by_cbox.currentText().lower().replace(' ', '_')
-                            result.add(
-                                (
-                                    max([f.__getattribute__(attr)
-                                         if type_a in f.types and type_b in f.types
-                                         else 0
-                                         for f in fusions[0]]),
-                                    evo_head[0],
-                                    evo_body[0]
-                                )
-                            )
-                            break
-            return list(result)
-
-        result_ab = get_list(type_a_heads, type_b_bodies, requested_type_a, requested_type_b)
-        result_ba = get_list(type_b_heads, type_a_bodies, requested_type_a, requested_type_b)
-        result = result_ba + result_ab
-
-        if is_based_on and Type.is_any(requested_type_b):
-            result_ab2 = get_list([based_on.evoline],
-                                  pokedex.get_evolines_by_type(second_type=requested_type_a),
-                                  requested_type_a, requested_type_b)
-            result_ba2 = get_list(type_a_heads,
-                                  [based_on.evoline],
-                                  requested_type_a, requested_type_b)
-            result += result_ab2 + result_ba2
-
-        result.sort(reverse=True, key=lambda v: v[0])
-
-        for i, (val, pokemon_1, pokemon_2) in enumerate(result):
-            self.add_evoline_widgets(pokemon_1.name,
-                                     pokemon_2.name,
-                                     display_ba=False)
-            logging.info(f"Displayed {i} out of {len(result)}")
+        self.start_search(
+            lambda: search.search_by_type(type_a, type_b, based_on=based_on, sort_by=sort_by, k=k),
+            lambda result: utils.get_evolines(result.head.name, result.body.name, display_ba=False))
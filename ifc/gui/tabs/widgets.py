@@ -1,36 +1,13 @@
-from typing import List
+from typing import Callable, List
 
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QPainter
-from PyQt6.QtNetwork import QNetworkAccessManager
 from PyQt6.QtWidgets import QWidget, QHBoxLayout, QLabel, QVBoxLayout, QGraphicsColorizeEffect, QGridLayout, QToolTip, \
     QStyleOption, QStyle
 
 from data import utils
 from data.pokemon import FusedPokemon
-
-
-class _Url2LabelMap:
-
-    def __init__(self):
-        self._map = dict()
-
-    def put(self, url: str, label: QLabel):
-        val = self._map.get(url) if self._map.get(url) else []
-        val.append(label)
-        self._map[url] = val
-
-    def delete(self, url: str) -> QLabel:
-        return self._map.pop(url)[0]
-
-    def get(self, url: str):
-        return self._map.get(url, [])
-
-    def keys(self):
-        return self._map.keys()
-
-
-URL2LABEL = _Url2LabelMap()
+from ifc import tracing
 
 
 class CustomWidget(QWidget):
@@ -54,14 +31,16 @@ class EvolineWidget(CustomWidget):
     The Grid has a grey border and the items are 5 per row.
     """
 
+    @tracing.traced(category=tracing.GUI)
     def __init__(self, urls: List[FusedPokemon]):
         super().__init__()
         # Set name (so that setting StyleSheet does not affect children widgets)
         self.setObjectName('evoline')
         # And Style Sheet (a gray border around evoline) TODO might want to make it look better
-        self.setStyleSheet('QWidget#evoline{'
-                           '     border: 5px ridge gray;'
-                           '}')
+        with tracing.span('setStyleSheet', tracing.GUI):
+            self.setStyleSheet('QWidget#evoline{'
+                               '     border: 5px ridge gray;'
+                               '}')
 
         # Create a grid where to put each fusion widget, in rows of 5
         grid = QGridLayout()
@@ -72,9 +51,9 @@ class EvolineWidget(CustomWidget):
 
         self.setLayout(grid)
 
-    def fetch_images(self, nam: QNetworkAccessManager):
+    def fetch_images(self, fetch_image: Callable[[str, QLabel], None]):
         for widget in self.fusion_widgets:
-            widget.fetch_image(nam)
+            widget.fetch_image(fetch_image)
 
 
 class FusionWidget(CustomWidget):
@@ -84,26 +63,13 @@ class FusionWidget(CustomWidget):
     The items are disposed horizontally
     """
 
+    @tracing.traced(category=tracing.GUI)
     def __init__(self, fusion: FusedPokemon):
         super().__init__()
         self.fusion = fusion
 
         QToolTip.setFont(utils.get_font())
-        self.setToolTip(f'<h1 style="background-color:{fusion.types[0].value}; color: white;">'
-                        f'  {fusion.types[0].name}'
-                        f'</h1>'
-                        + (f'<h1 style="background-color:{fusion.types[1].value};color: white;">'
-                           f'   {fusion.types[1].name}'
-                           f'</h1>' if fusion.types[1] != fusion.types[0] else '') +
-                        f'<p>HP: {fusion.hp}</p>'
-                        f'<p>ATK: {fusion.attack}</p>'
-                        f'<p>DEF: {fusion.defense}</p>'
-                        f'<p>SP.ATK: {fusion.special_attack}</p>'
-                        f'<p>SP.DEF: {fusion.special_defense}</p>'
-                        f'<p>SPEED: {fusion.speed}</p>'
-                        f'<p>'
-                        f'  TOTAL: {fusion.hp + fusion.attack + fusion.defense + fusion.special_attack + fusion.special_defense + fusion.speed}'
-                        f'</p>')
+        self.setToolTip(fusion.tooltip)
 
         # Create a horizontal layout
         layout = QHBoxLayout()
@@ -121,10 +87,8 @@ class FusionWidget(CustomWidget):
         # Set the horizontal layout as the layout of the widget
         self.setLayout(layout)
 
-    def fetch_image(self, nam: QNetworkAccessManager):
-        url = self.fusion.get_sprite_url()
-        URL2LABEL.put(url, self.image)
-        self.fusion.fetch_image(nam)
+    def fetch_image(self, fetch_image: Callable[[str, QLabel], None]):
+        fetch_image(self.fusion.get_sprite_url(), self.image)
 
 
 class InfoWidget(CustomWidget):
@@ -132,22 +96,24 @@ class InfoWidget(CustomWidget):
     A Widget displaying data about a fused pokemon
     """
 
+    @tracing.traced(category=tracing.GUI)
     def __init__(self, fusion: FusedPokemon):
         super().__init__()
 
         # Set style sheet.
         # This sets background appearance and color based on fused pokemon types.
         self.setObjectName('info')
-        self.setStyleSheet("QWidget#info{ "
-                           f" width: {int(utils.SPRITE_SIZE/2)}; "
-                           f" height: {utils.SPRITE_SIZE}; "
-                           "  border-radius: 15px; "
-                           "  border-bottom-left-radius: 3px;"
-                           "  background: qlineargradient( x1:0 y1:0, "
-                           "                               x2:0 y2:1, "
-                           f"                              stop:0 {fusion.types[0].value}, "
-                           f"                              stop:1 {fusion.types[1].value});"
-                           "}")
+        with tracing.span('setStyleSheet', tracing.GUI):
+            self.setStyleSheet("QWidget#info{ "
+                               f" width: {int(utils.SPRITE_SIZE/2)}; "
+                               f" height: {utils.SPRITE_SIZE}; "
+                               "  border-radius: 15px; "
+                               "  border-bottom-left-radius: 3px;"
+                               "  background: qlineargradient( x1:0 y1:0, "
+                               "                               x2:0 y2:1, "
+                               f"                              stop:0 {fusion.types[0].value}, "
+                               f"                              stop:1 {fusion.types[1].value});"
+                               "}")
 
         # Create a center-aligned layout (to add labels to)
         layout = QVBoxLayout()
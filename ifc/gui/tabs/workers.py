@@ -0,0 +1,95 @@
+import logging
+import time
+import traceback
+from typing import Callable, Iterable, List, Sequence, Tuple
+
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from data.pokemon import FusedPokemon
+from ifc import tracing
+
+
+class SearchSignals(QObject):
+    """
+    Signals of a SearchWorker, every signal carries the generation of the search
+    so that results of cancelled searches can be recognized and dropped.
+    """
+
+    """ (generation, [(item, evolines), ...]) a chunk of results """
+    chunk = pyqtSignal(int, list)
+    """ (generation, done, total) number of items processed so far """
+    progress = pyqtSignal(int, int, int)
+    """ (generation) the search completed (or was cancelled) """
+    finished = pyqtSignal(int)
+    """ (generation, message) the search raised an exception """
+    failed = pyqtSignal(int, str)
+
+
+class SearchWorker(QRunnable):
+    """
+    Computes the results of a search in a QThreadPool thread.
+
+    A search is a list of items (e.g. pairs of Pokemon) and a function computing
+    the evolines of a single item (or a function evaluating all the items, e.g. in other processes):
+    results are sent back to the GUI thread in chunks, so that they can be displayed while the search goes on.
+    """
+
+    """ Maximum time (seconds) results are kept before sending them as a chunk """
+    CHUNK_INTERVAL: float = 0.1
+
+    def __init__(self,
+                 generation: int,
+                 items: Callable[[], Sequence],
+                 compute: Callable[[object], List[List[FusedPokemon]]] = None,
+                 evaluate: Callable[[Sequence], Iterable[Tuple[object, List[List[FusedPokemon]]]]] = None):
+        """
+        :param generation: Identifier of the search, sent with every signal.
+        :param items: Function returning the items to process (called in the worker thread).
+        :param compute: Function returning the evolines of one item (called in the worker thread).
+        :param evaluate: Used instead of compute: function yielding (item, evolines) for every item,
+                         in order (called in the worker thread, the iteration stops if the search is cancelled).
+        """
+        super().__init__()
+        assert (compute is None) != (evaluate is None), 'Either compute or evaluate is needed'
+        self.generation = generation
+        self.signals = SearchSignals()
+        self._items = items
+        self._evaluate = evaluate or (lambda items: ((item, compute(item)) for item in items))
+        self._cancelled = False
+
+    def cancel(self):
+        """ Stops the search as soon as the current item is processed """
+        self._cancelled = True
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    @tracing.traced(category=tracing.GUI)
+    def run(self):
+        results = None
+        try:
+            items = self._items()
+            total = len(items)
+            self.signals.progress.emit(self.generation, 0, total)
+
+            chunk = []
+            last_emit = time.monotonic()
+            results = iter(self._evaluate(items))
+            for done, result in enumerate(results, start=1):
+                if self._cancelled:
+                    return
+                chunk.append(result)
+                if time.monotonic() - last_emit >= self.CHUNK_INTERVAL or done == total:
+                    self.signals.chunk.emit(self.generation, chunk)
+                    self.signals.progress.emit(self.generation, done, total)
+                    chunk = []
+                    last_emit = time.monotonic()
+        except Exception as e:
+            logging.error(traceback.format_exc())
+            self.signals.failed.emit(self.generation, str(e))
+        finally:
+            if hasattr(results, 'close'):
+                # Stop generators right away (e.g. drop the work queued in other processes)
+                results.close()
+            self.signals.finished.emit(self.generation)
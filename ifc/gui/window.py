@@ -1,12 +1,15 @@
 import logging
 import os
+from typing import Callable, Optional
 
-import requests
-from PyQt6.QtGui import QIcon
-from PyQt6.QtWidgets import QMainWindow, QTabWidget
+from PyQt6.QtCore import QTimer, QUrl
+from PyQt6.QtGui import QIcon, QKeySequence, QShortcut
+from PyQt6.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply
+from PyQt6.QtWidgets import QMainWindow, QTabWidget, QApplication, QWidget, QVBoxLayout
 
-from data import utils
-from gui.dialog import UpdateDialog
+from data import pokedex, utils, sprites, telemetry, updates
+from gui.dex_watcher import DexWatcher
+from gui.dialog import DiagnosticsDialog, UpdateDialog
 
 from gui.tabs.batch import BatchTab
 from gui.tabs.single import SingleTab
@@ -18,6 +21,37 @@ from ifc import RESOURCES_PATH
 #       ? Check if single species evolution stop is possible (THIS CHANGES EVERYTHING, MIGHT NOT IMPLEMENT)
 
 
+class LazyTab(QWidget):
+    """
+    Placeholder of a tab: the actual tab is only built the first time it is shown,
+    so tabs the user never opens cost nothing at startup.
+    """
+
+    def __init__(self, factory: Callable[[], QWidget], parent=None):
+        super().__init__(parent)
+        self._factory = factory
+        self._tab: Optional[QWidget] = None
+        self.layout = QVBoxLayout()
+        self.layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(self.layout)
+
+    @property
+    def tab(self) -> Optional[QWidget]:
+        """ The actual tab, None if it was not built yet """
+        return self._tab
+
+    def build(self) -> QWidget:
+        """ Builds the actual tab (only the first time) and returns it """
+        if self._tab is None:
+            self._tab = self._factory()
+            self.layout.addWidget(self._tab)
+        return self._tab
+
+    def showEvent(self, event):
+        self.build()
+        super().showEvent(event)
+
+
 class IFCWindow(QMainWindow):
 
     """
@@ -40,32 +74,86 @@ class IFCWindow(QMainWindow):
         # Init logging
         logging.basicConfig(level=logging.INFO)
 
+        # Save the sprite cache index and manifest when the app is closed
+        QApplication.instance().aboutToQuit.connect(sprites.get_cache().flush)
+        QApplication.instance().aboutToQuit.connect(sprites.get_manifest().flush)
+        # And the sprite telemetry, if IFC_TELEMETRY is set
+        QApplication.instance().aboutToQuit.connect(telemetry.save_on_exit)
+
         # Set title, size and pos
         self.setWindowTitle(utils.TITLE)
         self.setWindowIcon(QIcon(os.path.join(RESOURCES_PATH, 'icon.ico')))
         self.setFixedWidth(self.WIDTH)
         self.setFixedHeight(self.HEIGHT)
 
-        # Define container layout and the tabs widget
+        # Define container layout and the tabs widget,
+        # tabs are built the first time they are opened
         self.tabs = QTabWidget()
-        self.tabs.addTab(SingleTab(), "Single")
-        self.tabs.addTab(BatchTab(), "Batch")
-        self.tabs.addTab(TypeTab(), "Type")
+        self.tabs.addTab(LazyTab(SingleTab), "Single")
+        self.tabs.addTab(LazyTab(BatchTab), "Batch")
+        self.tabs.addTab(LazyTab(TypeTab), "Type")
 
         # And add them to the window
         self.setCentralWidget(self.tabs)
 
+        # Reload the pokedex when its csv is edited, and tell the tabs that were built
+        self.dex_watcher = DexWatcher(self)
+        self.dex_watcher.changed.connect(self.on_pokedex_changed)
+
+        # Hidden diagnostics view of the sprite loading
+        QShortcut(QKeySequence('Ctrl+Shift+D'), self, activated=self.show_diagnostics)
+
         # Now show it
         self.show()
 
-        latest_release_response = \
-            requests.get("https://api.github.com/repos/vittoema96/InfiniteFusionCalculator/releases/latest")
-        assert latest_release_response.status_code == 200, "Could not find InfiniteFusionCalculator latest release"
-        latest_version = latest_release_response.json()['name']
-        parts = [int(p) for p in latest_version.split(".")]
-        latest_major = parts[0]
-        latest_minor = parts[1]
-        latest_patch = parts[2] if len(parts) > 2 else 0
-        if latest_major > utils.MAJOR or latest_minor > utils.MINOR or latest_patch > utils.PATCH:
-            UpdateDialog(latest_version).exec()
+        # Look for updates once the event loop is running, without blocking the window
+        self.nam = QNetworkAccessManager()
+        QTimer.singleShot(0, self.check_for_updates)
+
+    def check_for_updates(self):
+        """
+        Shows an UpdateDialog if a newer release exists.
+        The latest release is asked to GitHub asynchronously (and at most once
+        every updates.CHECK_INTERVAL): if GitHub can't be reached the check is just skipped.
+        """
+        latest_version = updates.get_cached_release()
+        if latest_version is not None:
+            self._notify_update(latest_version)
+            return
+        if sprites.get_cache().offline:
+            return
+
+        request = QNetworkRequest(QUrl(updates.LATEST_RELEASE_URL))
+        request.setTransferTimeout(updates.TIMEOUT_MS)
+        reply = self.nam.get(request)
+        reply.finished.connect(lambda: self._on_release_reply(reply))
+
+    def _on_release_reply(self, reply: QNetworkReply):
+        try:
+            if reply.error() != QNetworkReply.NetworkError.NoError:
+                logging.warning(f"Could not check for updates: {reply.errorString()}")
+                return
+            try:
+                latest_version = updates.parse_release(reply.readAll().data())
+            except (ValueError, KeyError, TypeError) as e:
+                logging.warning(f"Could not check for updates, unexpected release: {e}")
+                return
+            updates.save_release(latest_version)
+            self._notify_update(latest_version)
+        finally:
+            reply.deleteLater()
+
+    def on_pokedex_changed(self, change: pokedex.DexChange):
+        # Tabs that were never opened will be built with the new pokedex
+        for index in range(self.tabs.count()):
+            tab = self.tabs.widget(index).tab
+            if tab is not None:
+                tab.on_pokedex_changed(change)
+
+    def show_diagnostics(self):
+        DiagnosticsDialog(self).exec()
+
+    def _notify_update(self, latest_version: str):
+        if updates.is_newer(latest_version):
+            UpdateDialog(latest_version, self).exec()
 
@@ -1,14 +1,34 @@
-from PyQt6.QtWidgets import QApplication
+from ifc import startup  # first, so that the startup report includes the other imports
 
-from ifc.gui.window import IFCWindow
+import multiprocessing
+
+
+def _report_startup():
+    startup.mark('first paint')
+    startup.report()
 
 
 def main():
+    # Imported here: the worker processes of big batches (see data.parallel) import this module
+    # again when they start, they must not load PyQt and the GUI modules
+    from PyQt6.QtCore import QTimer
+    from PyQt6.QtWidgets import QApplication
+
+    from ifc.gui.window import IFCWindow
+
+    startup.mark('imports')
+
     app = QApplication([])
+    startup.mark('qt')
     window = IFCWindow()
     window.show()
+    startup.mark('window')
+    # Runs as soon as the event loop is running, after the window has been shown
+    QTimer.singleShot(0, _report_startup)
     app.exec()
 
 
 if __name__ == '__main__':
+    # Needed by the worker processes of big batches (see data.parallel) in the frozen .exe
+    multiprocessing.freeze_support()
     main()
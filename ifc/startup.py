@@ -0,0 +1,54 @@
+"""
+Startup timing report.
+main() marks the end of every startup phase, then the report is logged
+once the event loop is running (the window has been shown).
+Set IFC_STARTUP_REPORT to a file path to also save the report as JSON.
+"""
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Tuple
+
+""" Startup time (seconds) above which the report is logged as a warning """
+BUDGET: float = 1.0
+
+# Times are measured from the import of this module, main.py imports it before anything else
+_start: float = time.perf_counter()
+_marks: List[Tuple[str, float]] = []
+
+
+def mark(phase: str) -> None:
+    """
+    Marks the end of a startup phase (the phase started at the previous mark)
+    """
+    _marks.append((phase, time.perf_counter()))
+
+
+def report() -> Dict[str, float]:
+    """
+    Logs (and saves, if IFC_STARTUP_REPORT is set) the duration of every phase.
+
+    :return: phase -> milliseconds, plus 'total'.
+    """
+    durations = dict()
+    previous = _start
+    for phase, at in _marks:
+        durations[phase] = round((at - previous) * 1000, 1)
+        previous = at
+    durations['total'] = round((previous - _start) * 1000, 1)
+
+    summary = ', '.join(f"{phase} {ms:.0f}ms" for phase, ms in durations.items())
+    if durations['total'] > BUDGET * 1000:
+        logging.warning(f"Startup over budget ({BUDGET * 1000:.0f}ms): {summary}")
+    else:
+        logging.info(f"Startup: {summary}")
+
+    path = os.environ.get('IFC_STARTUP_REPORT')
+    if path:
+        try:
+            with open(path, 'w') as f:
+                json.dump({'budget_ms': BUDGET * 1000, 'phases_ms': durations}, f, indent=2)
+        except OSError as e:
+            logging.warning(f"Could not save the startup report to '{path}': {e}")
+    return durations
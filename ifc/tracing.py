@@ -0,0 +1,162 @@
+"""
+Lightweight tracing: named spans measuring where the time goes.
+Tracing is off by default (spans then cost a flag check), it is enabled by setting
+IFC_TRACE to the path of the trace file, or with the --trace option of the cli.
+
+The trace is saved on exit in the Chrome trace-event format (open it with
+chrome://tracing or https://ui.perfetto.dev), and a summary of the time
+spent in each span is printed to stderr.
+"""
+import atexit
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+""" Categories used by the spans of the app """
+DATA: str = 'data'
+GUI: str = 'gui'
+NETWORK: str = 'network'
+
+_path: Optional[str] = None
+_events: List[Dict] = []
+_lock = threading.Lock()
+# Timestamps are microseconds since this module was imported
+_origin: float = time.perf_counter()
+
+
+def is_enabled() -> bool:
+    return _path is not None
+
+
+def enable(path: str) -> None:
+    """
+    Starts recording spans, they are saved to path (and summarized) on exit
+    """
+    global _path
+    if _path is None:
+        atexit.register(_on_exit)
+    _path = path
+
+
+def now() -> float:
+    """
+    Returns the current time in the clock of the trace (microseconds), see record
+    """
+    return (time.perf_counter() - _origin) * 1e6
+
+
+def record(name: str, category: str, start: float, end: float = None, **args) -> None:
+    """
+    Records a span that was measured by hand (e.g. a network wait started and finished by callbacks)
+
+    :param start: Start of the span, as returned by now().
+    :param end: End of the span, now() if None.
+    :param args: Details shown with the span.
+    """
+    if _path is None:
+        return
+    end = now() if end is None else end
+    event = {'name': name, 'cat': category, 'ph': 'X', 'ts': start, 'dur': end - start,
+             'pid': os.getpid(), 'tid': threading.get_ident()}
+    if args:
+        event['args'] = {key: str(value) for key, value in args.items()}
+    with _lock:
+        _events.append(event)
+
+
+@contextmanager
+def _span(name: str, category: str, args: Dict) -> Iterator[None]:
+    start = now()
+    try:
+        yield
+    finally:
+        record(name, category, start, **args)
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, category: str = DATA, **args):
+    """
+    Context manager recording the time spent inside it (does nothing if tracing is disabled)
+    """
+    if _path is None:
+        return _NO_SPAN
+    return _span(name, category, args)
+
+
+def traced(name: str = None, category: str = DATA):
+    """
+    Decorator recording a span for every call of the function
+
+    :param name: Name of the span, the qualified name of the function if None.
+    """
+    def decorator(function: Callable) -> Callable:
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _path is None:
+                return function(*args, **kwargs)
+            with _span(span_name, category, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summary() -> Dict[str, Dict[str, float]]:
+    """
+    Returns, for each span name: number of calls, total, mean and max duration (milliseconds)
+    """
+    durations = defaultdict(list)
+    with _lock:
+        for event in _events:
+            durations[event['name']].append(event['dur'] / 1000)
+    return {
+        name: {'count': len(values), 'total': sum(values), 'mean': sum(values) / len(values), 'max': max(values)}
+        for name, values in durations.items()
+    }
+
+
+def save(path: str) -> None:
+    """
+    Saves the spans recorded so far as a Chrome trace-event file
+    """
+    with _lock:
+        events = list(_events)
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def format_summary(spans: Dict[str, Dict[str, float]]) -> str:
+    lines = [f"{'span':<45} {'count':>8} {'total ms':>10} {'mean ms':>9} {'max ms':>9}"]
+    for name, s in sorted(spans.items(), key=lambda item: -item[1]['total']):
+        lines.append(f"{name:<45} {s['count']:>8} {s['total']:>10.1f} {s['mean']:>9.3f} {s['max']:>9.1f}")
+    return '\n'.join(lines)
+
+
+def _on_exit() -> None:
+    try:
+        save(_path)
+    except OSError as e:
+        logging.warning(f"Could not save the trace to '{_path}': {e}")
+    print(f"Trace saved to '{_path}'\n{format_summary(summary())}", file=sys.stderr)
+
+
+if os.environ.get('IFC_TRACE'):
+    enable(os.environ['IFC_TRACE'])
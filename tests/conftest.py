@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT_PATH, 'ifc')
+
+# The modules of the app import each other as top-level packages (e.g. 'from data import ...')
+for _path in (ROOT_PATH, APP_PATH):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+# Keep the sprites and cached tables of the tests away from the user's cache (read when ifc is imported)
+os.environ.setdefault('IFC_CACHE_PATH', tempfile.mkdtemp(prefix='ifc-tests-'))
+# GUI tests need no display
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
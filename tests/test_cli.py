@@ -0,0 +1,104 @@
+import csv
+import io
+import json
+import os
+import re
+import shlex
+
+import numpy as np
+import pytest
+
+from data import export
+from ifc import cli
+from tests.conftest import ROOT_PATH
+
+
+def _documented_calls():
+    """
+    Returns the command line calls shown in the docstring of ifc.cli and in the README
+    """
+    with open(os.path.join(ROOT_PATH, 'README.md'), encoding='utf-8') as f:
+        readme = f.read()
+    calls = re.findall(r'^\s*python -m ifc\.cli (.+)$', cli.__doc__, re.MULTILINE)
+    calls += re.findall(r'`python -m ifc\.cli ([^`]+)`', readme)
+    return [call for call in calls if call != '--help']
+
+
+def _run(capsys, argv):
+    assert cli.main(argv) == 0
+    return capsys.readouterr().out
+
+
+def test_documented_calls_are_accepted():
+    calls = _documented_calls()
+    assert any('--format csv' in call for call in calls)
+    assert any('--workers' in call for call in calls)
+    assert any('--trace' in call for call in calls)
+    parser = cli.build_parser()
+    for call in calls:
+        parser.parse_args(shlex.split(call))
+
+
+@pytest.mark.parametrize('option', ['--format csv', '--trace trace.json'])
+@pytest.mark.parametrize('command', ['single fearow ekans', 'batch bulbasaur charmander', 'type FIRE WATER',
+                                     'export'])
+def test_common_options_follow_every_command(command, option):
+    args = cli.build_parser().parse_args(shlex.split(f'{command} {option}'))
+    name, value = option.split()
+    assert str(getattr(args, name.lstrip('-'))) == value
+
+
+@pytest.mark.parametrize('command', ['batch bulbasaur charmander', 'type FIRE WATER'])
+def test_workers_follow_the_pair_commands(command):
+    assert cli.build_parser().parse_args(shlex.split(f'{command} --workers 2')).workers == 2
+
+
+@pytest.mark.parametrize('command', ['single fearow ekans', 'export'])
+def test_workers_are_rejected_by_the_other_commands(command):
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(shlex.split(f'{command} --workers 2'))
+
+
+def test_batch_csv(capsys):
+    rows = list(csv.DictReader(io.StringIO(_run(capsys, ['batch', 'bulbasaur', 'charmander', 'squirtle',
+                                                         '--format', 'csv']))))
+    assert rows and tuple(rows[0].keys()) == ('evoline',) + export.FIELDS
+    assert {row['head'] for row in rows} >= {'bulbasaur', 'charmander', 'squirtle'}
+
+
+@pytest.mark.parametrize('output_format', ['ndjson', 'csv'])
+def test_single_typed_fusions_repeat_their_type(capsys, output_format):
+    output = _run(capsys, ['single', 'charmander', 'charmander', '--format', output_format])
+    if output_format == 'csv':
+        records = list(csv.DictReader(io.StringIO(output)))
+    else:
+        records = [json.loads(line) for line in output.splitlines()]
+    assert records
+    assert all(record['type_2'] for record in records)
+    charmander = [record for record in records if record['head'] == record['body'] == 'charmander']
+    assert [(record['type_1'], record['type_2']) for record in charmander] == [('FIRE', 'FIRE')]
+
+
+def test_type_workers_match_a_single_process(capsys):
+    sequential = _run(capsys, ['type', 'FIRE', 'WATER', '--top', '10'])
+    parallel = _run(capsys, ['type', 'FIRE', 'WATER', '--top', '10', '--workers', '2'])
+    assert sequential and parallel == sequential
+    # Whole evolines are written, the first one has a FIRE/WATER fusion
+    first = [json.loads(line) for line in sequential.splitlines() if json.loads(line)['evoline'] == 0]
+    assert any({record['type_1'], record['type_2']} == {'FIRE', 'WATER'} for record in first)
+
+
+def test_columnar_formats_need_export(capsys):
+    with pytest.raises(SystemExit):
+        cli.main(['batch', 'bulbasaur', 'charmander', '--format', 'npz'])
+
+
+@pytest.mark.parametrize('output, written', [('fusions', 'fusions.npz'), ('fusions.parquet', 'fusions.npz'),
+                                             ('fusions.data', 'fusions.data')])
+def test_export_without_pyarrow(tmp_path, monkeypatch, capsys, output, written):
+    monkeypatch.setattr(export, 'has_parquet', lambda: False)
+    _run(capsys, ['export', '--evoline', 'bulbasaur', '--format', 'parquet', '-o', str(tmp_path / output)])
+    assert [path.name for path in tmp_path.iterdir()] == [written]
+    with np.load(tmp_path / written) as arrays:
+        assert tuple(arrays.files) == export.FIELDS
+        assert set(arrays['head']) & {'bulbasaur', 'ivysaur', 'venusaur'}
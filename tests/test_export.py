@@ -0,0 +1,44 @@
+import numpy as np
+
+from data import export, fusion, pokedex
+from data.enums import Type
+
+
+def _rows(chunks):
+    return {column: np.concatenate([chunk[column] for chunk in chunks]) for column in chunks[0]}
+
+
+def test_impossible_fusions_are_left_out():
+    rows = _rows(list(export.iter_chunks()))
+    assert (rows['min_level'] <= rows['max_level']).all()
+    # Same rows as the existing fusions of the table
+    table = fusion.get_table()
+    exists = table.overlapping()
+    assert len(rows['head_id']) == exists.sum()
+    assert (rows['head_id'] == table['head_id'][exists]).all()
+    assert (rows['body_id'] == table['body_id'][exists]).all()
+    # Bulbasaur [1-15] never meets Ivysaur [16-31]
+    bulbasaur, ivysaur = pokedex.get_pokemon(name='bulbasaur').idx, pokedex.get_pokemon(name='ivysaur').idx
+    assert not ((rows['head_id'] == bulbasaur) & (rows['body_id'] == ivysaur)).any()
+
+
+def test_filters():
+    evoline_id = pokedex.get_pokemon(name='charmander').raw_evoline[0]
+    members = set(pokedex.get_evoline_members(evoline_id))
+    rows = _rows(list(export.iter_chunks([Type.FIRE], [evoline_id], chunk_rows=1000)))
+    fire = fusion.type_code(Type.FIRE)
+    assert len(rows['head_id'])
+    assert ((rows['type_1'] == fire) | (rows['type_2'] == fire)).all()
+    assert all(head in members or body in members
+               for head, body in zip(rows['head_id'].tolist(), rows['body_id'].tolist()))
+
+
+def test_pokedex_without_a_table_exports_the_same_rows(monkeypatch):
+    expected = _rows(list(export.iter_chunks()))
+    # Too big for a table: the fusions are computed block by block (see fusion.compute_blocks)
+    monkeypatch.setattr(fusion, 'MAX_TABLE_SPECIES', 100)
+    chunks = list(export.iter_chunks(chunk_rows=50000))
+    assert len(chunks) > 1
+    rows = _rows(chunks)
+    for column, values in expected.items():
+        assert np.array_equal(rows[column], values), column
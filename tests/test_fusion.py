@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from data import fusion, pokedex
+from data.pokemon import FusedPokemon
+
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    """
+    Path of the cached table of the pokedex, in a temporary folder (the table is loaded again by get_table)
+    """
+    monkeypatch.setattr(fusion, '_cache_path', lambda digest: str(tmp_path / f'{digest[:16]}.fusions.npy'))
+    monkeypatch.setattr(fusion, '_table', None)
+    return fusion._cache_path(pokedex.get_data_digest())
+
+
+def _columns() -> int:
+    return len(fusion.ID_COLUMNS + fusion.COLUMNS)
+
+
+@pytest.mark.parametrize('matrix', [
+    np.zeros((3, 10), dtype=np.int16),
+    np.zeros(_columns(), dtype=np.int16),
+    np.zeros((_columns(), 10), dtype=np.int16),
+    # A valid table of other species
+    np.zeros((_columns(), 4), dtype=np.int16),
+], ids=['rows', 'dimensions', 'not a grid', 'species'])
+def test_invalid_cache_is_recomputed(cache_path, matrix):
+    np.save(cache_path, matrix)
+    _check_recomputed(cache_path)
+
+
+def test_unreadable_cache_is_recomputed(cache_path):
+    with open(cache_path, 'wb') as f:
+        f.write(b'not a numpy file')
+    _check_recomputed(cache_path)
+
+
+def _check_recomputed(cache_path: str):
+    expected = fusion.compute()
+    table = fusion.get_table()
+    assert table.heads.tolist() == pokedex.get_ids()
+    for column in fusion.COLUMNS:
+        assert np.array_equal(table[column], expected[column])
+    # The cache was replaced with the right table
+    assert np.load(cache_path).shape == (_columns(), len(pokedex.get_ids()) ** 2)
+
+
+def test_ids_too_big_for_the_cache_raise(tmp_path):
+    table = fusion.compute([1], [1])
+    table = fusion.FusionTable(np.array([40000]), table.bodies,
+                               {column: table[column] for column in fusion.ID_COLUMNS + fusion.COLUMNS})
+    with pytest.raises(ValueError):
+        fusion._save_matrix(table, str(tmp_path / 'table.npy'))
+
+
+def _sample_ids(count: int, seed: int) -> list:
+    ids = pokedex.get_ids()
+    return sorted(np.random.default_rng(seed).choice(ids, size=min(count, len(ids)), replace=False).tolist())
+
+
+def _check_fusions(columns, rows=None):
+    """
+    Checks that the given rows of the columns of a FusionTable (or FusionRows) match FusedPokemon
+    """
+    rows = range(len(columns['head_id'])) if rows is None else rows
+    for row in rows:
+        head_id, body_id = int(columns['head_id'][row]), int(columns['body_id'][row])
+        fused = FusedPokemon(pokedex.get_pokemon(head_id), pokedex.get_pokemon(body_id))
+        expected = [getattr(fused, stat) for stat in fusion.STATS] + [fused.total, fused.min_level, fused.max_level]
+        actual = [columns[column][row] for column in fusion.STATS + ('total', 'min_level', 'max_level')]
+        assert actual == expected, f'{fused.name}'
+        assert [fusion.TYPES[columns['type_1'][row]].name, fusion.TYPES[columns['type_2'][row]].name] == \
+               [t.name for t in fused.types], f'{fused.name}'
+
+
+def test_compute_matches_fused_pokemon():
+    heads, bodies = _sample_ids(25, seed=1), _sample_ids(25, seed=2)
+    table = fusion.compute(heads, bodies)
+    assert len(table) == len(heads) * len(bodies)
+    assert table['head_id'].tolist() == [head for head in heads for _ in bodies]
+    assert table['body_id'].tolist() == bodies * len(heads)
+    _check_fusions(table)
+
+
+def test_table_matches_fused_pokemon():
+    heads, bodies = _sample_ids(20, seed=3), _sample_ids(20, seed=4)
+    table = fusion.get_table()
+    _check_fusions(table, table.rows(heads, bodies).ravel())
+
+
+def test_compute_pairs_matches_fused_pokemon():
+    heads, bodies = _sample_ids(200, seed=5), _sample_ids(200, seed=6)[::-1]
+    rows = fusion.compute_pairs(heads, bodies)
+    assert len(rows) == len(heads)
+    assert rows.columns['head_id'].tolist() == heads and rows.columns['body_id'].tolist() == bodies
+    _check_fusions(rows.columns)
+    assert len(fusion.compute_pairs([], [])) == 0
+
+
+def test_blocks_above_the_table_limit_match_fused_pokemon(monkeypatch):
+    # The pokedex is too big for a table: the fusions are computed in blocks (see export._table_chunks)
+    monkeypatch.setattr(fusion, 'MAX_TABLE_SPECIES', 100)
+    assert not fusion.has_table()
+    with pytest.raises(ValueError):
+        fusion.get_table()
+
+    heads, bodies = _sample_ids(30, seed=7), _sample_ids(30, seed=8)
+    blocks = list(fusion.compute_blocks(heads, bodies, block_rows=100))
+    assert len(blocks) == 10
+    assert sum(len(block) for block in blocks) == len(heads) * len(bodies)
+    assert np.concatenate([block['head_id'] for block in blocks]).tolist() == [head for head in heads for _ in bodies]
+    for block in blocks:
+        _check_fusions(block)
@@ -0,0 +1,89 @@
+import threading
+
+from data import pokedex
+from data.memo import FusionMemo
+
+
+def _pokemons(*names):
+    return [pokedex.get_pokemon(name=name) for name in names]
+
+
+def test_capacity_and_eviction_order():
+    bulbasaur, charmander, squirtle, pikachu = _pokemons('bulbasaur', 'charmander', 'squirtle', 'pikachu')
+    memo = FusionMemo(max_fusions=3)
+    first = memo.fuse(bulbasaur, charmander)
+    memo.fuse(charmander, squirtle)
+    memo.fuse(squirtle, pikachu)
+    # Used again: the least recently used one is now charmander/squirtle
+    assert memo.fuse(bulbasaur, charmander) is first
+    memo.fuse(pikachu, bulbasaur)
+
+    assert len(memo) == 3
+    assert memo.fuse(bulbasaur, charmander) is first
+    stats = memo.stats()
+    memo.fuse(charmander, squirtle)
+    assert memo.stats()['misses'] == stats['misses'] + 1
+    # Head and body are not interchangeable
+    assert memo.fuse(charmander, bulbasaur) is not first
+
+
+def test_stats():
+    bulbasaur, charmander = _pokemons('bulbasaur', 'charmander')
+    memo = FusionMemo(max_fusions=10)
+    assert memo.stats() == {'hits': 0, 'misses': 0, 'hit_rate': None, 'size': 0, 'max_size': 10}
+    for _ in range(3):
+        memo.fuse(bulbasaur, charmander)
+    memo.fuse(charmander, bulbasaur)
+    assert memo.stats() == {'hits': 2, 'misses': 2, 'hit_rate': 0.5, 'size': 2, 'max_size': 10}
+
+    memo.clear()
+    assert memo.stats() == {'hits': 0, 'misses': 0, 'hit_rate': None, 'size': 0, 'max_size': 10}
+
+
+def test_forget():
+    bulbasaur, charmander, squirtle = _pokemons('bulbasaur', 'charmander', 'squirtle')
+    memo = FusionMemo()
+    memo.fuse(bulbasaur, charmander)
+    memo.fuse(squirtle, bulbasaur)
+    kept = memo.fuse(charmander, squirtle)
+
+    memo.forget([bulbasaur.idx])
+    assert len(memo) == 1
+    assert memo.fuse(charmander, squirtle) is kept
+
+
+def test_threads_share_the_memo():
+    pokemons = [pokedex.get_pokemon(idx) for idx in pokedex.get_ids()[:12]]
+    pairs = [(head, body) for head in pokemons for body in pokemons]
+    threads_count, rounds = 8, 5
+    errors = []
+
+    def fuse_all(memo, barrier, results):
+        try:
+            barrier.wait()
+            for _ in range(rounds):
+                for head, body in pairs:
+                    fusion = memo.fuse(head, body)
+                    assert (fusion.head_id, fusion.body_id) == (head.idx, body.idx)
+                    results.append(fusion)
+        except Exception as e:
+            errors.append(e)
+
+    for max_fusions in (len(pairs), 50):
+        memo = FusionMemo(max_fusions=max_fusions)
+        barrier = threading.Barrier(threads_count)
+        results = []
+        threads = [threading.Thread(target=fuse_all, args=(memo, barrier, results)) for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert not errors
+        assert len(results) == threads_count * rounds * len(pairs)
+        stats = memo.stats()
+        assert stats['hits'] + stats['misses'] == len(results)
+        assert len(memo) == min(max_fusions, len(pairs))
+        if max_fusions == len(pairs):
+            # Nothing is evicted: a fusion is built at most once per thread that raced for it
+            assert stats['misses'] <= threads_count * len(pairs)
@@ -0,0 +1,68 @@
+import pytest
+
+from data import memo, parallel, pokedex, utils
+from data.fusion import STATS, TYPES, FusionRows
+
+
+def _pairs(count):
+    names = pokedex.get_names()[:count]
+    return utils.get_batch_pairs(names + names[:3])
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """
+    Evaluates batches of every size with the pool of worker processes
+    """
+    monkeypatch.setattr(parallel, 'MIN_PARALLEL_PAIRS', 0)
+    yield
+    parallel.close()
+
+
+@pytest.mark.parametrize('display_ba', [True, False])
+def test_same_evolines_of_get_evolines(display_ba):
+    pairs = _pairs(40)
+    results = list(parallel.evaluate_pairs(pairs, workers=1, display_ba=display_ba))
+    assert [pair for pair, _ in results] == pairs
+    for pair, evolines in results:
+        assert all(isinstance(evoline, FusionRows) for evoline in evolines)
+        assert [list(evoline) for evoline in evolines] == utils.get_evolines(*pair, display_ba=display_ba)
+
+
+def test_columns_match_the_fusions():
+    for _, evolines in parallel.evaluate_pairs(_pairs(20), workers=1):
+        for evoline in evolines:
+            columns = evoline.columns
+            assert evoline.sprite_urls() == [fusion.get_sprite_url() for fusion in evoline]
+            for row, fusion in enumerate(evoline):
+                assert (columns['head_id'][row], columns['body_id'][row]) == (fusion.head_id, fusion.body_id)
+                assert [columns[stat][row] for stat in STATS] == [getattr(fusion, stat) for stat in STATS]
+                assert columns['total'][row] == fusion.total
+                assert [TYPES[columns['type_1'][row]].name, TYPES[columns['type_2'][row]].name] == \
+                       [t.name for t in fusion.types]
+                assert (columns['min_level'][row], columns['max_level'][row]) == (fusion.min_level, fusion.max_level)
+
+
+def test_fusions_are_built_when_accessed():
+    memo.get_memo().clear()
+    results = list(parallel.evaluate_pairs(_pairs(20), workers=1))
+    for _, evolines in results:
+        for evoline in evolines:
+            evoline.sprite_urls()
+    assert len(memo.get_memo()) == 0
+
+    evoline = results[0][1][0]
+    assert evoline[-1] is evoline[len(evoline) - 1]
+    assert len(memo.get_memo()) == 1
+    with pytest.raises(IndexError):
+        evoline[len(evoline)]
+
+
+def test_pool_matches_the_calling_process(pool):
+    pairs = _pairs(60)
+    assert len(pairs) > 2 * parallel.SHARD_SIZE
+    sequential = [(pair, [list(evoline) for evoline in evolines])
+                  for pair, evolines in parallel.evaluate_pairs(pairs, workers=1)]
+    pooled = [(pair, [list(evoline) for evoline in evolines])
+              for pair, evolines in parallel.evaluate_pairs(pairs, workers=2)]
+    assert pooled == sequential
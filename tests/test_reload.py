@@ -0,0 +1,147 @@
+import os
+
+import numpy as np
+import pytest
+
+from data import fusion, memo, pokedex, search, segments
+from data.enums import Type
+
+""" Evoline of charmander, whose HP are edited by the tests """
+CHARMANDER = 4
+""" A new single-member, dual-typed species """
+NEW_ID = 1000
+NEW_ROW = f'{NEW_ID},testmon,1,100,[{NEW_ID}],"[""FIRE"", ""WATER""]",100,120,90,110,95,105\n'
+""" Module variables of pokedex built by load """
+POKEDEX_STATE = ('_rows', '_pokemons', '_ids_by_name', '_evolines',
+                 '_evolines_by_slot', '_evolines_by_typing', '_evoline_graph')
+""" Searches compared between the hot and the cold load """
+SEARCHES = [(Type.FIRE, Type.WATER, 'total'), (Type.FIRE, Type.ANY, 'hp'), (Type.ANY, Type.FLYING, 'speed')]
+
+
+@pytest.fixture
+def dex(tmp_path, monkeypatch):
+    """
+    Records the changes of the loads done by a test (the list it returns).
+    The pokedex, and what was built from it, is put back as it was afterwards.
+    """
+    # Loads replace these objects (they never change them): restoring them restores the pokedex
+    for name in ('_data_path', '_data_digest') + POKEDEX_STATE:
+        monkeypatch.setattr(pokedex, name, getattr(pokedex, name))
+    monkeypatch.setattr(fusion, '_species', fusion._species)
+    # The tests start from new tables and memo: the listeners don't update the ones of the app
+    monkeypatch.setattr(fusion, '_table', None)
+    monkeypatch.setattr(segments, '_table', None)
+    monkeypatch.setattr(memo, '_memo', None)
+    # The cached tables of the edited pokedexes are kept in the temporary folder
+    monkeypatch.setattr(fusion, '_cache_path', lambda digest: str(tmp_path / f'{digest[:16]}.fusions.npy'))
+    changes = []
+    monkeypatch.setattr(pokedex, '_listeners', pokedex._listeners + [changes.append])
+    return changes
+
+
+def _write_edited(path, add: bool = False):
+    """
+    Writes a copy of the pokedex with 100 more HP for charmander, and NEW_ROW if add
+    """
+    with open(pokedex.get_data_path()) as f:
+        lines = f.readlines()
+    for i, line in enumerate(lines):
+        if line.startswith(f'{CHARMANDER},charmander,'):
+            values = line.rstrip('\n').split(',')
+            values[-6] = str(int(values[-6]) + 100)
+            lines[i] = ','.join(values) + '\n'
+    if add:
+        lines.append(NEW_ROW)
+    with open(path, 'w') as f:
+        f.writelines(lines)
+    return str(path)
+
+
+def _cold_load(path: str):
+    """
+    Loads the csv at path as if the app just started: nothing of the current pokedex is reused
+    """
+    for name in POKEDEX_STATE:
+        setattr(pokedex, name, dict())
+    fusion._table = segments._table = memo._memo = None
+    # Not the table updated by the hot load
+    os.remove(fusion._cache_path(pokedex.get_data_digest()))
+    pokedex.load(path)
+
+
+def _indexes() -> dict:
+    """
+    Returns the evoline indexes of the pokedex (in their order)
+    """
+    return {'evolines': dict(pokedex._evolines),
+            'evoline_graph': {idx: (evoline.member_ids, evoline.intervals,
+                                    [[member.idx for member in stage] for stage in evoline.stages])
+                              for idx, evoline in pokedex._evoline_graph.items()},
+            'by_slot': {key: list(ids) for key, ids in pokedex._evolines_by_slot.items()},
+            'by_typing': {key: list(ids) for key, ids in pokedex._evolines_by_typing.items()}}
+
+
+def _table() -> dict:
+    table = fusion.get_table()
+    return {column: np.array(table[column]) for column in fusion.ID_COLUMNS + fusion.COLUMNS}
+
+
+def _searches() -> list:
+    return [[(result.value, result.head.name, result.body.name)
+             for result in search.search_by_type(type_a, type_b, sort_by=sort_by)]
+            for type_a, type_b, sort_by in SEARCHES]
+
+
+def _check_cold_load(path: str):
+    """
+    Checks that the pokedex, its fusion table and the searches are the same after loading path from scratch
+    """
+    hot = _indexes(), _table(), _searches()
+    _cold_load(path)
+    indexes, table, searches = hot
+    assert _indexes() == indexes
+    cold_table = _table()
+    assert cold_table.keys() == table.keys()
+    for column, values in table.items():
+        assert np.array_equal(cold_table[column], values), column
+    assert _searches() == searches
+
+
+def test_reload_of_a_changed_stat(dex, tmp_path):
+    fusion.get_table()
+    segments.get_segments(CHARMANDER, CHARMANDER)
+    path = _write_edited(tmp_path / 'data.csv')
+
+    change = pokedex.load(path)
+
+    assert change == pokedex.DexChange(added=frozenset(), removed=frozenset(),
+                                       changed=frozenset({CHARMANDER}), evolines=frozenset({CHARMANDER}))
+    assert dex == [change]
+    assert pokedex.get_pokemon(name='charmander').hp == 139
+    # Same species: the table was updated in place of being recomputed
+    assert fusion._table is not None
+    _check_cold_load(path)
+
+
+def test_reload_of_a_changed_stat_and_a_new_species(dex, tmp_path):
+    fusion.get_table()
+    search.search_by_type(Type.FIRE, Type.WATER)
+    path = _write_edited(tmp_path / 'data.csv', add=True)
+
+    change = pokedex.load(path)
+
+    assert change == pokedex.DexChange(added=frozenset({NEW_ID}), removed=frozenset(),
+                                       changed=frozenset({CHARMANDER}),
+                                       evolines=frozenset({CHARMANDER, NEW_ID}))
+    assert dex == [change]
+    assert NEW_ID in pokedex._evolines_by_typing['FIRE', 'WATER']
+    assert ('testmon', 'testmon') in [(result.head.name, result.body.name)
+                                      for result in search.search_by_type(Type.FIRE, Type.WATER)]
+    _check_cold_load(path)
+
+
+def test_reload_of_the_same_csv_notifies_nobody(dex):
+    change = pokedex.load()
+
+    assert not change
+    assert dex == []
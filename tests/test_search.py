@@ -0,0 +1,148 @@
+import functools
+
+import pytest
+
+from data import pokedex, search, utils
+from data.enums import Type
+
+
+@pytest.fixture(scope='module')
+def app():
+    from PyQt6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+
+@functools.lru_cache(maxsize=None)
+def _fusions(head_evoline: int, body_evoline: int):
+    return utils.get_fusions(pokedex.get_pokemon(head_evoline).name, pokedex.get_pokemon(body_evoline).name)[0]
+
+
+def _brute_force(type_a, type_b, based_on=None, sort_by='total', min_level=None, max_level=None):
+    """
+    The Type search as the Type tab used to do it: every head evoline x body evoline pair that can
+    give a type_a/type_b fusion, with the best sort_by among those fusions.
+    Returns (value, head, body) tuples, highest value first, ties in pokedex order.
+    """
+    if based_on is not None:
+        based_on_evoline = [based_on.raw_evoline[0]]
+        if len(based_on.types) > 1:
+            if based_on.types[0] == type_a:
+                type_a_heads, type_a_bodies = based_on_evoline, []
+            else:
+                type_a_heads, type_a_bodies = [], based_on_evoline
+        else:
+            type_a_heads, type_a_bodies = based_on_evoline, based_on_evoline
+    else:
+        type_a_heads = pokedex.get_evoline_ids_by_type(first_type=type_a)
+        type_a_bodies = pokedex.get_evoline_ids_by_type(second_type=type_a)
+    groups = [(type_a_heads, pokedex.get_evoline_ids_by_type(second_type=type_b)),
+              (pokedex.get_evoline_ids_by_type(first_type=type_b), type_a_bodies)]
+    if based_on is not None and Type.is_any(type_b):
+        groups += [(based_on_evoline, pokedex.get_evoline_ids_by_type(second_type=type_a)),
+                   (type_a_heads, based_on_evoline)]
+
+    best = dict()
+    for heads, bodies in groups:
+        for head in heads:
+            for body in bodies:
+                values = [getattr(fusion, sort_by) for fusion in _fusions(head, body)
+                          if type_a in fusion.types and type_b in fusion.types
+                          and (min_level is None or fusion.max_level >= min_level)
+                          and (max_level is None or fusion.min_level <= max_level)]
+                if values:
+                    best[head, body] = max(values)
+
+    positions = {idx: position for position, idx in enumerate(pokedex.get_ids())}
+    ranked = sorted(best.items(), key=lambda item: (-item[1], positions[item[0][0]], positions[item[0][1]]))
+    return [(value, pokedex.get_pokemon(head).name, pokedex.get_pokemon(body).name)
+            for (head, body), value in ranked]
+
+
+def _search(*args, **kwargs):
+    return [(result.value, result.head.name, result.body.name) for result in search.search_by_type(*args, **kwargs)]
+
+
+@pytest.mark.parametrize('type_a, type_b, based_on, sort_by, levels', [
+    (Type.FIRE, Type.WATER, None, 'total', (None, None)),
+    (Type.ANY, Type.POISON, None, 'total', (None, None)),
+    (Type.GRASS, Type.ANY, None, 'speed', (30, 50)),
+    (Type.FLYING, Type.ANY, None, 'attack', (None, 20)),
+    (Type.FIRE, Type.ANY, 'charmander', 'total', (None, None)),
+    (Type.FLYING, Type.WATER, 'pidgey', 'hp', (None, None)),
+    (Type.POISON, Type.WATER, 'weedle', 'special_attack', (10, None)),
+    (Type.BUG, Type.ANY, 'weedle', 'defense', (None, None)),
+])
+def test_search_by_type_matches_brute_force(type_a, type_b, based_on, sort_by, levels):
+    based_on = pokedex.get_pokemon(name=based_on) if based_on else None
+    expected = _brute_force(type_a, type_b, based_on, sort_by, *levels)
+    assert expected
+    assert _search(type_a, type_b, based_on=based_on, sort_by=sort_by, min_level=levels[0], max_level=levels[1]) \
+        == expected
+
+
+def _tied_k(values):
+    """
+    Returns a k whose last result is tied with the first one left out
+    """
+    return next(k for k in range(1, len(values)) if values[k - 1] == values[k])
+
+
+@pytest.mark.parametrize('sort_by', ['total', 'speed'])
+def test_top_pairs_break_ties_at_k_in_pokedex_order(sort_by):
+    expected = _brute_force(Type.GRASS, Type.ANY, sort_by=sort_by)
+    k = _tied_k([value for value, _, _ in expected])
+    assert _search(Type.GRASS, Type.ANY, sort_by=sort_by, k=k) == expected[:k]
+    assert _search(Type.GRASS, Type.ANY, sort_by=sort_by, k=len(expected) + 10) == expected
+    assert _search(Type.GRASS, Type.ANY, sort_by=sort_by, k=None) == expected
+
+
+def _brute_force_fusions(species, sort_by, type_a=None, type_b=None):
+    """
+    Every fusion having a member of species as head or body (and type_a and type_b, if given),
+    highest sort_by first, ties by head then body in pokedex order
+    """
+    evolines = {pokemon.raw_evoline[0] for pokemon in species}
+    ids = {pokemon.idx for pokemon in species}
+    fusions = {(fusion.head_id, fusion.body_id): fusion
+               for evoline in evolines for other in pokedex.get_evoline_ids_by_type()
+               for fusion in _fusions(evoline, other) + _fusions(other, evoline)
+               if (fusion.head_id in ids or fusion.body_id in ids)
+               and all(t is None or t in fusion.types for t in (type_a, type_b))}
+    positions = {idx: position for position, idx in enumerate(pokedex.get_ids())}
+    return sorted(fusions.values(),
+                  key=lambda fusion: (-getattr(fusion, sort_by), positions[fusion.head_id], positions[fusion.body_id]))
+
+
+@pytest.mark.parametrize('sort_by, type_a, type_b', [('total', None, None), ('attack', Type.FIRE, None),
+                                                     ('hp', Type.FIRE, Type.WATER)])
+def test_top_fusions_match_brute_force(sort_by, type_a, type_b):
+    species = [pokedex.get_pokemon(name=name) for name in ('charmander', 'charmeleon', 'squirtle')]
+    fusions = _brute_force_fusions(species, sort_by, type_a, type_b)
+    assert fusions
+    expected = [fusion.name for fusion in fusions]
+    values = [getattr(fusion, sort_by) for fusion in fusions]
+    ks = [1, len(expected), len(expected) + 5]
+    if len(set(values)) < len(values):
+        ks.append(_tied_k(values))
+    for k in ks:
+        top = search.top_fusions(k, sort_by, type_a=type_a, type_b=type_b, species=species)
+        assert [fusion.name for fusion in top] == expected[:k]
+    assert search.top_fusions(0, sort_by, species=species) == []
+
+
+def test_show_top_0_shows_every_pair(app):
+    from PyQt6.QtCore import QCoreApplication, QThreadPool
+    from gui.tabs.type import TypeTab
+
+    tab = TypeTab()
+    tab.type_a_cbox.setCurrentText('FIRE')
+    tab.type_b_cbox.setCurrentText('WATER')
+    pairs = search.search_by_type(Type.FIRE, Type.WATER)
+    for top, count in ((0, len(pairs)), (3, 3)):
+        tab.show_top_spinbox.setValue(top)
+        assert tab.show_top_spinbox.text() == ('All' if top == 0 else str(top))
+        tab.search()
+        QThreadPool.globalInstance().waitForDone()
+        QCoreApplication.processEvents()
+        evolines = [utils.get_evolines(pair.head.name, pair.body.name, display_ba=False) for pair in pairs[:count]]
+        assert tab.result_model.rowCount() == sum(map(len, evolines))
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from data import pokedex, segments
+
+
+def _brute_force(intervals_a, intervals_b):
+    return [(i, j) for i, (start_a, end_a) in enumerate(intervals_a) for j, (start_b, end_b) in enumerate(intervals_b)
+            if start_a <= end_a and start_b <= end_b and max(start_a, start_b) <= min(end_a, end_b)]
+
+
+@pytest.mark.parametrize('intervals_a, intervals_b, expected', [
+    # Overlapping
+    ([(1, 15), (16, 31), (32, 100)], [(1, 19), (20, 100)], [(0, 0), (1, 0), (1, 1), (2, 1)]),
+    # Touching: both ends are included
+    ([(1, 10), (11, 100)], [(10, 10)], [(0, 0)]),
+    ([(1, 9)], [(10, 20)], []),
+    # Disjoint, on both sides
+    ([(30, 40)], [(1, 10), (50, 60)], []),
+    # Nested, and branched evolutions (windows of a sequence overlapping each other)
+    ([(1, 100)], [(5, 6), (7, 30), (7, 40)], [(0, 0), (0, 1), (0, 2)]),
+    ([(1, 20), (21, 100), (21, 100)], [(1, 30)], [(0, 0), (1, 0), (2, 0)]),
+    # Empty windows overlap nothing
+    ([(16, 15), (20, 30)], [(1, 100)], [(1, 0)]),
+    ([], [(1, 100)], []),
+])
+def test_sweep(intervals_a, intervals_b, expected):
+    assert segments.sweep(intervals_a, intervals_b) == expected
+    assert segments.sweep(intervals_b, intervals_a) == sorted((j, i) for i, j in expected)
+
+
+def test_sweep_matches_brute_force():
+    rng = random.Random(0)
+    for _ in range(500):
+        # About half of them are empty (min_level > max_level)
+        intervals = [(rng.randint(1, 40), rng.randint(1, 40)) for _ in range(rng.randint(0, 12))]
+        split = rng.randint(0, len(intervals))
+        intervals_a = sorted(intervals[:split])
+        intervals_b = sorted(intervals[split:])
+        assert segments.sweep(intervals_a, intervals_b) == _brute_force(intervals_a, intervals_b)
+
+
+def _expected_segments(evoline_a, evoline_b):
+    members_a = [pokedex.get_pokemon(idx) for idx in pokedex.get_evoline(evoline_a).member_ids]
+    members_b = [pokedex.get_pokemon(idx) for idx in pokedex.get_evoline(evoline_b).member_ids]
+    return tuple((a.idx, b.idx) for a in members_a for b in members_b
+                 if max(a.min_level, b.min_level) <= min(a.max_level, b.max_level))
+
+
+def test_segment_table_matches_the_level_windows():
+    table = segments.SegmentTable()
+    evoline_ids = sorted(pokedex.get_evoline_ids_by_type())
+    for evoline_a in evoline_ids[::7]:
+        for evoline_b in evoline_ids[::11]:
+            assert table.get(evoline_a, evoline_b) == _expected_segments(evoline_a, evoline_b)
+
+
+def test_segment_table_update_forgets_the_changed_pairs():
+    table = segments.SegmentTable()
+    bulbasaur = pokedex.get_pokemon(name='bulbasaur').raw_evoline[0]
+    charmander = pokedex.get_pokemon(name='charmander').raw_evoline[0]
+    squirtle = pokedex.get_pokemon(name='squirtle').raw_evoline[0]
+    kept = table.get(charmander, squirtle)
+    forgotten = table.get(bulbasaur, charmander)
+    # Swept once
+    assert table.get(charmander, squirtle) is kept
+
+    table.update([bulbasaur])
+    assert table.get(charmander, squirtle) is kept
+    assert table.get(bulbasaur, charmander) is not forgotten
+    assert table.get(bulbasaur, charmander) == forgotten
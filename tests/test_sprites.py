@@ -0,0 +1,294 @@
+"""
+SpriteCache and the sprite downloads of SpriteService, against a local HTTP server standing in for the sprite hosts
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import pytest
+
+pytest.importorskip('PyQt6')
+
+from PyQt6.QtCore import QBuffer, QByteArray, QCoreApplication, QIODevice  # noqa: E402
+from PyQt6.QtGui import QColor, QImage, QPixmap  # noqa: E402
+from PyQt6.QtWidgets import QApplication  # noqa: E402
+
+from data import sprites  # noqa: E402
+from gui.sprite_service import PRIORITY_PREFETCH, PRIORITY_VISIBLE, SpriteService  # noqa: E402
+
+""" Time (seconds) waited for the downloads of a test """
+TIMEOUT: float = 10
+
+
+class SpriteServer(ThreadingHTTPServer):
+    """
+    Serves files (path -> (data, etag)), answering 304 to a matching If-None-Match, 404 to unknown paths.
+    Every request is recorded as (path, If-None-Match header, status), responses to the paths
+    in delays are sent after that many seconds. The connection is closed without a response
+    for the paths in drops (their status is None).
+    """
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SpriteHandler)
+        self.files: Dict[str, Tuple[bytes, str]] = dict()
+        self.delays: Dict[str, float] = dict()
+        self.drops: Set[str] = set()
+        self.requests: List[Tuple[str, Optional[str], Optional[int]]] = []
+
+    def url(self, path: str) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}{path}'
+
+    def paths(self) -> List[str]:
+        return [path for path, _, _ in self.requests]
+
+
+class _SpriteHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        file = self.server.files.get(self.path)
+        etag = self.headers.get('If-None-Match')
+        if self.path in self.server.drops:
+            self.server.requests.append((self.path, etag, None))
+            self.close_connection = True
+            return
+        status = 404 if file is None else 304 if etag == file[1] else 200
+        self.server.requests.append((self.path, etag, status))
+        time.sleep(self.server.delays.get(self.path, 0))
+        self.send_response(status)
+        if status == 200:
+            self.send_header('ETag', file[1])
+            self.send_header('Content-Length', str(len(file[0])))
+        else:
+            self.send_header('Content-Length', '0')
+        self.end_headers()
+        if status == 200:
+            self.wfile.write(file[0])
+
+    def log_message(self, *args):
+        pass
+
+
+def _png(color: str) -> bytes:
+    image = QImage(8, 8, QImage.Format.Format_RGB32)
+    image.fill(QColor(color))
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, 'PNG')
+    return bytes(data)
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def server():
+    server = SpriteServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """
+    Fresh app-wide sprite cache and manifest (SpriteService uses them through get_cache and get_manifest)
+    """
+    def use_cache(**kwargs) -> sprites.SpriteCache:
+        monkeypatch.setattr(sprites, '_cache', sprites.SpriteCache(str(tmp_path / 'sprites'), **kwargs))
+        return sprites._cache
+
+    monkeypatch.setattr(sprites, '_manifest', sprites.SpriteManifest(str(tmp_path / 'manifest.json')))
+    return use_cache
+
+
+def _wait(service: SpriteService, done: Callable[[], bool]):
+    """
+    Runs the event loop until done() or until the service has nothing left to download
+    """
+    deadline = time.monotonic() + TIMEOUT
+    while not done() and (service._replies or service._waiting.keys()) and time.monotonic() < deadline:
+        QCoreApplication.processEvents()
+        time.sleep(0.001)
+
+
+def _fetch(service: SpriteService, url: str) -> Optional[QPixmap]:
+    """
+    Fetches url and waits for its pixmap, returns None if the sprite could not be loaded
+    """
+    pixmaps = []
+    service.fetch(url, pixmaps.append)
+    _wait(service, lambda: bool(pixmaps))
+    return pixmaps[0] if pixmaps else None
+
+
+def test_cached_sprite_is_not_downloaded_again(app, server, cache):
+    server.files['/sprites/black-white/normal/bulbasaur.png'] = (_png('green'), '"v1"')
+    url = server.url('/sprites/black-white/normal/bulbasaur.png')
+    sprite_cache = cache()
+
+    assert _fetch(SpriteService(), url) is not None
+    assert sprite_cache.get(url).data == server.files['/sprites/black-white/normal/bulbasaur.png'][0]
+    # A new service has no pixmaps in memory: the sprite comes from the disk cache
+    assert _fetch(SpriteService(), url) is not None
+    assert len(server.requests) == 1
+
+
+def test_least_recently_used_sprites_are_evicted(tmp_path):
+    sprite_cache = sprites.SpriteCache(str(tmp_path), max_bytes=250)
+    sprite_cache.put('a', b'a' * 100)
+    sprite_cache.put('b', b'b' * 100)
+    assert sprite_cache.get('a') is not None
+    sprite_cache.put('c', b'c' * 100)
+
+    assert 'b' not in sprite_cache
+    assert 'a' in sprite_cache and 'c' in sprite_cache
+    assert sprite_cache.size == 200
+    # The blob of the evicted sprite is deleted, and the index survives a restart
+    assert len(list((tmp_path / 'blobs').iterdir())) == 2
+    sprite_cache.flush()
+    assert len(sprites.SpriteCache(str(tmp_path), max_bytes=250)) == 2
+
+
+def test_listing_of_relative_paths_needs_a_base_url(tmp_path):
+    listing = tmp_path / 'listing.txt'
+    listing.write_text('custom-fusion-sprites/main/CustomBattlers/1.4.png\n')
+    manifest = sprites.SpriteManifest(str(tmp_path / 'manifest.json'))
+
+    with pytest.raises(ValueError, match='base_url'):
+        manifest.import_listing(str(listing))
+    assert manifest.import_listing(str(listing), base_url=sprites.FUSION_SPRITES_URL) == 1
+    assert manifest.resolve(sprites.fusion_sprite_url(1, 4)) == sprites.fusion_sprite_url(1, 4)
+
+
+def test_stale_sprite_is_revalidated(app, server, cache):
+    data = _png('red')
+    server.files['/sprites/black-white/normal/charmander.png'] = (data, '"v1"')
+    url = server.url('/sprites/black-white/normal/charmander.png')
+    # Every cached sprite is stale
+    sprite_cache = cache(max_age=0)
+    sprite_cache.put(url, data, etag='"v1"')
+
+    assert _fetch(SpriteService(), url) is not None
+    assert server.requests == [('/sprites/black-white/normal/charmander.png', '"v1"', 304)]
+    assert sprite_cache.get(url).data == data
+
+
+def test_sprite_evicted_during_revalidation_is_queued_again(app, server, cache):
+    stale, visible = _png('orange'), _png('white')
+    server.files['/sprites/black-white/normal/vulpix.png'] = (stale, '"v1"')
+    server.files['/sprites/black-white/normal/psyduck.png'] = (visible, '"v1"')
+    server.delays['/sprites/black-white/normal/vulpix.png'] = 0.2
+    stale_url = server.url('/sprites/black-white/normal/vulpix.png')
+    sprite_cache = cache(max_age=0, max_bytes=len(stale) + len(visible) // 2)
+    sprite_cache.put(stale_url, stale, etag='"v1"')
+
+    service = SpriteService(max_concurrent=1)
+    pixmaps = []
+    service.fetch(stale_url, pixmaps.append, PRIORITY_PREFETCH)
+    service.fetch(server.url('/sprites/black-white/normal/psyduck.png'), pixmaps.append, PRIORITY_VISIBLE)
+    # The cached copy is evicted while its revalidation is running
+    _wait(service, lambda: bool(server.requests))
+    sprite_cache.put('other', b'x' * len(stale))
+    _wait(service, lambda: len(pixmaps) == 2)
+
+    assert len(pixmaps) == 2
+    # Downloaded again without validators, after the queued download with a better priority
+    assert server.requests == [('/sprites/black-white/normal/vulpix.png', '"v1"', 304),
+                               ('/sprites/black-white/normal/psyduck.png', None, 200),
+                               ('/sprites/black-white/normal/vulpix.png', None, 200)]
+
+
+def test_offline_only_cached_sprites_are_loaded(app, server, cache):
+    server.files['/sprites/black-white/normal/squirtle.png'] = (_png('blue'), '"v1"')
+    server.files['/sprites/black-white/normal/pikachu.png'] = (_png('yellow'), '"v1"')
+    cached_url = server.url('/sprites/black-white/normal/squirtle.png')
+    sprite_cache = cache(max_age=0, offline=True)
+    sprite_cache.put(cached_url, server.files['/sprites/black-white/normal/squirtle.png'][0], etag='"v1"')
+
+    service = SpriteService()
+    # Offline, cached sprites are always fresh
+    assert _fetch(service, cached_url) is not None
+    assert _fetch(service, server.url('/sprites/black-white/normal/pikachu.png')) is None
+    assert server.requests == []
+    # The sprite may exist, it's just not cached: it's not recorded as missing
+    assert not sprites.get_manifest().is_missing(server.url('/sprites/black-white/normal/pikachu.png'))
+
+
+def test_missing_sprite_falls_back_to_the_next_url(app, server, cache):
+    server.files['/sprites/sun-moon/normal/eevee.png'] = (_png('brown'), '"v1"')
+    url = server.url('/sprites/black-white/normal/eevee.png')
+    cache()
+
+    assert _fetch(SpriteService(), url) is not None
+    assert server.requests == [('/sprites/black-white/normal/eevee.png', None, 404),
+                               ('/sprites/sun-moon/normal/eevee.png', None, 200)]
+    assert sprites.get_manifest().resolve(url) == server.url('/sprites/sun-moon/normal/eevee.png')
+
+    # The manifest skips the failing url next time
+    assert _fetch(SpriteService(), url) is not None
+    assert len(server.requests) == 2
+
+
+def test_sprite_missing_everywhere_is_recorded(app, server, cache):
+    url = server.url('/sprites/black-white/normal/missingno.png')
+    cache()
+
+    assert _fetch(SpriteService(), url) is None
+    assert server.paths() == ['/sprites/black-white/normal/missingno.png', '/sprites/sun-moon/normal/missingno.png']
+    assert sprites.get_manifest().is_missing(url)
+
+
+def test_dropped_connection_is_not_a_missing_sprite(app, server, cache):
+    server.files['/sprites/sun-moon/normal/mew.png'] = (_png('pink'), '"v1"')
+    server.drops.add('/sprites/black-white/normal/mew.png')
+    url = server.url('/sprites/black-white/normal/mew.png')
+    cache()
+
+    service = SpriteService()
+    assert _fetch(service, url) is None
+    # The sprite may be at its url: the fallback is not tried, and nothing is recorded
+    assert set(server.paths()) == {'/sprites/black-white/normal/mew.png'}
+    assert not sprites.get_manifest().is_missing(url)
+    assert sprites.get_manifest().resolve(url) is None
+    assert not service._chain_urls and not service._waiting.keys()
+
+    # The next request tries again
+    server.drops.clear()
+    server.files['/sprites/black-white/normal/mew.png'] = (_png('pink'), '"v1"')
+    assert _fetch(service, url) is not None
+
+
+def test_dropped_connection_shows_the_stale_copy(app, server, cache):
+    data = _png('gray')
+    server.drops.add('/sprites/black-white/normal/onix.png')
+    url = server.url('/sprites/black-white/normal/onix.png')
+    sprite_cache = cache(max_age=0)
+    sprite_cache.put(url, data, etag='"v1"')
+
+    assert _fetch(SpriteService(), url) is not None
+    assert set(server.paths()) == {'/sprites/black-white/normal/onix.png'}
+    assert sprites.get_manifest().resolve(url) is None
+
+
+def test_requests_join_the_fallback_chain_in_progress(app, server, cache):
+    server.files['/sprites/sun-moon/normal/ditto.png'] = (_png('purple'), '"v1"')
+    server.delays['/sprites/sun-moon/normal/ditto.png'] = 0.3
+    url = server.url('/sprites/black-white/normal/ditto.png')
+    cache()
+
+    service = SpriteService()
+    first, second = [], []
+    service.fetch(url, first.append)
+    # The first url failed, the fallback is being downloaded
+    _wait(service, lambda: len(server.requests) == 2)
+    service.fetch(url, second.append)
+    _wait(service, lambda: bool(first and second))
+
+    assert first and second
+    assert server.paths() == ['/sprites/black-white/normal/ditto.png', '/sprites/sun-moon/normal/ditto.png']